@@ -27,12 +27,44 @@ Variables:
 \b
 {config.describe('XDG_DATA_HOME')}
 \b
+{config.describe('XDG_CACHE_HOME')}
+\b
 {config.describe('OCRD_DOWNLOAD_RETRIES')}
 \b
 {config.describe('OCRD_DOWNLOAD_TIMEOUT')}
 \b
 {config.describe('OCRD_METS_CACHING')}
 \b
+{config.describe('OCRD_METS_ITERPARSE')}
+\b
+{config.describe('OCRD_METS_SIDECAR_INDEX')}
+\b
+{config.describe('OCRD_METS_XMLLINT')}
+\b
+{config.describe('OCRD_METS_WRITE_BEHIND_SECONDS')}
+\b
+{config.describe('OCRD_METS_WRITE_BEHIND_CHANGES')}
+\b
+{config.describe('OCRD_METS_SHARD_PAGES')}
+\b
+{config.describe('OCRD_METS_SHARD_CACHE')}
+\b
+{config.describe('OCRD_METS_SERVER_BATCH_SIZE')}
+\b
+{config.describe('OCRD_METS_SERVER_FLUSH_INTERVAL')}
+\b
+{config.describe('OCRD_METS_SERVER_CACHE')}
+\b
+{config.describe('OCRD_METS_SERVER_CACHE_TTL')}
+\b
+{config.describe('OCRD_MAX_PARALLEL_PAGES')}
+\b
+{config.describe('OCRD_PARALLEL_PAGES_POOL')}
+\b
+{config.describe('OCRD_PREFETCH_PAGES')}
+\b
+{config.describe('OCRD_WRITER_THREADS')}
+\b
 {config.describe('OCRD_MAX_PROCESSOR_CACHE')}
 \b
 {config.describe('OCRD_NETWORK_SERVER_ADDR_PROCESSING')}
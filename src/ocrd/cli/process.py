@@ -21,12 +21,14 @@ from ..decorators import ocrd_loglevel
 @click.option('-m', '--mets', help="METS to process", default=DEFAULT_METS_BASENAME)
 @click.option('-g', '--page-id', help="ID(s) of the pages to process")
 @click.option('--overwrite', is_flag=True, default=False, help="Remove output pages/images if they already exist")
+@click.option('--in-process', is_flag=True, default=False, help="Run Python processors in this process (sharing the workspace and processor instances across tasks) instead of as subprocesses")
+@click.option('--stream', is_flag=True, default=False, help="Like --in-process, but pass each page through consecutive per-page Python processors before the next page, handing over PAGE and images in memory")
 @click.argument('tasks', nargs=-1, required=True)
-def process_cli(log_level, mets, page_id, tasks, overwrite):
+def process_cli(log_level, mets, page_id, tasks, overwrite, in_process, stream):
     """
     Process a series of tasks
     """
     initLogging()
     log = getLogger('ocrd.cli.process')
-    run_tasks(mets, log_level, page_id, tasks, overwrite)
+    run_tasks(mets, log_level, page_id, tasks, overwrite, in_process=in_process, stream=stream)
     log.info("Finished")
@@ -10,6 +10,7 @@ from os import getcwd, unlink
 from os.path import relpath, exists, join, isabs
 from pathlib import Path
 from json import loads, dumps
+from io import BytesIO
 import sys
 from glob import glob   # XXX pathlib.Path.glob does not support absolute globs
 import re
@@ -24,6 +25,7 @@ from ocrd_utils import getLogger, initLogging, pushd_popd, EXT_TO_MIME, safe_fil
 from ocrd.decorators import mets_find_options
 from . import command_with_replaced_help
 from ocrd_models.constants import METS_PAGE_DIV_ATTRIBUTE
+from ocrd_models.ocrd_mets import TABLE_COLUMNS
 
 
 class WorkspaceCtx():
@@ -336,6 +338,7 @@ def workspace_cli_bulk_add(ctx, regex, mimetype, page_id, file_id, url, local_fi
             else:
                 file_paths += [Path(x) for x in expanded]
 
+    file_dicts = []
     for i, file_path in enumerate(file_paths):
         log.info("[%4d/%d] %s" % (i + 1, len(file_paths), file_path))
 
@@ -403,11 +406,15 @@ def workspace_cli_bulk_add(ctx, regex, mimetype, page_id, file_id, url, local_fi
                     destpath.write_bytes(srcpath.read_bytes())
 
         # Add to workspace (or not)
-        fileGrp = file_dict.pop('file_grp')
         if dry_run:
+            file_dict.pop('file_grp')
             log.info('workspace.add_file(%s)' % file_dict)
         else:
-            workspace.add_file(fileGrp, ignore=ignore, force=force, **file_dict)
+            file_dicts.append(file_dict)
+
+    # add all files at once
+    if file_dicts:
+        workspace.add_files(file_dicts, ignore=ignore, force=force)
 
     # save changes to disk
     workspace.save_mets()
@@ -436,12 +443,16 @@ def workspace_cli_bulk_add(ctx, regex, mimetype, page_id, file_id, url, local_fi
                   'basename_without_extension',
                   'local_filename',
               ]))
+@click.option('--format', 'output_format', type=click.Choice(['tsv', 'npz', 'arrow', 'parquet']), default='tsv', show_default=True,
+              help="Output format: lines of tab-separated output fields, or the output fields (by default ID, fileGrp, "
+              "pageId, mimetype, url and local_filename) as columns of a NumPy .npz archive, an Arrow IPC file or a "
+              "Parquet file (the latter two require pyarrow), written to stdout")
 @click.option('--download', is_flag=True, help="Download found files to workspace and change location in METS file")
 @click.option('--undo-download', is_flag=True, help="Remove all downloaded files from the METS and workspace")
 @click.option('--keep-files', is_flag=True, help="Do not remove downloaded files from the workspace with --undo-download")
 @click.option('--wait', type=int, default=0, help="Wait this many seconds between download requests")
 @pass_workspace
-def workspace_find(ctx, file_grp, mimetype, page_id, file_id, output_field, include_fileGrp, exclude_fileGrp, download, undo_download, keep_files, wait):
+def workspace_find(ctx, file_grp, mimetype, page_id, file_id, output_field, include_fileGrp, exclude_fileGrp, output_format, download, undo_download, keep_files, wait):
     """
     Find files.
 
@@ -450,6 +461,30 @@ def workspace_find(ctx, file_grp, mimetype, page_id, file_id, output_field, incl
     """
     snake_to_camel = {"file_id": "ID", "page_id": "pageId", "file_grp": "fileGrp"}
     output_field = [snake_to_camel.get(x, x) for x in output_field]
+    if output_format != 'tsv':
+        if download or undo_download:
+            raise click.UsageError("--download and --undo-download require --format tsv")
+        if click.get_current_context().get_parameter_source('output_field') == click.core.ParameterSource.DEFAULT:
+            output_field = list(TABLE_COLUMNS)
+        unsupported = [field for field in output_field if field not in TABLE_COLUMNS]
+        if unsupported:
+            raise click.BadParameter(f"Not available with --format {output_format}: {unsupported}", param_hint='-k')
+        workspace = Workspace(
+            ctx.resolver,
+            directory=ctx.directory,
+            mets_basename=ctx.mets_basename,
+            mets_server_url=ctx.mets_server_url,
+        )
+        table = workspace.mets.to_table(
+            ID=file_id,
+            fileGrp=file_grp,
+            mimetype=mimetype,
+            pageId=page_id,
+            include_fileGrp=include_fileGrp,
+            exclude_fileGrp=exclude_fileGrp,
+        )
+        _write_table({field: table[field] for field in output_field}, output_format)
+        return
     modified_mets = False
     ret = list()
     workspace = Workspace(
@@ -492,6 +527,31 @@ def workspace_find(ctx, file_grp, mimetype, page_id, file_id, output_field, incl
     for fields in ret:
         print('\t'.join(fields))
 
+def _write_table(table, output_format):
+    """
+    Write the columns of ``table`` to stdout as ``output_format`` (``npz``, ``arrow`` or ``parquet``)
+    """
+    if output_format == 'npz':
+        out = BytesIO()
+        np.savez(out, **table)
+        data = out.getvalue()
+    else:
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError as err:
+            raise click.UsageError(f"--format {output_format} requires pyarrow") from err
+        arrow_table = pyarrow.table(table)
+        sink = pyarrow.BufferOutputStream()
+        if output_format == 'arrow':
+            with pyarrow.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        else:
+            pyarrow.parquet.write_table(arrow_table, sink)
+        data = sink.getvalue().to_pybytes()
+    sys.stdout.buffer.write(data)
+
 # ----------------------------------------------------------------------
 # ocrd workspace remove
 # ----------------------------------------------------------------------
@@ -571,18 +631,17 @@ def prune_files(ctx, file_grp, mimetype, page_id, file_id):
     """
     workspace = Workspace(ctx.resolver, directory=ctx.directory, mets_basename=ctx.mets_basename, automatic_backup=ctx.automatic_backup)
     with pushd_popd(workspace.directory):
-        for f in workspace.find_files(
+        files = [f for f in workspace.find_files(
             file_id=file_id,
             file_grp=file_grp,
             mimetype=mimetype,
             page_id=page_id,
-        ):
-            try:
-                if not f.local_filename or not exists(f.local_filename):
-                    workspace.mets.remove_file(f.ID)
-            except Exception as e:
-                ctx.log.exception("Error removing %f: %s", f, e)
-                raise(e)
+        ) if not f.local_filename or not exists(f.local_filename)]
+        try:
+            workspace.mets.remove_files(files)
+        except Exception as e:
+            ctx.log.exception("Error removing %s: %s", files, e)
+            raise(e)
         workspace.save_mets()
 
 # ----------------------------------------------------------------------
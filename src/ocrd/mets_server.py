@@ -2,15 +2,23 @@
 # METS server functionality
 """
 import re
-from os import _exit, chmod
-from typing import Dict, Optional, Union, List, Tuple
+import asyncio
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+import json
+from os import _exit, chmod, getpid
+from time import monotonic
+from typing import Any, Callable, Dict, Iterator, Optional, Union, List, Tuple
 from pathlib import Path
 from urllib.parse import urlparse
+from uuid import uuid4
 import socket
 import atexit
+from threading import Condition, Lock, Thread, local
 
 from fastapi import FastAPI, Request, Form, Response, requests
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from requests import Session as requests_session
 from requests.exceptions import ConnectionError
 from requests_unixsocket import Session as requests_unixsocket_session
@@ -19,7 +27,16 @@ from pydantic import BaseModel, Field, ValidationError
 import uvicorn
 
 from ocrd_models import OcrdFile, ClientSideOcrdFile, OcrdAgent, ClientSideOcrdAgent
-from ocrd_utils import getLogger, deprecated_alias
+from ocrd_models.ocrd_mets import TABLE_COLUMNS, _files_table
+from ocrd_utils import config, getLogger, deprecated_alias, REGEX_PREFIX
+
+# Compact encoding of file listings (cf. OcrdMetsServer find_files): the first line is
+# a JSON array of the column names, followed by one JSON array of the values per file
+MIMETYPE_FILES_NDJSON = 'application/x-ndjson'
+# Number of files per chunk of a streamed file listing
+FILES_NDJSON_CHUNK = 500
+# Number of the most recent changes the server keeps for GET /changes
+CHANGES_HISTORY = 10000
 
 #
 # Models
@@ -82,30 +99,97 @@ class OcrdAgentListModel(BaseModel):
             agents=[OcrdAgentModel.create(name=a.name, _type=a.type, role=a.role, otherrole=a.otherrole, othertype=a.othertype, notes=a.notes) for a in agents]
         )
 
+class OcrdFileQueryModel(BaseModel):
+    file_grp : Optional[str] = Field()
+    file_id : Optional[str] = Field()
+    page_id : Optional[str] = Field()
+    mimetype : Optional[str] = Field()
+    local_filename : Optional[str] = Field()
+    url : Optional[str] = Field()
+
+class OcrdBatchOperationModel(BaseModel):
+    # exactly one of
+    add_file : Optional[OcrdFileModel] = Field()
+    find_files : Optional[OcrdFileQueryModel] = Field()
+
+class OcrdBatchModel(BaseModel):
+    operations : List[OcrdBatchOperationModel] = Field()
+
+class OcrdBatchResultModel(BaseModel):
+    # for each operation, the added file or the files found
+    results : List[OcrdFileListModel] = Field()
+
+class OcrdChangeModel(BaseModel):
+    version : int = Field()
+    # 'add' (or replace) or 'remove'
+    op : str = Field()
+    file : OcrdFileModel = Field()
+
+class OcrdChangesModel(BaseModel):
+    # the version of the METS after the changes
+    version : int = Field()
+    # whether the changes since the requested version are not available anymore
+    # (the files must be queried anew)
+    reset : bool = Field()
+    changes : List[OcrdChangeModel] = Field()
+
 #
 # Client
 #
 
 
+# Persistent sessions (keeping connections to METS servers alive) of the current thread, by process and protocol
+# (requests.Session is not thread-safe)
+_sessions = local()
+
 class ClientSideOcrdMets():
     """
     Partial substitute for :py:class:`ocrd_models.ocrd_mets.OcrdMets` which provides for
     :py:meth:`ocrd_models.ocrd_mets.OcrdMets.find_files`,
-    :py:meth:`ocrd_models.ocrd_mets.OcrdMets.find_all_files`, and
+    :py:meth:`ocrd_models.ocrd_mets.OcrdMets.find_all_files`,
+    :py:meth:`ocrd_models.ocrd_mets.OcrdMets.to_table`, and
     :py:meth:`ocrd_models.ocrd_mets.OcrdMets.add_agent`,
     :py:meth:`ocrd_models.ocrd_mets.OcrdMets.agents`,
-    :py:meth:`ocrd_models.ocrd_mets.OcrdMets.add_file` to query via HTTP a
+    :py:meth:`ocrd_models.ocrd_mets.OcrdMets.add_file`,
+    :py:meth:`ocrd_models.ocrd_mets.OcrdMets.remove_file` to query via HTTP a
     :py:class:`ocrd.mets_server.OcrdMetsServer`.
+
+    Within :py:meth:`batch`, ``add_file`` requests are queued and sent together.
+    Use :py:meth:`changes` to follow the changes to the METS.
+
+    With :py:attr:`cache`, the results of ``find_files``, ``file_groups``, ``agents`` and
+    ``unique_identifier`` are kept by query and revalidated with conditional requests
+    (cf. ``OCRD_METS_SERVER_CACHE`` and ``OCRD_METS_SERVER_CACHE_TTL``).
     """
 
-    def __init__(self, url):
+    def __init__(self, url, cache : Optional[bool] = None):
         self.protocol = 'tcp' if url.startswith('http://') else 'uds'
         self.log = getLogger(f'ocrd.models.ocrd_mets.client.{url}')
         self.url = url if self.protocol == 'tcp' else f'http+unix://{url.replace("/", "%2F")}'
+        # queued batch operations, and the number of them to send at once (0 if not batching)
+        self._batch : List[OcrdBatchOperationModel] = []
+        self._batch_size = 0
+        self._batch_lock = Lock()
+        self.cache = config.OCRD_METS_SERVER_CACHE if cache is None else cache
+        self.cache_ttl = config.OCRD_METS_SERVER_CACHE_TTL
+        # cached results by path and query: ETag, when last validated, and result
+        self._cache : Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Tuple[str, float, Any]] = {}
+        # when this client last changed the METS (so cached results must be revalidated)
+        self._changed_at = monotonic()
 
     @property
     def session(self) -> Union[requests_session, requests_unixsocket_session]:
-        return requests_session() if self.protocol == 'tcp' else requests_unixsocket_session()
+        """
+        The session of the current thread for :py:attr:`protocol`, which is reused
+        by all clients, so connections to the server are kept alive
+        """
+        if not hasattr(_sessions, 'by_key'):
+            _sessions.by_key = {}
+        sessions : Dict[Tuple[int, str], Union[requests_session, requests_unixsocket_session]] = _sessions.by_key
+        key = (getpid(), self.protocol)
+        if key not in sessions:
+            sessions[key] = requests_session() if self.protocol == 'tcp' else requests_unixsocket_session()
+        return sessions[key]
 
     def __getattr__(self, name):
         raise NotImplementedError(f"ClientSideOcrdMets has no access to '{name}' - try without METS server")
@@ -113,12 +197,87 @@ class ClientSideOcrdMets():
     def __str__(self):
         return f'<ClientSideOcrdMets[url={self.url}]>'
 
+    @contextmanager
+    def batch(self, size : int = 100) -> Iterator['ClientSideOcrdMets']:
+        """
+        Within this context, queue :py:meth:`add_file` requests and send them in batches
+        of ``size`` in a single request each. Queued requests are also sent along with the next
+        :py:meth:`find_files` (in the same request), before any other request, and when leaving
+        the context.
+
+        Note: Errors of queued requests (like ``FileExistsError`` on the server) are only raised
+        when the batch is sent.
+        """
+        prev_size = self._batch_size
+        self._batch_size = size
+        try:
+            yield self
+        finally:
+            self._batch_size = prev_size
+            if not prev_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Send all queued requests (cf. :py:meth:`batch`)
+        """
+        self._send_batch()
+
+    def _send_batch(self, query : Optional[OcrdFileQueryModel] = None) -> Optional[OcrdFileListModel]:
+        """
+        Send the queued operations, followed by ``query`` if any, and return the result of ``query``
+        """
+        with self._batch_lock:
+            operations, self._batch = self._batch, []
+        if query is not None:
+            operations.append(OcrdBatchOperationModel(find_files=query))
+        if not operations:
+            return None
+        self.log.debug('batch of %d operations', len(operations))
+        r = self.session.request('POST', f'{self.url}/batch', json=OcrdBatchModel(operations=operations).dict())
+        self._changed_at = monotonic()
+        if r.status_code != 200:
+            raise Exception(f"METS server batch request failed: {r.text}")
+        return OcrdFileListModel(**r.json()['results'][-1]) if query is not None else None
+
+    def _request(self, method : str, url : str, **kwargs):
+        """
+        Send a request to the server, after any queued requests
+        """
+        self._send_batch()
+        return self.session.request(method, url, **kwargs)
+
+    def _cached_get(self, path : str, params : Dict[str, Any], decode : Callable[[Any], Any], **kwargs) -> Any:
+        """
+        GET ``path`` with ``params`` and return the response ``decode``d, with :py:attr:`cache`
+        reusing a previous result if it is still valid
+        """
+        if not self.cache:
+            return decode(self._request('GET', f'{self.url}{path}', params=params, **kwargs))
+        key = (path, tuple(sorted((name, str(value)) for name, value in params.items() if value is not None)))
+        entry = self._cache.get(key)
+        if entry:
+            etag, validated_at, result = entry
+            if not self._batch and validated_at > self._changed_at and monotonic() - validated_at < self.cache_ttl:
+                return result
+            kwargs['headers'] = {**kwargs.get('headers', {}), 'If-None-Match': etag}
+        validated_at = monotonic()
+        r = self._request('GET', f'{self.url}{path}', params=params, **kwargs)
+        if entry and r.status_code == 304:
+            self._cache[key] = (etag, validated_at, result)
+            return result
+        result = decode(r)
+        if 'etag' in r.headers:
+            self._cache[key] = (r.headers['etag'], validated_at, result)
+        return result
+
     @property
     def workspace_path(self):
-        return self.session.request('GET', f'{self.url}/workspace_path').text
+        return self._request('GET', f'{self.url}/workspace_path').text
 
     def reload(self):
-        return self.session.request('POST', f'{self.url}/reload').text
+        self._changed_at = monotonic()
+        return self._request('POST', f'{self.url}/reload').text
 
     @deprecated_alias(ID="file_id")
     @deprecated_alias(pageId="page_id")
@@ -131,30 +290,113 @@ class ClientSideOcrdMets():
             kwargs['file_id'] = kwargs.pop('ID')
         if 'fileGrp' in kwargs:
             kwargs['file_grp'] = kwargs.pop('fileGrp')
-        r = self.session.request('GET', f'{self.url}/file', params={**kwargs})
-        for f in r.json()['files']:
+        if self._batch and set(kwargs) <= set(OcrdFileQueryModel.__fields__):
+            # send the query along with the queued requests
+            files = self._send_batch(OcrdFileQueryModel(**kwargs)).dict()['files']
+        elif self.cache:
+            def decode(r):
+                if r.headers.get('content-type', '').startswith(MIMETYPE_FILES_NDJSON):
+                    lines = r.text.splitlines()
+                    columns = json.loads(lines[0])
+                    return [dict(zip(columns, json.loads(line))) for line in lines[1:]]
+                return [dict(ID=f['file_id'], pageId=f['page_id'], fileGrp=f['file_grp'], url=f['url'],
+                             local_filename=f['local_filename'], mimetype=f['mimetype']) for f in r.json()['files']]
+            for f in self._cached_get('/file', kwargs, decode, headers={'Accept': MIMETYPE_FILES_NDJSON}):
+                yield ClientSideOcrdFile(None, **f)
+            return
+        else:
+            # stream the compact encoding, if the server supports it
+            r = self._request('GET', f'{self.url}/file', params={**kwargs},
+                              headers={'Accept': MIMETYPE_FILES_NDJSON}, stream=True)
+            try:
+                if r.headers.get('content-type', '').startswith(MIMETYPE_FILES_NDJSON):
+                    lines = r.iter_lines(chunk_size=65536)
+                    columns = json.loads(next(lines))
+                    for line in lines:
+                        yield ClientSideOcrdFile(None, **dict(zip(columns, json.loads(line))))
+                    return
+                files = r.json()['files']
+            finally:
+                r.close()
+        for f in files:
             yield ClientSideOcrdFile(None, ID=f['file_id'], pageId=f['page_id'], fileGrp=f['file_grp'], url=f['url'], local_filename=f['local_filename'], mimetype=f['mimetype'])
 
     def find_all_files(self, *args, **kwargs):
         return list(self.find_files(*args, **kwargs))
 
+    def remove_file(self, *args, **kwargs):
+        """
+        Delete each ``mets:file`` matching the query, like :py:meth:`ocrd_models.ocrd_mets.OcrdMets.remove_file`
+        (but only on the server, not on disk)
+        """
+        if args:
+            kwargs['ID'] = args[0]
+        params = {key: kwargs[alias] for key, alias in (('file_id', 'ID'), ('file_grp', 'fileGrp'), ('page_id', 'pageId'),
+                                                        ('mimetype', 'mimetype'), ('url', 'url'), ('local_filename', 'local_filename'))
+                  if kwargs.get(alias) is not None}
+        self._changed_at = monotonic()
+        r = self._request('DELETE', f'{self.url}/file', params=params)
+        if r.status_code == 404:
+            raise FileNotFoundError(r.json())
+        files = [ClientSideOcrdFile(None, ID=f['file_id'], pageId=f['page_id'], fileGrp=f['file_grp'], url=f['url'],
+                                    local_filename=f['local_filename'], mimetype=f['mimetype']) for f in r.json()['files']]
+        if len(files) == 1:
+            return files[0]  # for backwards-compatibility
+        return files
+
+    def changes(self, since : int = 0, timeout : float = 0) -> Tuple[int, Optional[List[Tuple[str, ClientSideOcrdFile]]]]:
+        """
+        Get the files added and removed on the server after version ``since`` of the METS,
+        waiting up to ``timeout`` seconds for the first change if there are none yet (long polling).
+
+        Returns:
+            a tuple of the current version and a list of changes in order, each a tuple of
+            ``'add'`` (also when replacing a file with the same ``ID``) or ``'remove'`` and the file.
+            Instead of the list, ``None`` if the changes since ``since`` are not available anymore
+            (e.g. after a reload of the METS): then the files must be queried anew.
+
+        For example, to keep a local listing up to date::
+
+            version, _ = mets.changes()
+            files = {f.ID: f for f in mets.find_files()}
+            while True:
+                version, changes = mets.changes(since=version, timeout=30)
+                if changes is None:
+                    files = {f.ID: f for f in mets.find_files()}
+                    continue
+                for op, f in changes:
+                    if op == 'add':
+                        files[f.ID] = f
+                    else:
+                        files.pop(f.ID, None)
+        """
+        data = self._request('GET', f'{self.url}/changes', params={'since': since, 'timeout': timeout}).json()
+        if data['reset']:
+            return data['version'], None
+        return data['version'], [(change['op'], ClientSideOcrdFile(
+            None, ID=f['file_id'], pageId=f['page_id'], fileGrp=f['file_grp'], url=f['url'],
+            local_filename=f['local_filename'], mimetype=f['mimetype'])) for change in data['changes'] for f in [change['file']]]
+
+    def to_table(self, **kwargs):
+        return _files_table(self.find_files(**kwargs))
+
     def add_agent(self, *args, **kwargs):
-        return self.session.request('POST', f'{self.url}/agent', json=OcrdAgentModel.create(**kwargs).dict())
+        self._changed_at = monotonic()
+        return self._request('POST', f'{self.url}/agent', json=OcrdAgentModel.create(**kwargs).dict())
 
     @property
     def agents(self):
-        agent_dicts = self.session.request('GET', f'{self.url}/agent').json()['agents']
-        for agent_dict in agent_dicts:
-            agent_dict['_type'] = agent_dict.pop('type')
-        return [ClientSideOcrdAgent(None, **agent_dict) for agent_dict in agent_dicts]
+        agent_dicts = self._cached_get('/agent', {}, lambda r: r.json()['agents'])
+        return [ClientSideOcrdAgent(None, **{'_type' if key == 'type' else key: value for key, value in agent_dict.items()})
+                for agent_dict in agent_dicts]
 
     @property
     def unique_identifier(self):
-        return self.session.request('GET', f'{self.url}/unique_identifier').text
+        return self._cached_get('/unique_identifier', {}, lambda r: r.text)
 
     @property
     def file_groups(self):
-        return self.session.request('GET', f'{self.url}/file_groups').json()['file_groups']
+        return list(self._cached_get('/file_groups', {}, lambda r: r.json()['file_groups']))
 
     @deprecated_alias(pageId="page_id")
     @deprecated_alias(ID="file_id")
@@ -166,7 +408,15 @@ class ClientSideOcrdMets():
             mimetype=mimetype,
             url=url,
             local_filename=local_filename)
-        r = self.session.request('POST', f'{self.url}/file', data=data.dict())
+        if self._batch_size:
+            with self._batch_lock:
+                self._batch.append(OcrdBatchOperationModel(add_file=data))
+                full = len(self._batch) >= self._batch_size
+            if full:
+                self._send_batch()
+        else:
+            self._changed_at = monotonic()
+            self.session.request('POST', f'{self.url}/file', data=data.dict())
         return ClientSideOcrdFile(
                 None,
                 ID=file_id,
@@ -176,13 +426,33 @@ class ClientSideOcrdMets():
                 mimetype=mimetype,
                 local_filename=local_filename)
 
+    def add_files(self, records, **kwargs):
+        data = OcrdFileListModel(files=[OcrdFileModel(
+            file_id=record.get('ID'),
+            file_grp=record.get('fileGrp'),
+            page_id=record.get('pageId'),
+            mimetype=record.get('mimetype'),
+            url=record.get('url'),
+            local_filename=str(record['local_filename']) if record.get('local_filename') else None,
+        ) for record in records])
+        self._changed_at = monotonic()
+        self._request('POST', f'{self.url}/files', json=data.dict())
+        return [ClientSideOcrdFile(
+                None,
+                ID=f.file_id,
+                fileGrp=f.file_grp,
+                url=f.url,
+                pageId=f.page_id,
+                mimetype=f.mimetype,
+                local_filename=f.local_filename) for f in data.files]
+
 
     def save(self):
-        self.session.request('PUT', self.url)
+        self._request('PUT', self.url)
 
     def stop(self):
         try:
-            self.session.request('DELETE', self.url)
+            self._request('DELETE', self.url)
         except ConnectionError:
             # Expected because we exit the process without returning
             pass
@@ -191,6 +461,175 @@ class ClientSideOcrdMets():
 # Server
 #
 
+class _GroupCommit():
+    """
+    Applies the changes to a workspace requested by concurrent clients in batches,
+    and coalesces the requests to save it, in a single thread
+    """
+
+    def __init__(self, workspace, lock : Lock, interval : float) -> None:
+        """
+        Args:
+            workspace (Workspace): workspace to change and save
+            lock (Lock): lock to hold while changing or saving the workspace
+            interval (float): minimum number of seconds between two saves
+        """
+        self.workspace = workspace
+        self.lock = lock
+        self.interval = interval
+        self.log = getLogger('ocrd.mets_server.group_commit')
+        self._cond = Condition()
+        # changes not applied yet, and the futures of their results
+        self._changes : List[Tuple[Callable[[], Any], Future]] = []
+        # the futures of the save requests not served yet
+        self._saves : List[Future] = []
+        self._saved_at = monotonic() - interval
+        Thread(target=self._run, name='ocrd-mets-server-commit', daemon=True).start()
+
+    def apply(self, change : Callable[[], Any]) -> Any:
+        """
+        Queue ``change`` (a function changing the workspace), and wait until it has been applied
+        (along with all other changes queued in the meantime).
+        Returns the result of ``change`` or raises its exception.
+        """
+        future : Future = Future()
+        with self._cond:
+            self._changes.append((change, future))
+            self._cond.notify()
+        return future.result()
+
+    def save(self) -> None:
+        """
+        Wait until the workspace has been saved with all changes applied so far
+        (coalesced with concurrent requests, at most once per :py:attr:`interval`).
+        """
+        future : Future = Future()
+        with self._cond:
+            self._saves.append(future)
+            self._cond.notify()
+        future.result()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    save_wait = self._saved_at + self.interval - monotonic()
+                    if self._changes or self._saves and save_wait <= 0:
+                        break
+                    self._cond.wait(timeout=save_wait if self._saves else None)
+                changes, self._changes = self._changes, []
+                saves = []
+                if save_wait <= 0:
+                    saves, self._saves = self._saves, []
+            if changes:
+                with self.lock:
+                    for change, future in changes:
+                        try:
+                            future.set_result(change())
+                        except Exception as err: # pylint: disable=broad-except
+                            future.set_exception(err)
+            if saves:
+                self.log.debug('saving for %d requests', len(saves))
+                try:
+                    with self.lock:
+                        # clients wait for the METS to be written, so never defer it
+                        self.workspace.save_mets(flush=True)
+                except Exception as err: # pylint: disable=broad-except
+                    for future in saves:
+                        future.set_exception(err)
+                else:
+                    for future in saves:
+                        future.set_result(None)
+                self._saved_at = monotonic()
+
+class _ChangeFeed():
+    """
+    Numbers the files added to and removed from a workspace by consecutive versions,
+    keeping the most recent of these changes for clients following them
+    """
+
+    def __init__(self, size : int) -> None:
+        """
+        Args:
+            size (int): number of changes to keep
+        """
+        self.version = 0
+        self._lock = Lock()
+        # (version, op, file as dict) of the most recent changes
+        self._changes : deque = deque(maxlen=size)
+        # the version of the last reset, before which no changes are available
+        self._reset_version = 0
+        # the (event loop, future) of the clients waiting for changes
+        self._waiters : List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def added(self, files : Union[OcrdFile, List[OcrdFile]]) -> Union[OcrdFile, List[OcrdFile]]:
+        """
+        Record ``files`` as added (and return them)
+        """
+        self._publish('add', [{
+            'file_grp': f.fileGrp, 'file_id': f.ID, 'mimetype': f.mimetype, 'page_id': f.pageId,
+            'url': f.url, 'local_filename': f.local_filename} for f in (files if isinstance(files, list) else [files])])
+        return files
+
+    def removed(self, files : List[OcrdFileModel]) -> None:
+        """
+        Record ``files`` (as they were before removing them) as removed
+        """
+        self._publish('remove', [f.dict() for f in files])
+
+    def reset(self) -> None:
+        """
+        Discard all changes, so clients query the files anew (e.g. after reloading the METS)
+        """
+        with self._lock:
+            self.version += 1
+            self._reset_version = self.version
+            self._changes.clear()
+            self._notify()
+
+    def since(self, version : int) -> Tuple[int, Optional[List[Tuple[int, str, Dict[str, Optional[str]]]]]]:
+        """
+        The current version and the changes after ``version``, or ``None`` if these are not available anymore
+        """
+        with self._lock:
+            oldest = self._changes[0][0] - 1 if self._changes else self.version
+            if version < max(oldest, self._reset_version) or version > self.version:
+                return self.version, None
+            return self.version, [change for change in self._changes if change[0] > version]
+
+    async def wait(self, version : int, timeout : float) -> None:
+        """
+        Wait up to ``timeout`` seconds until there are changes after ``version``
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.version != version:
+                return
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+
+    def _publish(self, op : str, files : List[Dict[str, Optional[str]]]) -> None:
+        with self._lock:
+            for f in files:
+                self.version += 1
+                self._changes.append((self.version, op, f))
+            if files:
+                self._notify()
+
+    def _notify(self) -> None:
+        # (with the lock held)
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(lambda future=future: future.done() or future.set_result(None))
+        self._waiters.clear()
+
 class OcrdMetsServer():
 
     def __init__(self, workspace, url):
@@ -211,6 +650,40 @@ class OcrdMetsServer():
         self.log.info("Starting up METS server")
 
         workspace = self.workspace
+        # Serializes changes to the METS and taking snapshots of it.
+        # Queries are answered from immutable snapshots without holding the lock,
+        # so (non-async) endpoints can run concurrently in the thread pool.
+        lock = Lock()
+
+        def snapshot():
+            with lock:
+                return workspace.mets.snapshot()
+
+        # Responses to queries carry the revision of the METS (and the generation, i.e. which
+        # METS was loaded) as ETag, so clients can revalidate cached results with If-None-Match
+        generation = uuid4().hex
+
+        def etag(revision):
+            # (with the lock held)
+            return f'"{generation}-{revision}"'
+
+        def versioned_snapshot():
+            with lock:
+                snap = workspace.mets.snapshot()
+                return snap, etag(snap.revision)
+
+        def conditional(request : Request, tag : str, respond : Callable[[], Response]) -> Response:
+            # the response of respond(), or 304 if the client has it already
+            if request.headers.get('if-none-match') == tag:
+                return Response(status_code=304, headers={'ETag': tag})
+            response = respond()
+            response.headers['ETag'] = tag
+            return response
+
+        # Changes by add_file, add_files and batch are applied in batches and saves are coalesced
+        commit = _GroupCommit(workspace, lock, config.OCRD_METS_SERVER_FLUSH_INTERVAL)
+        # Files added and removed (while changing the workspace), for GET /changes
+        feed = _ChangeFeed(CHANGES_HISTORY)
 
         app = FastAPI(
             title="OCR-D METS Server",
@@ -225,12 +698,17 @@ class OcrdMetsServer():
         async def exception_handler_file_exists(request: Request, exc: FileExistsError):
             return JSONResponse(status_code=400, content=str(exc))
 
+        @app.exception_handler(FileNotFoundError)
+        async def exception_handler_file_not_found(request: Request, exc: FileNotFoundError):
+            return JSONResponse(status_code=404, content=str(exc))
+
         @app.exception_handler(re.error)
         async def exception_handler_invalid_regex(request: Request, exc: re.error):
             return JSONResponse(status_code=400, content=f'invalid regex: {exc}')
 
         @app.get("/file", response_model=OcrdFileListModel)
-        async def find_files(
+        def find_files(
+            request : Request,
             file_grp : Optional[str] = None,
             file_id : Optional[str] = None,
             page_id : Optional[str] = None,
@@ -240,16 +718,34 @@ class OcrdMetsServer():
         ):
             """
             Find files in the mets
+
+            With ``Accept: application/x-ndjson``, the files are streamed in a compact encoding
+            (a line with the column names, then a line with the values for each file).
             """
-            found = workspace.mets.find_all_files(fileGrp=file_grp, ID=file_id, pageId=page_id, mimetype=mimetype, local_filename=local_filename, url=url)
-            return OcrdFileListModel.create(found)
+            snap, tag = versioned_snapshot()
+            def respond():
+                found = snap.find_all_files(fileGrp=file_grp, ID=file_id, pageId=page_id, mimetype=mimetype, local_filename=local_filename, url=url)
+                # (the files of the snapshot need no validation)
+                if MIMETYPE_FILES_NDJSON in request.headers.get('accept', ''):
+                    def lines():
+                        yield json.dumps(TABLE_COLUMNS) + '\n'
+                        for start in range(0, len(found), FILES_NDJSON_CHUNK):
+                            yield ''.join(json.dumps([f.ID, f.fileGrp, f.pageId, f.mimetype, f.url, f.local_filename]) + '\n'
+                                          for f in found[start:start + FILES_NDJSON_CHUNK])
+                    return StreamingResponse(lines(), media_type=MIMETYPE_FILES_NDJSON)
+                return JSONResponse({'files': [{'file_grp': f.fileGrp, 'file_id': f.ID, 'mimetype': f.mimetype, 'page_id': f.pageId,
+                                                'url': f.url, 'local_filename': f.local_filename} for f in found]})
+            return conditional(request, tag, respond)
 
         @app.put('/')
         def save():
-            return workspace.save_mets()
+            """
+            Save the METS, returning once all changes so far are written
+            """
+            commit.save()
 
         @app.post('/file', response_model=OcrdFileModel)
-        async def add_file(
+        def add_file(
             file_grp : str = Form(),
             file_id : str = Form(),
             page_id : Optional[str] = Form(),
@@ -264,44 +760,131 @@ class OcrdMetsServer():
             file_resource = OcrdFileModel.create(file_grp=file_grp, file_id=file_id, page_id=page_id, mimetype=mimetype, url=url, local_filename=local_filename)
             # Add to workspace
             kwargs = file_resource.dict()
-            workspace.add_file(**kwargs)
+            commit.apply(lambda: feed.added(workspace.add_file(**kwargs)))
             return file_resource
 
+        @app.delete('/file', response_model=OcrdFileListModel)
+        def remove_file(
+            file_grp : Optional[str] = None,
+            file_id : Optional[str] = None,
+            page_id : Optional[str] = None,
+            mimetype : Optional[str] = None,
+            local_filename : Optional[str] = None,
+            url : Optional[str] = None,
+        ):
+            """
+            Remove the files matching the query from the mets (but not from disk)
+            """
+            if all(value is None for value in (file_grp, file_id, page_id, mimetype, local_filename, url)):
+                return JSONResponse(status_code=400, content='refusing to remove all files')
+            query = dict(fileGrp=file_grp, ID=file_id, pageId=page_id, mimetype=mimetype, local_filename=local_filename, url=url)
+            def remove():
+                found = workspace.mets.find_all_files(**query)
+                if not found and not any(value.startswith(REGEX_PREFIX) for value in query.values() if value):
+                    raise FileNotFoundError(f"File not found: {query}")
+                # (before the files are detached from the METS)
+                removed = OcrdFileListModel.create(found)
+                workspace.mets.remove_files(found)
+                feed.removed(removed.files)
+                return removed
+            return commit.apply(remove)
+
+        @app.get('/changes', response_model=OcrdChangesModel)
+        async def changes(since : int = 0, timeout : float = 0):
+            """
+            The files added and removed after version ``since``, waiting up to ``timeout``
+            seconds for the first change if there are none yet.
+            With ``reset``, the changes since ``since`` are not available anymore.
+            """
+            if timeout > 0:
+                await feed.wait(since, timeout)
+            version, found = feed.since(since)
+            return JSONResponse({'version': version, 'reset': found is None,
+                                 'changes': [{'version': version, 'op': op, 'file': f} for version, op, f in found or []]})
+
+        @app.post('/files', response_model=OcrdFileListModel)
+        def add_files(files : OcrdFileListModel):
+            """
+            Add many files at once
+            """
+            commit.apply(lambda: feed.added(workspace.add_files([f.dict() for f in files.files])))
+            return files
+
+        @app.post('/batch', response_model=OcrdBatchResultModel)
+        def batch(batch : OcrdBatchModel):
+            """
+            Carry out many operations (``add_file`` or ``find_files``) in order, in a single request.
+            Consecutive ``add_file`` are added at once, like with ``/files``.
+            """
+            results : List[OcrdFileListModel] = []
+            added : List[OcrdFileModel] = []
+            def add():
+                if added:
+                    records = [f.dict() for f in added]
+                    commit.apply(lambda: feed.added(workspace.add_files(records)))
+                    results.extend(OcrdFileListModel(files=[f]) for f in added)
+                    added.clear()
+            for operation in batch.operations:
+                if operation.add_file is not None:
+                    added.append(operation.add_file)
+                    continue
+                add()
+                query = operation.find_files or OcrdFileQueryModel()
+                results.append(OcrdFileListModel.create(snapshot().find_all_files(
+                    fileGrp=query.file_grp, ID=query.file_id, pageId=query.page_id, mimetype=query.mimetype,
+                    local_filename=query.local_filename, url=query.url)))
+            add()
+            return OcrdBatchResultModel(results=results)
+
         @app.get('/file_groups', response_model=OcrdFileGroupListModel)
-        async def file_groups():
-            return {'file_groups': workspace.mets.file_groups}
+        def file_groups(request : Request):
+            snap, tag = versioned_snapshot()
+            return conditional(request, tag, lambda: JSONResponse({'file_groups': snap.file_groups}))
 
         @app.post('/agent', response_model=OcrdAgentModel)
-        async def add_agent(agent : OcrdAgentModel):
+        def add_agent(agent : OcrdAgentModel):
             kwargs = agent.dict()
             kwargs['_type'] = kwargs.pop('type')
-            workspace.mets.add_agent(**kwargs)
+            with lock:
+                workspace.mets.add_agent(**kwargs)
             return agent
 
         @app.get('/agent', response_model=OcrdAgentListModel)
-        async def agents():
-            return OcrdAgentListModel.create(workspace.mets.agents)
+        def agents(request : Request):
+            with lock:
+                tag = etag(workspace.mets.revision)
+                agents = OcrdAgentListModel.create(workspace.mets.agents)
+            return conditional(request, tag, lambda: JSONResponse(agents.dict()))
 
         @app.get('/unique_identifier', response_model=str)
-        async def unique_identifier():
-            return Response(content=workspace.mets.unique_identifier, media_type='text/plain')
+        def unique_identifier(request : Request):
+            with lock:
+                tag = etag(workspace.mets.revision)
+                identifier = workspace.mets.unique_identifier
+            return conditional(request, tag, lambda: Response(content=identifier, media_type='text/plain'))
 
         @app.get('/workspace_path', response_model=str)
         async def workspace_path():
             return Response(content=workspace.directory, media_type="text/plain")
 
         @app.post('/reload')
-        async def workspace_reload_mets():
-            workspace.reload_mets()
+        def workspace_reload_mets():
+            nonlocal generation
+            with lock:
+                workspace.reload_mets()
+                generation = uuid4().hex
+                feed.reset()
             return Response(content=f'Reloaded from {workspace.directory}', media_type="text/plain")
 
         @app.delete('/')
-        async def stop():
+        def stop():
             """
             Stop the server
             """
             self.log.info(f'Shutting down')
-            workspace.save_mets()
+            # flush deferred changes, since shutdown skips atexit handlers
+            with lock:
+                workspace.save_mets(flush=True)
             self.shutdown()
 
         # ------------- #
@@ -1,6 +1,10 @@
 from .base import (
     Processor,
 )
+from .ocrd_page_result import (
+    OcrdPageResult,
+    OcrdPageResultImage,
+)
 from .helpers import (
     run_cli,
     run_processor,
@@ -9,7 +9,10 @@ __all__ = [
     'run_processor'
 ]
 
-from os.path import exists
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from os.path import exists, join
 from shutil import copyfileobj
 import json
 import os
@@ -18,26 +21,43 @@ from pathlib import Path
 import sys
 import tarfile
 import io
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
 from ocrd.workspace import Workspace
 
 from ocrd_utils import (
     VERSION as OCRD_VERSION,
     MIMETYPE_PAGE,
     MIME_TO_EXT,
+    config,
     getLogger,
     initLogging,
     list_resource_candidates,
+    make_file_id,
     pushd_popd,
     list_all_resources,
     get_processor_resource_types,
     resource_filename,
 )
 from ocrd_validators import ParameterValidator
-from ocrd_models.ocrd_page import MetadataItemType, LabelType, LabelsType
+from ocrd_modelfactory import page_from_file
+from ocrd_models.ocrd_file import OcrdFile, ClientSideOcrdFile
+from ocrd_models.ocrd_page import MetadataItemType, LabelType, LabelsType, OcrdPage, PageType, to_xml
+from .ocrd_page_result import OcrdPageResult
 
 # XXX imports must remain for backwards-compatibility
 from .helpers import run_cli, run_processor, generate_processor_help # pylint: disable=unused-import
 
+# The processor in forked page worker processes (cf. Processor.process)
+_page_worker : Optional['Processor'] = None
+
+def _init_page_worker(processor : 'Processor') -> None:
+    global _page_worker # pylint: disable=global-statement
+    _page_worker = processor
+
+def _process_page_in_worker(input_files : Tuple[Optional[OcrdFile], ...]) -> List[Dict[str, Any]]:
+    assert _page_worker
+    return _page_worker._process_downloaded_page(input_files) # pylint: disable=protected-access
+
 class Processor():
     """
     A processor is a tool that implements the uniform OCR-D command-line interface
@@ -172,10 +192,208 @@ class Processor():
         for the given :py:attr:`page_id`
         under the given :py:attr:`parameter`.
         
-        (This contains the main functionality and needs to be overridden by subclasses.)
+        (This contains the main functionality and needs to be overridden by subclasses,
+        unless they implement :py:meth:`process_page_file` or :py:meth:`process_page_pcgts`.)
+
+        By default, process the input files of each page (cf. :py:meth:`zip_input_files`)
+        with :py:meth:`process_page_file`: one after another, or up to ``OCRD_MAX_PARALLEL_PAGES``
+        pages at once in a pool of threads or forked processes (``OCRD_PARALLEL_PAGES_POOL``).
+        The input files are downloaded and the output files added to the METS in page order
+        from this thread only.
+        One after another, the input PAGE of the next ``OCRD_PREFETCH_PAGES`` pages is parsed
+        (or for images created), and the images declared by :py:meth:`image_from_page_args`
+        decoded, in background threads meanwhile.
+        """
+        if type(self).process_page_file is Processor.process_page_file and \
+                type(self).process_page_pcgts is Processor.process_page_pcgts:
+            raise Exception("Must be implemented")
+        log = getLogger('ocrd.processor.base.process')
+        tasks = self.zip_input_files(on_error='abort')
+        max_workers = min(config.OCRD_MAX_PARALLEL_PAGES, len(tasks))
+        if max_workers > 1:
+            log.info("Processing %d pages with %d %ss", len(tasks), max_workers, config.OCRD_PARALLEL_PAGES_POOL)
+        for records in self._process_pages(tasks, max_workers):
+            if records:
+                self.workspace.add_files(records)
+
+    def _process_pages(self, tasks : List[Tuple[Optional[OcrdFile], ...]], max_workers : int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield the results of :py:meth:`process_page_file` for the input files of each page in order,
+        processing up to ``max_workers`` pages at once (with the input files downloaded
+        beforehand, cf. :py:meth:`_download_page`, and only one more page queued)
+        """
+        if max_workers <= 1:
+            # (prefetching what the default process_page_file would load)
+            if config.OCRD_PREFETCH_PAGES > 0 and type(self).process_page_file is Processor.process_page_file:
+                yield from self._process_pages_prefetched(tasks, config.OCRD_PREFETCH_PAGES)
+                return
+            for input_files in tasks:
+                yield self.process_page_file(*input_files)
+            return
+        executor : Union[ProcessPoolExecutor, ThreadPoolExecutor]
+        if config.OCRD_PARALLEL_PAGES_POOL == 'process':
+            # forked, so the processor (with its loaded models) need not be pickled
+            executor = ProcessPoolExecutor(max_workers, mp_context=get_context('fork'),
+                                           initializer=_init_page_worker, initargs=(self,))
+            process_page : Callable = _process_page_in_worker
+        else:
+            executor = ThreadPoolExecutor(max_workers, thread_name_prefix='ocrd-page')
+            process_page = self._process_downloaded_page
+        pending : Deque[Future] = deque()
+        try:
+            for input_files in tasks:
+                pending.append(executor.submit(process_page, self._download_page(input_files)))
+                if len(pending) > max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # on error, do not process the remaining pages
+            for future in pending:
+                future.cancel()
+            executor.shutdown()
+
+    def _process_pages_prefetched(self, tasks : List[Tuple[Optional[OcrdFile], ...]], depth : int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield the results of :py:meth:`process_page_file` for the input files of each page in order,
+        while the next ``depth`` pages are loaded (cf. :py:meth:`_prefetch_page`) in background threads
+        (with the input files downloaded beforehand, cf. :py:meth:`_download_page`)
+        """
+        executor = ThreadPoolExecutor(depth, thread_name_prefix='ocrd-prefetch')
+        pending : Deque[Tuple[Tuple[Optional[OcrdFile], ...], Future]] = deque()
+        def process_next():
+            input_files, future = pending.popleft()
+            input_pcgts, image_urls = future.result()
+            try:
+                return self._process_loaded_page(input_files, input_pcgts)
+            finally:
+                for image_url in image_urls:
+                    self.workspace.unload_image(image_url)
+        try:
+            for input_files in tasks:
+                pending.append((input_files, executor.submit(self._prefetch_page, self._download_page(input_files))))
+                if len(pending) > depth:
+                    yield process_next()
+            while pending:
+                yield process_next()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown()
+
+    def _prefetch_page(self, input_files : Tuple[Optional[OcrdFile], ...]) -> Tuple[List[Optional[OcrdPage]], List[str]]:
+        """
+        Parse the PAGE of the (downloaded) input files of a page (cf. :py:meth:`_load_page`), and preload
+        the images :py:meth:`process_page_pcgts` will get from it (cf. :py:meth:`image_from_page_args`).
+        Returns the input PAGE and the preloaded images.
+        """
+        input_pcgts = self._load_page(input_files)
+        page_id = next(input_file.pageId for input_file in input_files if input_file)
+        image_urls = []
+        for page, kwargs in self.image_from_page_args(*input_pcgts, page_id=page_id):
+            image_urls += self.workspace.preload_page_image(page, page_id, **kwargs)
+        return input_pcgts, image_urls
+
+    def _load_page(self, input_files : Tuple[Optional[OcrdFile], ...]) -> List[Optional[OcrdPage]]:
+        """
+        Parse (or for images create) the PAGE of each (downloaded) input file of a page
+        """
+        return [page_from_file(input_file) if input_file else None
+                for input_file in input_files]
+
+    def _download_page(self, input_files : Tuple[Optional[OcrdFile], ...]) -> Tuple[Optional[OcrdFile], ...]:
+        """
+        Download the input files of a page (in this thread, since that may change the METS),
+        and return copies of them detached from the METS (for other threads or processes)
+        """
+        downloaded : List[Optional[OcrdFile]] = []
+        for input_file in input_files:
+            if input_file:
+                input_file = self.workspace.download_file(input_file)
+                input_file = ClientSideOcrdFile(None, ID=input_file.ID, pageId=input_file.pageId, fileGrp=input_file.fileGrp,
+                                                mimetype=input_file.mimetype, url=input_file.url,
+                                                local_filename=input_file.local_filename)
+            downloaded.append(input_file)
+        return tuple(downloaded)
+
+    def _process_downloaded_page(self, input_files : Tuple[Optional[OcrdFile], ...]) -> List[Dict[str, Any]]:
+        """
+        Process the input files of a page like :py:meth:`process_page_file`, but (by default)
+        without downloading them (cf. :py:meth:`_download_page`)
+        """
+        if type(self).process_page_file is Processor.process_page_file:
+            return self._process_loaded_page(input_files, self._load_page(input_files))
+        return self.process_page_file(*input_files)
+
+    def process_page_file(self, *input_files : Optional[OcrdFile]) -> List[Dict[str, Any]]:
+        """
+        Process the input files of a single page (one for each :py:attr:`input_file_grp`,
+        or ``None`` if the page is missing in that fileGrp), and return the output files,
+        each as keyword arguments to :py:meth:`ocrd.workspace.Workspace.add_file` (including ``content``).
+
+        Since the default :py:meth:`process` may call this for many pages at once (in threads or
+        forked processes), implementations must not change the METS themselves. (There, the input
+        files have been downloaded already, and are passed as copies detached from the METS.)
+
+        By default, parse (or for images create) the PAGE of each input file, pass them to
+        :py:meth:`process_page_pcgts`, and serialize the resulting PAGE and images into
+        :py:attr:`output_file_grp`.
+        """
+        return self._process_loaded_page(input_files, self._load_page(self._download_page(input_files)))
+
+    def _process_loaded_page(self, input_files : Tuple[Optional[OcrdFile], ...], input_pcgts : List[Optional[OcrdPage]]) -> List[Dict[str, Any]]:
+        """
+        Process the PAGE of the input files of a page with :py:meth:`process_page_pcgts`, and serialize the result
+        """
+        page_id = next(input_file.pageId for input_file in input_files if input_file)
+        result = self.process_page_pcgts(*input_pcgts, page_id=page_id)
+        return self._serialize_page_result(input_files[0], page_id, result)
+
+    def _serialize_page_result(self, input_file : OcrdFile, page_id : str, result : OcrdPageResult) -> List[Dict[str, Any]]:
+        """
+        Name the resulting PAGE and images of a page after ``input_file`` (updating their IDs and
+        ``AlternativeImage`` filenames), and serialize them into output files for :py:attr:`output_file_grp`
+        """
+        file_id = make_file_id(input_file, self.output_file_grp)
+        records = []
+        for image in result.images:
+            image_id = f'{file_id}_{image.file_id_suffix}'
+            local_filename = join(self.output_file_grp, image_id + MIME_TO_EXT['image/png'])
+            image_bytes = io.BytesIO()
+            image.pil.save(image_bytes, format='PNG')
+            image.alternative_image.set_filename(local_filename)
+            records.append(dict(file_grp=self.output_file_grp, file_id=image_id, page_id=page_id,
+                                mimetype='image/png', local_filename=local_filename, content=image_bytes.getvalue()))
+        result.pcgts.set_pcGtsId(file_id)
+        self.add_metadata(result.pcgts)
+        records.append(dict(file_grp=self.output_file_grp, file_id=file_id, page_id=page_id, mimetype=MIMETYPE_PAGE,
+                            local_filename=join(self.output_file_grp, file_id + '.xml'),
+                            content=to_xml(result.pcgts).encode('utf-8')))
+        return records
+
+    def process_page_pcgts(self, *input_pcgts : Optional[OcrdPage], page_id : Optional[str] = None) -> OcrdPageResult:
+        """
+        Process the PAGE of a single page (one for each :py:attr:`input_file_grp`,
+        or ``None`` if the page is missing in that fileGrp), and return the resulting PAGE
+        along with any derived images (to be referenced as ``AlternativeImage``).
+
+        (This contains the main functionality of processors using the default
+        :py:meth:`process_page_file`, and needs to be overridden by them.)
         """
         raise Exception("Must be implemented")
 
+    def image_from_page_args(self, *input_pcgts : Optional[OcrdPage], page_id : Optional[str] = None) -> List[Tuple[PageType, Dict[str, Any]]]:
+        """
+        Declare the images :py:meth:`process_page_pcgts` will get for the PAGE of a single page,
+        as the ``page`` and keyword arguments (e.g. ``feature_selector``) of each call to
+        :py:meth:`ocrd.workspace.Workspace.image_from_page`, so they can be decoded ahead of time
+        when prefetching pages (``OCRD_PREFETCH_PAGES``).
+
+        By default, nothing is prefetched. For example, a processor calling
+        ``image_from_page(page, page_id, feature_selector='binarized')`` on its
+        first input would return ``[(input_pcgts[0].get_Page(), {'feature_selector': 'binarized'})]``.
+        """
+        return []
 
     def add_metadata(self, pcgts):
         """
@@ -1,6 +1,7 @@
 """
 Helper methods for running and documenting processors
 """
+from contextlib import nullcontext
 from os import chdir, getcwd
 from time import perf_counter, process_time
 from functools import lru_cache
@@ -101,20 +102,31 @@ def run_processor(
     otherrole = ocrd_tool['steps'][0]
     logProfile = getLogger('ocrd.process.profile')
     log.debug("Processor instance %s (%s doing %s)", processor, name, otherrole)
+    if workspace.is_remote and config.OCRD_METS_SERVER_BATCH_SIZE > 0:
+        # send the processor's add_file requests to the METS server in batches
+        mets_batch = workspace.mets.batch(config.OCRD_METS_SERVER_BATCH_SIZE)
+    else:
+        mets_batch = nullcontext()
+    if config.OCRD_WRITER_THREADS > 0:
+        # encode and write the processor's output files in the background
+        writes = workspace.async_writes(config.OCRD_WRITER_THREADS)
+    else:
+        writes = nullcontext()
     t0_wall = perf_counter()
     t0_cpu = process_time()
     if any(x in config.OCRD_PROFILE for x in ['RSS', 'PSS']):
         backend = 'psutil_pss' if 'PSS' in config.OCRD_PROFILE else 'psutil'
         from memory_profiler import memory_usage
         try:
-            mem_usage = memory_usage(proc=processor.process,
-                                     # only run process once
-                                     max_iterations=1,
-                                     interval=.1, timeout=None, timestamps=True,
-                                     # include sub-processes
-                                     multiprocess=True, include_children=True,
-                                     # get proportional set size instead of RSS
-                                     backend=backend)
+            with mets_batch, writes:
+                mem_usage = memory_usage(proc=processor.process,
+                                         # only run process once
+                                         max_iterations=1,
+                                         interval=.1, timeout=None, timestamps=True,
+                                         # include sub-processes
+                                         multiprocess=True, include_children=True,
+                                         # get proportional set size instead of RSS
+                                         backend=backend)
         except Exception as err:
             log.exception("Failure in processor '%s'" % ocrd_tool['executable'])
             raise err
@@ -127,7 +139,8 @@ def run_processor(
         logProfile.info(mem_output)
     else:
         try:
-            processor.process()
+            with mets_batch, writes:
+                processor.process()
         except Exception as err:
             log.exception("Failure in processor '%s'" % ocrd_tool['executable'])
             raise err
@@ -145,19 +158,27 @@ def run_processor(
         json.dumps(processor.parameter) or '',
         processor.page_id or ''
     ))
+    add_processor_agent(workspace, processor)
+    workspace.save_mets()
+    return processor
+
+
+def add_processor_agent(workspace, processor):
+    """
+    Record a run of ``processor`` (with its fileGrps, parameters and pages) as an agent in the METS of ``workspace``
+    """
+    ocrd_tool = processor.ocrd_tool
     workspace.mets.add_agent(
-        name=name,
+        name='%s v%s' % (ocrd_tool['executable'], processor.version),
         _type='OTHER',
         othertype='SOFTWARE',
         role='OTHER',
-        otherrole=otherrole,
+        otherrole=ocrd_tool['steps'][0],
         notes=[({'option': 'input-file-grp'}, processor.input_file_grp or ''),
                ({'option': 'output-file-grp'}, processor.output_file_grp or ''),
                ({'option': 'parameter'}, json.dumps(processor.parameter or '')),
                ({'option': 'page-id'}, processor.page_id or '')]
     )
-    workspace.save_mets()
-    return processor
 
 
 def run_cli(
@@ -0,0 +1,45 @@
+"""
+Results of processing a single page (cf. :py:meth:`ocrd.processor.base.Processor.process_page_pcgts`)
+"""
+from typing import List, Optional
+
+from PIL.Image import Image
+
+from ocrd_models.ocrd_page import OcrdPage, AlternativeImageType
+
+__all__ = [
+    'OcrdPageResult',
+    'OcrdPageResultImage',
+]
+
+class OcrdPageResultImage():
+    """
+    An image derived by a processor for a page, to be saved into the output fileGrp
+    and referenced by an ``AlternativeImage`` of the resulting PAGE
+    """
+
+    def __init__(self, pil : Image, file_id_suffix : str, alternative_image : AlternativeImageType) -> None:
+        """
+        Args:
+            pil (PIL.Image): the image
+            file_id_suffix (string): suffix for the ``@ID`` of the image file (after the ID of the PAGE file)
+            alternative_image (AlternativeImageType): the ``AlternativeImage`` to refer to the image,
+                its ``@filename`` will be set when saving
+        """
+        self.pil = pil
+        self.file_id_suffix = file_id_suffix
+        self.alternative_image = alternative_image
+
+class OcrdPageResult():
+    """
+    The resulting PAGE of processing a page, along with the images derived for it
+    """
+
+    def __init__(self, pcgts : OcrdPage, images : Optional[List[OcrdPageResultImage]] = None) -> None:
+        """
+        Args:
+            pcgts (OcrdPage): the resulting PAGE
+            images (list of OcrdPageResultImage): the images to save along with it
+        """
+        self.pcgts = pcgts
+        self.images = images if images is not None else []
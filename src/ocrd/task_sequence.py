@@ -1,10 +1,24 @@
 import json
+from contextlib import nullcontext
+from copy import copy
+from functools import lru_cache
+from inspect import isclass, unwrap
 from shlex import split as shlex_split
 from shutil import which
 
-from ocrd_utils import getLogger, parse_json_string_or_file, set_json_key_value_overrides, get_ocrd_tool_json
+from ocrd_utils import (
+    config,
+    getLogger,
+    parse_json_string_or_file,
+    pushd_popd,
+    set_json_key_value_overrides,
+    setOverrideLogLevel,
+    get_ocrd_tool_json,
+)
+from ocrd_utils.introspect import importlib_metadata
 # from collections import Counter
-from ocrd.processor.base import run_cli
+from ocrd.processor.base import Processor, run_cli, run_processor
+from ocrd.processor.helpers import add_processor_agent, get_cached_processor
 from ocrd.resolver import Resolver
 from ocrd_validators import ParameterValidator, WorkspaceValidator
 from ocrd_models import ValidationReport
@@ -42,6 +56,7 @@ class ProcessorTask():
         self.input_file_grps = input_file_grps
         self.output_file_grps = output_file_grps
         self.parameters = parameters
+        self.processor_class = None
         self._ocrd_tool_json = None
 
     @property
@@ -51,6 +66,19 @@ class ProcessorTask():
         self._ocrd_tool_json = get_ocrd_tool_json(self.executable)
         return self._ocrd_tool_json
 
+    @property
+    def streamable(self):
+        """
+        Whether the task runs in-process with the default per-page :py:meth:`~ocrd.Processor.process`
+        and :py:meth:`~ocrd.Processor.process_page_file`, i.e. its pages can be processed
+        from PAGE in memory (cf. :py:meth:`~ocrd.Processor.process_page_pcgts`)
+        """
+        cls = self.processor_class
+        return bool(cls) and len(self.output_file_grps) == 1 and \
+            cls.process is Processor.process and \
+            cls.process_page_file is Processor.process_page_file and \
+            cls.process_page_pcgts is not Processor.process_page_pcgts
+
     def validate(self):
         if not which(self.executable):
             raise Exception("Executable not found in PATH: %s" % self.executable)
@@ -85,6 +113,50 @@ class ProcessorTask():
             ret += " -p '%s'" % json.dumps(self.parameters)
         return ret
 
+@lru_cache()
+def get_python_processor(executable):
+    """
+    Find the Python :py:class:`~ocrd.Processor` class behind ``executable`` without instantiating it,
+    i.e. the class the command of its ``console_scripts`` entry point passes to
+    :py:func:`~ocrd.decorators.ocrd_cli_wrap_processor`.
+
+    Returns:
+        a tuple of the processor class and its ``ocrd-tool`` description (the entry of ``executable``
+        in the ``ocrd-tool.json`` loaded by the module of the command, or else from ``--dump-json``),
+        or ``(None, None)`` if ``executable`` is not a Python processor
+    """
+    log = getLogger('ocrd.task_sequence.get_python_processor')
+    entry_points = importlib_metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        entry_points = entry_points.select(group='console_scripts', name=executable)
+    else:
+        # Python < 3.10
+        entry_points = [ep for ep in entry_points.get('console_scripts', []) if ep.name == executable]
+    for entry_point in entry_points:
+        try:
+            cli = entry_point.load()
+        except Exception as err: # pylint: disable=broad-except
+            log.warning("Cannot load entry point of %s: %s", executable, err)
+            continue
+        callback = unwrap(getattr(cli, 'callback', None) or cli)
+        if not hasattr(callback, '__code__'):
+            continue
+        module_vars = callback.__globals__
+        for name in callback.__code__.co_names:
+            candidate = module_vars.get(name)
+            if not isclass(candidate) or not issubclass(candidate, Processor) or candidate is Processor:
+                continue
+            ocrd_tool = None
+            for value in module_vars.values():
+                if isinstance(value, dict) and isinstance(value.get('tools'), dict) and executable in value['tools']:
+                    ocrd_tool = dict(value['tools'][executable])
+                    ocrd_tool.setdefault('resource_locations', ['data', 'cwd', 'system', 'module'])
+                    break
+            else:
+                ocrd_tool = get_ocrd_tool_json(executable)
+            return candidate, ocrd_tool
+    return None, None
+
 def validate_tasks(tasks, workspace, page_id=None, overwrite=False):
     report = ValidationReport()
     prev_output_file_grps = workspace.mets.file_groups
@@ -115,43 +187,144 @@ def validate_tasks(tasks, workspace, page_id=None, overwrite=False):
     return report
 
 
-def run_tasks(mets, log_level, page_id, task_strs, overwrite=False):
+def run_tasks_streamed(workspace, tasks, log_level=None, page_id=None):
+    """
+    Run in-process ``tasks`` (cf. :py:attr:`ProcessorTask.streamable`), each working on the output
+    of the one before, page by page: every page is passed through all tasks before the next page,
+    handing the resulting PAGE and images of each task to the next one in memory
+    (while still adding them to the workspace).
+    """
+    if log_level:
+        setOverrideLogLevel(log_level)
+    processors = []
+    for task in tasks:
+        # (a copy, so consecutive tasks of the same cached instance keep their own fileGrps)
+        processor = copy(get_cached_processor(parameter=dict(task.parameters), processor_class=task.processor_class))
+        processor.workspace = workspace
+        processor.page_id = page_id or None
+        processor.input_file_grp = ','.join(task.input_file_grps)
+        processor.output_file_grp = task.output_file_grps[0]
+        processors.append(processor)
+    if config.OCRD_WRITER_THREADS > 0:
+        writes = workspace.async_writes(config.OCRD_WRITER_THREADS)
+    else:
+        writes = nullcontext()
+    with pushd_popd(workspace.directory), writes:
+        for input_files in processors[0].zip_input_files(on_error='abort'):
+            input_pcgts = processors[0]._load_page(processors[0]._download_page(input_files))
+            page = next(input_file.pageId for input_file in input_files if input_file)
+            image_urls = []
+            for processor in processors:
+                result = processor.process_page_pcgts(*input_pcgts, page_id=page)
+                for image_url in image_urls:
+                    workspace.unload_image(image_url)
+                output_files = workspace.add_files(processor._serialize_page_result(input_files[0], page, result))
+                # the PAGE (last) and images of this task are the input of the next
+                input_files, input_pcgts = (output_files[-1],), [result.pcgts]
+                image_urls = [image.alternative_image.get_filename() for image in result.images]
+                for image, image_url in zip(result.images, image_urls):
+                    workspace.preload_image(image_url, image=image.pil)
+            for image_url in image_urls:
+                workspace.unload_image(image_url)
+    for processor in processors:
+        add_processor_agent(workspace, processor)
+    workspace.save_mets()
+
+def run_tasks(mets, log_level, page_id, task_strs, overwrite=False, in_process=False, stream=False):
+    """
+    Run the processors of ``task_strs`` on the workspace of ``mets`` one after another.
+
+    Every task is run as a subprocess of its executable, unless ``in_process`` (or ``stream``) is true
+    and the executable is a Python processor (cf. :py:func:`get_python_processor`):
+    then it is run in this process, sharing the workspace between the tasks
+    and reusing processor instances (cf. :py:func:`~ocrd.processor.helpers.get_cached_processor`).
+
+    If ``stream`` is true, consecutive in-process tasks working on the output of the task before
+    are run page by page instead (cf. :py:func:`run_tasks_streamed`).
+    """
     resolver = Resolver()
     workspace = resolver.workspace_from_url(mets)
     log = getLogger('ocrd.task_sequence.run_tasks')
     tasks = [ProcessorTask.parse(task_str) for task_str in task_strs]
+    if in_process or stream:
+        for task in tasks:
+            task.processor_class, ocrd_tool = get_python_processor(task.executable)
+            if task.processor_class:
+                # no need for --dump-json
+                task._ocrd_tool_json = ocrd_tool
 
     validate_tasks(tasks, workspace, page_id, overwrite)
 
-    # Run the tasks
+    # group the tasks to stream pages through
+    chains = []
     for task in tasks:
+        if stream and chains and task.streamable and chains[-1][-1].streamable and \
+                task.input_file_grps == chains[-1][-1].output_file_grps:
+            chains[-1].append(task)
+        else:
+            chains.append([task])
+
+    # Run the tasks (saving the METS of in-process tasks may be deferred in between)
+    with workspace.write_behind():
+        for chain in chains:
+
+            log.info("Start processing task%s %s", 's' if len(chain) > 1 else '', ', '.join("'%s'" % task for task in chain))
+
+            if chain[0].processor_class:
+                # run in-process on the shared workspace (only overwriting and
+                # overriding the log level of the whole process for these tasks)
+                overwrite_mode = workspace.overwrite_mode
+                workspace.overwrite_mode = overwrite_mode or overwrite
+                ocrd_log_level = getLogger('ocrd').level
+                try:
+                    if len(chain) > 1:
+                        run_tasks_streamed(workspace, chain, log_level=log_level, page_id=page_id)
+                    else:
+                        task = chain[0]
+                        run_processor(
+                            task.processor_class,
+                            workspace=workspace,
+                            log_level=log_level,
+                            page_id=page_id,
+                            input_file_grp=','.join(task.input_file_grps),
+                            output_file_grp=','.join(task.output_file_grps),
+                            parameter=dict(task.parameters),
+                            instance_caching=True
+                        )
+                finally:
+                    workspace.overwrite_mode = overwrite_mode
+                    if log_level:
+                        setOverrideLogLevel(ocrd_log_level or None)
+            else:
+                task = chain[0]
+                # saving the METS of previous in-process tasks may have been deferred
+                workspace.save_mets(flush=True)
+
+                # execute cli
+                returncode = run_cli(
+                    task.executable,
+                    mets,
+                    resolver,
+                    workspace,
+                    log_level=log_level,
+                    page_id=page_id,
+                    overwrite=overwrite,
+                    input_file_grp=','.join(task.input_file_grps),
+                    output_file_grp=','.join(task.output_file_grps),
+                    parameter=json.dumps(task.parameters)
+                )
+
+                # check return code
+                if returncode != 0:
+                    raise Exception("%s exited with non-zero return value %s." % (task.executable, returncode))
+
+                # reload mets
+                workspace.reload_mets()
+
+            log.info("Finished processing task%s %s", 's' if len(chain) > 1 else '', ', '.join("'%s'" % task for task in chain))
 
-        log.info("Start processing task '%s'", task)
-
-        # execute cli
-        returncode = run_cli(
-            task.executable,
-            mets,
-            resolver,
-            workspace,
-            log_level=log_level,
-            page_id=page_id,
-            overwrite=overwrite,
-            input_file_grp=','.join(task.input_file_grps),
-            output_file_grp=','.join(task.output_file_grps),
-            parameter=json.dumps(task.parameters)
-        )
-
-        # check return code
-        if returncode != 0:
-            raise Exception("%s exited with non-zero return value %s." % (task.executable, returncode))
-
-        log.info("Finished processing task '%s'", task)
-
-        # reload mets
-        workspace.reload_mets()
-
-        # check output file groups are in mets
-        for output_file_grp in task.output_file_grps:
-            if not output_file_grp in workspace.mets.file_groups:
-                raise Exception("Invalid state: expected output file group '%s' not in METS (despite processor success)" % output_file_grp)
+            # check output file groups are in mets
+            for task in chain:
+                for output_file_grp in task.output_file_grps:
+                    if not output_file_grp in workspace.mets.file_groups:
+                        raise Exception("Invalid state: expected output file group '%s' not in METS (despite processor success)" % output_file_grp)
@@ -1,11 +1,15 @@
 import io
+from concurrent.futures import Future, ThreadPoolExecutor
 from os import makedirs, unlink, listdir, path
 from pathlib import Path
 from shutil import move, copyfileobj
 from re import sub
 from tempfile import NamedTemporaryFile
 from contextlib import contextmanager
-from typing import Optional, Union
+from functools import partial
+from threading import BoundedSemaphore
+from time import monotonic
+from typing import Callable, Dict, Iterator, List, Optional, Union
 
 from cv2 import COLOR_GRAY2BGR, COLOR_RGB2BGR, cvtColor
 from PIL import Image
@@ -13,7 +17,7 @@ import numpy as np
 from deprecated.sphinx import deprecated
 import requests
 
-from ocrd_models import OcrdMets, OcrdFile
+from ocrd_models import OcrdMets, OcrdFile, ShardedOcrdMets
 from ocrd_models.ocrd_file import ClientSideOcrdFile
 from ocrd_models.ocrd_page import parse, BorderType, to_xml
 from ocrd_modelfactory import exif_from_filename, page_from_file
@@ -43,6 +47,7 @@ from ocrd_utils import (
     MIMETYPE_PAGE,
     REGEX_PREFIX
 )
+from ocrd_utils.config import config
 
 from .workspace_backup import WorkspaceBackupManager
 from .mets_server import ClientSideOcrdMets
@@ -77,7 +82,7 @@ class Workspace():
         self,
         resolver,
         directory,
-        mets : Optional[Union[OcrdMets, ClientSideOcrdMets]] = None,
+        mets : Optional[Union[OcrdMets, ShardedOcrdMets, ClientSideOcrdMets]] = None,
         mets_basename=DEFAULT_METS_BASENAME,
         automatic_backup=False,
         baseurl=None,
@@ -88,6 +93,18 @@ class Workspace():
         self.mets_target = str(Path(directory, mets_basename))
         self.overwrite_mode = False
         self.is_remote = bool(mets_server_url)
+        # the OcrdMets instance last loaded from or written to mets_target, and when
+        self._saved_mets = None
+        self._mets_saved_at = monotonic()
+        # whether save_mets may defer writing (cf. write_behind)
+        self._write_behind = False
+        # images decoded ahead of time by path (cf. preload_image)
+        self._preloaded_images : Dict[str, Image.Image] = {}
+        # background writer of file contents, its pending writes by path,
+        # and the bound on their number (cf. async_writes)
+        self._writer : Optional[ThreadPoolExecutor] = None
+        self._pending_writes : Dict[str, Future] = {}
+        self._pending_writes_bound : Optional[BoundedSemaphore] = None
         if mets is None:
             if self.is_remote:
                 mets = ClientSideOcrdMets(mets_server_url)
@@ -95,7 +112,9 @@ class Workspace():
                     raise ValueError(f"METS server {mets_server_url} workspace directory {mets.workspace_path} differs "
                             f"from local workspace directory {self.directory}. These are not the same workspaces.")
             else:
-                mets = OcrdMets(filename=self.mets_target)
+                mets = self._load_mets()
+                # METS on disk is up to date with this instance
+                self._saved_mets = mets
         self.mets = mets
         if automatic_backup:
             self.automatic_backup = WorkspaceBackupManager(self)
@@ -118,7 +137,18 @@ class Workspace():
         """
         Reload METS from the filesystem.
         """
-        self.mets = OcrdMets(filename=self.mets_target)
+        self.mets = self._load_mets()
+        self._saved_mets = self.mets
+
+    def _load_mets(self):
+        """
+        Load METS from the filesystem, as :py:class:`ocrd_models.ocrd_mets_sharded.ShardedOcrdMets`
+        if ``OCRD_METS_SHARD_PAGES`` is set
+        """
+        if config.OCRD_METS_SHARD_PAGES > 0:
+            return ShardedOcrdMets(filename=self.mets_target, shard_pages=config.OCRD_METS_SHARD_PAGES,
+                                   max_shards=config.OCRD_METS_SHARD_CACHE)
+        return OcrdMets(filename=self.mets_target)
 
     @deprecated_alias(pageId="page_id")
     @deprecated_alias(ID="file_id")
@@ -132,7 +162,9 @@ class Workspace():
 
         Keyword Args:
             copy_files (boolean): Whether to copy files from `other_workspace` to this one
+                (in parallel, after merging the METS)
         """
+        copies = []
         def after_add_cb(f):
             """callback to run on merged OcrdFile instances in the destination"""
             if not f.local_filename:
@@ -149,10 +181,12 @@ class Workspace():
             if fpath_src.exists():
                 if fpath_dest.exists() and not overwrite:
                     raise FileExistsError("Copying %s to %s would overwrite the latter" % (fpath_src, fpath_dest))
-                if not fpath_dest.parent.is_dir():
-                    makedirs(str(fpath_dest.parent))
-                with open(str(fpath_src), 'rb') as fstream_in, open(str(fpath_dest), 'wb') as fstream_out:
-                    copyfileobj(fstream_in, fstream_out)
+                copies.append((fpath_src, fpath_dest))
+        def copy_file(fpaths):
+            fpath_src, fpath_dest = fpaths
+            makedirs(str(fpath_dest.parent), exist_ok=True)
+            with open(str(fpath_src), 'rb') as fstream_in, open(str(fpath_dest), 'wb') as fstream_out:
+                copyfileobj(fstream_in, fstream_out)
         if 'page_id' in kwargs:
             kwargs['pageId'] = kwargs.pop('page_id')
         if 'file_id' in kwargs:
@@ -163,6 +197,10 @@ class Workspace():
             kwargs['fileGrp_mapping'] = kwargs.pop('filegrp_mapping')
 
         self.mets.merge(other_workspace.mets, after_add_cb=after_add_cb, **kwargs)
+        if copies:
+            with ThreadPoolExecutor() as pool:
+                # consume to propagate errors
+                list(pool.map(copy_file, copies))
 
 
     @deprecated(version='1.0.0', reason="Use workspace.download_file")
@@ -189,6 +227,7 @@ class Workspace():
         log = getLogger('ocrd.workspace.download_file')
         with pushd_popd(self.directory):
             if f.local_filename:
+                self._wait_for_write(f.local_filename)
                 file_path = Path(f.local_filename).absolute()
                 if file_path.exists():
                     try:
@@ -273,6 +312,60 @@ class Workspace():
             if not force:
                 raise e
 
+    def remove_files(self, files, force=False, keep_files=False):
+        """
+        Remove many METS `file`s from the workspace at once.
+
+        The files are removed from the METS in a single operation (cf.
+        :py:meth:`ocrd_models.ocrd_mets.OcrdMets.remove_files`) and deleted
+        from disk by a pool of threads.
+
+        Arguments:
+            files (list): `@ID` of the METS `file`s to delete or the files themselves
+        Keyword Args:
+            force (boolean): Continue removing even if files not found in METS or on disk
+            keep_files (boolean): Whether to keep files on disk
+        Returns:
+            list of the removed files
+        """
+        log = getLogger('ocrd.workspace.remove_files')
+        if self.overwrite_mode:
+            force = True
+        ocrd_files = []
+        for file_id in files:
+            if isinstance(file_id, OcrdFile):
+                ocrd_files.append(file_id)
+                continue
+            ocrd_file = next(self.mets.find_files(ID=file_id), None)
+            if ocrd_file:
+                ocrd_files.append(ocrd_file)
+            elif not force:
+                raise FileNotFoundError("File %s not found in METS" % file_id)
+        if keep_files:
+            return self.mets.remove_files(ocrd_files, force=force)
+
+        for ocrd_file in ocrd_files:
+            if not ocrd_file.local_filename:
+                if force:
+                    log.debug("File not locally available but --force is set: %s", ocrd_file)
+                else:
+                    raise Exception("File not locally available %s" % ocrd_file)
+        def _unlink(ocrd_file):
+            try:
+                log.debug("rm %s [cwd=%s]", ocrd_file.local_filename, self.directory)
+                unlink(Path(self.directory, ocrd_file.local_filename))
+            except OSError as e:
+                return e
+        local_files = [f for f in ocrd_files if f.local_filename]
+        with ThreadPoolExecutor() as pool:
+            errors = {f.ID: e for f, e in zip(local_files, pool.map(_unlink, local_files)) if e}
+        # like remove_file, keep files in the METS which could not be deleted
+        failed = {ID: e for ID, e in errors.items() if not (force and isinstance(e, FileNotFoundError))}
+        ret = self.mets.remove_files([f for f in ocrd_files if f.ID not in failed])
+        if failed:
+            raise next(iter(failed.values()))
+        return ret
+
     def remove_file_group(self, USE, recursive=False, force=False, keep_files=False, page_recursive=False, page_same_group=False):
         """
         Remove a METS `fileGrp`.
@@ -296,8 +389,13 @@ class Workspace():
 
         file_dirs = []
         if recursive:
-            for f in self.mets.find_files(fileGrp=USE):
-                self.remove_file(f, force=force, keep_file=keep_files, page_recursive=page_recursive, page_same_group=page_same_group)
+            files = list(self.mets.find_files(fileGrp=USE))
+            if page_recursive:
+                for f in files:
+                    self.remove_file(f, force=force, keep_file=keep_files, page_recursive=page_recursive, page_same_group=page_same_group)
+            else:
+                self.remove_files(files, force=force, keep_files=keep_files)
+            for f in files:
                 if f.local_filename:
                     f_dir = path.dirname(f.local_filename)
                     if f_dir:
@@ -431,26 +529,190 @@ class Workspace():
             # content being set implies is_remote==False because METS server
             # does not pass file contents
             if content is not None:
-                with open(kwargs['local_filename'], 'wb') as f:
-                    if isinstance(content, str):
-                        content = bytes(content, 'utf-8')
-                    f.write(content)
+                self._write_file(kwargs['local_filename'], content)
+
+        return ret
+
+    def add_files(self, records, **kwargs) -> List[Union[OcrdFile, ClientSideOcrdFile]]:
+        """
+        Add many files to the :py:class:`ocrd_models.ocrd_mets.OcrdMets` of the workspace at once.
+
+        Arguments:
+            records (list(dict)): For each file, the arguments to :py:meth:`add_file`,
+                i.e. ``file_grp``, ``page_id`` and optionally ``file_id``, ``mimetype``,
+                ``url``, ``local_filename`` and ``content``
+        Keyword Args:
+            **kwargs: See :py:func:`ocrd_models.ocrd_mets.OcrdMets.add_files`
+        Returns:
+            list of the new :py:class:`ocrd_models.ocrd_file.OcrdFile`
+        """
+        log = getLogger('ocrd.workspace.add_files')
+        records = [dict(record) for record in records]
+        log.debug('outputfiles n=%d', len(records))
+        for record in records:
+            if 'page_id' not in record:
+                raise ValueError("workspace.add_files must be passed a 'page_id' for each file, even if it is None.")
+            if record.get('content') is not None and not record.get('local_filename'):
+                raise Exception("'content' was set but no 'local_filename'")
+        if self.overwrite_mode:
+            kwargs['force'] = True
+
+        with pushd_popd(self.directory):
+            contents = []
+            for record in records:
+                content = record.pop('content', None)
+                if record.get('local_filename'):
+                    # If the local filename has folder components, create those folders
+                    local_filename_dir = str(record['local_filename']).rsplit('/', 1)[0]
+                    if local_filename_dir != str(record['local_filename']) and not Path(local_filename_dir).is_dir():
+                        makedirs(local_filename_dir)
+                    if content is not None:
+                        contents.append((record['local_filename'], content))
+                record["fileGrp"] = record.pop("file_grp")
+                record["pageId"] = record.pop("page_id")
+                if "file_id" in record:
+                    record["ID"] = record.pop("file_id")
+
+            ret = self.mets.add_files(records, **kwargs)
+
+            # content being set implies is_remote==False because METS server
+            # does not pass file contents
+            for local_filename, content in contents:
+                self._write_file(local_filename, content)
 
         return ret
 
-    def save_mets(self):
+    @contextmanager
+    def async_writes(self, threads : int = 4, max_pending : Optional[int] = None) -> Iterator['Workspace']:
+        """
+        Within this context, write the ``content`` of files added with :py:meth:`add_file` or
+        :py:meth:`add_files` (and encode the images of :py:meth:`save_image_file`) in ``threads``
+        background threads, blocking when ``max_pending`` (default: ``4 * threads``) are not written yet.
+        The files are still added to the METS immediately, in the order of the calls.
+
+        Errors of the writes are raised by :py:meth:`flush_writes`, which waits for all pending writes,
+        and is called by :py:meth:`save_mets` and when leaving the context.
+        """
+        if self._writer is not None:
+            # already within
+            yield self
+            return
+        self._writer = ThreadPoolExecutor(threads, thread_name_prefix='ocrd-writer')
+        self._pending_writes_bound = BoundedSemaphore(max_pending or 4 * threads)
+        try:
+            yield self
+            self.flush_writes()
+        finally:
+            self._writer.shutdown()
+            self._writer = None
+            self._pending_writes.clear()
+
+    def flush_writes(self) -> None:
+        """
+        Wait until all files written in the background (cf. :py:meth:`async_writes`) are written,
+        and raise the first error of these writes, if any
+        """
+        pending, self._pending_writes = self._pending_writes, {}
+        for future in pending.values():
+            if future.exception():
+                raise future.exception()
+
+    def _write_file(self, local_filename, content : Union[str, bytes, Callable[[], bytes]]) -> None:
+        """
+        Write ``content`` (or the bytes returned by it) to ``local_filename``,
+        in the background within :py:meth:`async_writes`
+        """
+        path = Path(self.directory, local_filename)
+        def write():
+            data = content() if callable(content) else content
+            with open(path, 'wb') as f:
+                f.write(bytes(data, 'utf-8') if isinstance(data, str) else data)
+        if self._writer is None:
+            write()
+            return
+        # (writes of the same file in order)
+        self._wait_for_write(local_filename)
+        self._pending_writes_bound.acquire()
+        future = self._writer.submit(write)
+        future.add_done_callback(lambda _: self._pending_writes_bound.release())
+        self._pending_writes[str(local_filename)] = future
+
+    def _wait_for_write(self, local_filename) -> None:
+        """
+        Wait until a pending write of ``local_filename`` (cf. :py:meth:`async_writes`) is done
+        """
+        future = self._pending_writes.get(str(local_filename))
+        if future is not None:
+            future.exception()
+
+    def save_mets(self, flush=False):
         """
         Write out the current state of the METS file to the filesystem.
+
+        Nothing is written if the METS was not changed since it was loaded from
+        or written to the filesystem. Within :py:meth:`write_behind`, writing a changed METS
+        may be deferred until enough time has passed or enough changes have been made.
+
+        Keyword Args:
+            flush (boolean): Write a changed METS even if writing could be deferred
         """
         log = getLogger('ocrd.workspace.save_mets')
+        # files must be written before the METS referencing them
+        self.flush_writes()
         if self.is_remote:
             self.mets.save()
-        else:
-            log.debug("Saving mets '%s'", self.mets_target)
-            if self.automatic_backup:
-                WorkspaceBackupManager(self).add()
-            with atomic_write(self.mets_target) as f:
-                f.write(self.mets.to_xml(xmllint=True).decode('utf-8'))
+            return
+        if self._saved_mets is self.mets and Path(self.mets_target).exists():
+            if not self.mets.changes:
+                log.debug("Not saving unchanged mets '%s'", self.mets_target)
+                return
+            if not flush and self._write_behind and self._defer_save_mets():
+                log.debug("Deferring saving mets '%s'", self.mets_target)
+                return
+        log.debug("Saving mets '%s'", self.mets_target)
+        if self.automatic_backup:
+            WorkspaceBackupManager(self).add()
+        with atomic_write(self.mets_target, mode='wb') as f:
+            self.mets.write_xml(f, xmllint=config.OCRD_METS_XMLLINT)
+        if config.OCRD_METS_SIDECAR_INDEX:
+            self.mets.write_sidecar_index(self.mets_target)
+        self.mets.mark_saved()
+        self._saved_mets = self.mets
+        self._mets_saved_at = monotonic()
+
+    @contextmanager
+    def write_behind(self) -> Iterator['Workspace']:
+        """
+        Within this context, let :py:meth:`save_mets` defer writing a changed METS until
+        ``OCRD_METS_WRITE_BEHIND_SECONDS`` have passed or ``OCRD_METS_WRITE_BEHIND_CHANGES``
+        changes have been made since it was last written. Deferred changes are written
+        when leaving the context (unless by an exception) or with ``save_mets(flush=True)``.
+        """
+        if self._write_behind:
+            # already within
+            yield self
+            return
+        self._write_behind = True
+        try:
+            yield self
+            self.save_mets(flush=True)
+        finally:
+            self._write_behind = False
+
+    def _defer_save_mets(self):
+        """
+        Whether writing the changed METS can be deferred according to
+        ``OCRD_METS_WRITE_BEHIND_SECONDS`` and ``OCRD_METS_WRITE_BEHIND_CHANGES``
+        """
+        seconds = config.OCRD_METS_WRITE_BEHIND_SECONDS
+        changes = config.OCRD_METS_WRITE_BEHIND_CHANGES
+        if seconds <= 0 and changes <= 0:
+            return False
+        if seconds > 0 and monotonic() - self._mets_saved_at >= seconds:
+            return False
+        if changes > 0 and self.mets.changes >= changes:
+            return False
+        return True
 
     def resolve_image_exif(self, image_url):
         """
@@ -492,23 +754,69 @@ class Workspace():
         """
         return self._resolve_image_as_pil(image_url, coords)
 
+    def preload_image(self, image_url, image : Optional[Image.Image] = None) -> bool:
+        """
+        Decode the local image file ``image_url`` ahead of time (e.g. in a background thread),
+        so the next :py:meth:`image_from_page` or :py:meth:`image_from_segment` needing it
+        does not have to read it anymore. Unused images should be discarded with :py:meth:`unload_image`.
+
+        If ``image`` is given (e.g. the image just saved as ``image_url``), keep that instead of decoding.
+
+        Returns:
+            whether the image was preloaded (i.e. is a local file)
+        """
+        if image is not None:
+            self._preloaded_images[str(image_url)] = image
+            return True
+        if not image_url or not Path(self.directory, image_url).is_file():
+            return False
+        pil_image = Image.open(Path(self.directory, image_url))
+        pil_image.load()
+        self._preloaded_images[str(image_url)] = pil_image
+        return True
+
+    def preload_page_image(self, page, page_id, feature_selector='', feature_filter='', filename='', **kwargs) -> List[str]:
+        """
+        Decode the images :py:meth:`image_from_page` reads for ``page`` with the same arguments
+        ahead of time (cf. :py:meth:`preload_image`), i.e. the original image and the
+        ``AlternativeImage`` selected by ``feature_selector``, ``feature_filter`` and ``filename``.
+        (Other keyword arguments of :py:meth:`image_from_page` do not matter here.)
+
+        Returns:
+            the ``image_url`` of the preloaded images
+        """
+        image_urls = [page.get_imageFilename()]
+        best_image = _select_page_image(page, page_id, feature_selector, feature_filter, filename)
+        if best_image:
+            image_urls.append(best_image.get_filename())
+        return [image_url for image_url in dict.fromkeys(image_urls) if self.preload_image(image_url)]
+
+    def unload_image(self, image_url) -> None:
+        """
+        Discard the image ``image_url`` if it was preloaded (cf. :py:meth:`preload_image`) but not used
+        """
+        self._preloaded_images.pop(str(image_url), None)
+
     def _resolve_image_as_pil(self, image_url, coords=None):
         if not image_url:
             # avoid "finding" just any file
             raise Exception("Cannot resolve empty image path")
         log = getLogger('ocrd.workspace._resolve_image_as_pil')
         with pushd_popd(self.directory):
-            try:
-                f = next(self.mets.find_files(local_filename=str(image_url)))
-                pil_image = Image.open(f.local_filename)
-            except StopIteration:
+            pil_image = self._preloaded_images.pop(str(image_url), None)
+            if pil_image is None:
+                self._wait_for_write(image_url)
                 try:
-                    f = next(self.mets.find_files(url=str(image_url)))
-                    pil_image = Image.open(self.download_file(f).local_filename)
+                    f = next(self.mets.find_files(local_filename=str(image_url)))
+                    pil_image = Image.open(f.local_filename)
                 except StopIteration:
-                    with download_temporary_file(image_url) as f:
-                        pil_image = Image.open(f.name)
-            pil_image.load() # alloc and give up the FD
+                    try:
+                        f = next(self.mets.find_files(url=str(image_url)))
+                        pil_image = Image.open(self.download_file(f).local_filename)
+                    except StopIteration:
+                        with download_temporary_file(image_url) as f:
+                            pil_image = Image.open(f.name)
+                pil_image.load() # alloc and give up the FD
 
         # Pillow does not properly support higher color depths
         # (e.g. 16-bit or 32-bit or floating point grayscale),
@@ -672,39 +980,10 @@ class Workspace():
 
         # initialize AlternativeImage@comments classes as empty:
         page_coords['features'] = ''
-        best_image = None
-        alternative_images = page.get_AlternativeImage()
-        if alternative_images:
-            # (e.g. from page-level cropping, binarization, deskewing or despeckling)
-            best_features = set()
-            auto_features = {'cropped', 'deskewed', 'rotated-90', 'rotated-180', 'rotated-270'}
-            # search to the end, because by convention we always append,
-            # and among multiple satisfactory images we want the most recent,
-            # but also ensure that we get the richest feature set, i.e. most
-            # of those features that we cannot reproduce automatically below
-            for alternative_image in alternative_images:
-                if filename and filename != alternative_image.filename:
-                    continue
-                features = alternative_image.get_comments()
-                if not features:
-                    log.warning("AlternativeImage %d for page '%s' does not have any feature attributes",
-                                alternative_images.index(alternative_image) + 1, page_id)
-                    features = ''
-                featureset = set(features.split(','))
-                if (all(feature in featureset
-                        for feature in feature_selector.split(',') if feature) and
-                    not any(feature in featureset
-                            for feature in feature_filter.split(',') if feature) and
-                    len(featureset.difference(auto_features)) >= \
-                    len(best_features.difference(auto_features))):
-                    best_features = featureset
-                    best_image = alternative_image
-            if best_image:
-                log.debug("Using AlternativeImage %d %s for page '%s'",
-                          alternative_images.index(best_image) + 1,
-                          best_features, page_id)
-                page_image = self._resolve_image_as_pil(best_image.get_filename())
-                page_coords['features'] = best_image.get_comments() # including duplicates
+        best_image = _select_page_image(page, page_id, feature_selector, feature_filter, filename, log=log)
+        if best_image:
+            page_image = self._resolve_image_as_pil(best_image.get_filename())
+            page_coords['features'] = best_image.get_comments() # including duplicates
 
         # adjust the coord transformation to the steps applied on the image,
         # and apply steps on the existing image in case it is missing there,
@@ -1070,16 +1349,20 @@ class Workspace():
         log = getLogger('ocrd.workspace.save_image_file')
         if self.overwrite_mode:
             force = True
-        image_bytes = io.BytesIO()
-        image.save(image_bytes, format=MIME_TO_PIL[mimetype])
+        pil_format = MIME_TO_PIL[mimetype]
         file_path = str(Path(file_grp, '%s%s' % (file_id, MIME_TO_EXT[mimetype])))
+        def encode(image):
+            image_bytes = io.BytesIO()
+            image.save(image_bytes, format=pil_format)
+            return image_bytes.getvalue()
         out = self.add_file(
             file_grp,
             file_id=file_id,
             page_id=page_id,
             local_filename=file_path,
             mimetype=mimetype,
-            content=image_bytes.getvalue(),
+            # within async_writes, encode in the background (a copy, in case the image is changed later)
+            content=encode(image) if self._writer is None else partial(encode, image.copy()),
             force=force)
         log.info('created file ID: %s, file_grp: %s, path: %s',
                  file_id, file_grp, out.local_filename)
@@ -1107,6 +1390,46 @@ class Workspace():
         with pushd_popd(self.directory):
             return self.mets.find_files(*args, **kwargs)
 
+def _select_page_image(page, page_id, feature_selector, feature_filter, filename, log=None):
+    """
+    Select the ``AlternativeImage`` of ``page`` :py:meth:`Workspace.image_from_page` uses
+    for ``feature_selector``, ``feature_filter`` and ``filename``, if any
+    (warning about images without features on ``log``, if given)
+    """
+    best_image = None
+    alternative_images = page.get_AlternativeImage()
+    if alternative_images:
+        # (e.g. from page-level cropping, binarization, deskewing or despeckling)
+        best_features = set()
+        auto_features = {'cropped', 'deskewed', 'rotated-90', 'rotated-180', 'rotated-270'}
+        # search to the end, because by convention we always append,
+        # and among multiple satisfactory images we want the most recent,
+        # but also ensure that we get the richest feature set, i.e. most
+        # of those features that we cannot reproduce automatically below
+        for alternative_image in alternative_images:
+            if filename and filename != alternative_image.filename:
+                continue
+            features = alternative_image.get_comments()
+            if not features:
+                if log:
+                    log.warning("AlternativeImage %d for page '%s' does not have any feature attributes",
+                                alternative_images.index(alternative_image) + 1, page_id)
+                features = ''
+            featureset = set(features.split(','))
+            if (all(feature in featureset
+                    for feature in feature_selector.split(',') if feature) and
+                not any(feature in featureset
+                        for feature in feature_filter.split(',') if feature) and
+                len(featureset.difference(auto_features)) >= \
+                len(best_features.difference(auto_features))):
+                best_features = featureset
+                best_image = alternative_image
+        if best_image and log:
+            log.debug("Using AlternativeImage %d %s for page '%s'",
+                      alternative_images.index(best_image) + 1,
+                      best_features, page_id)
+    return best_image
+
 def _crop(log, name, segment, parent_image, parent_coords, op='cropped', **kwargs):
     segment_coords = parent_coords.copy()
     # get polygon outline of segment relative to parent image:
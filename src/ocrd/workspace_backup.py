@@ -83,8 +83,8 @@ class WorkspaceBackupManager():
             mets_file = join(d, DEFAULT_METS_BASENAME)
             log.info("Backing up to %s" % mets_file)
             makedirs(d)
-            with atomic_write(mets_file) as f:
-                f.write(mets_str.decode('utf-8'))
+            with atomic_write(mets_file, mode='wb') as f:
+                f.write(mets_str)
         return chksum
 
     def list(self):
@@ -4,6 +4,7 @@ APIs and schemas for various file formats in the OCR domain.
 from .ocrd_agent import OcrdAgent, ClientSideOcrdAgent
 from .ocrd_exif import OcrdExif
 from .ocrd_file import OcrdFile, ClientSideOcrdFile
-from .ocrd_mets import OcrdMets
+from .ocrd_mets import OcrdMets, OcrdMetsSnapshot
+from .ocrd_mets_sharded import ShardedOcrdMets
 from .ocrd_xml_base import OcrdXmlDocument
 from .report import ValidationReport
@@ -18,6 +18,7 @@ __all__ = [
     'TAG_METS_METSHDR',
     'TAG_METS_NAME',
     'TAG_METS_NOTE',
+    'TAG_METS_STRUCTLINK',
     'TAG_METS_STRUCTMAP',
     'TAG_MODS_IDENTIFIER',
     'TAG_PAGE_ALTERNATIVEIMAGE',
@@ -55,6 +56,7 @@ TAG_METS_FLOCAT           = '{%s}FLocat' % NAMESPACES['mets']
 TAG_METS_METSHDR          = '{%s}metsHdr' % NAMESPACES['mets']
 TAG_METS_NAME             = '{%s}name' % NAMESPACES['mets']
 TAG_METS_NOTE             = '{%s}note' % NAMESPACES['mets']
+TAG_METS_STRUCTLINK       = '{%s}structLink' % NAMESPACES['mets']
 TAG_METS_STRUCTMAP        = '{%s}structMap' % NAMESPACES['mets']
 
 TAG_MODS_IDENTIFIER       = '{%s}identifier' % NAMESPACES['mods']
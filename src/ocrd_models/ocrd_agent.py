@@ -21,7 +21,7 @@ class OcrdAgent():
     #      return OcrdAgent(el, name, role, _type, otherrole)
 
     def __init__(self, el=None, name=None, _type=None, othertype=None, role=None, otherrole=None,
-                 notes=None):
+                 notes=None, mets=None):
         """
         Args:
             el (LxmlElement):
@@ -31,16 +31,23 @@ class OcrdAgent():
             role (string):
             otherrole (string):
             notes (dict):
+            mets (OcrdMets): the METS containing ``el`` (to count changes)
         """
         if el is None:
             el = ET.Element(TAG_METS_AGENT)
         self._el = el
+        self.mets = None
         self.name = name
         self.type = _type
         self.othertype = othertype
         self.role = role
         self.otherrole = otherrole
         self.notes = notes
+        self.mets = mets
+
+    def _changed(self):
+        if self.mets is not None:
+            self.mets._changes += 1
 
     def __str__(self):
         """
@@ -66,6 +73,7 @@ class OcrdAgent():
         """
         if _type is not None:
             self._el.set('TYPE', _type)
+            self._changed()
 
     @property
     def othertype(self):
@@ -82,6 +90,7 @@ class OcrdAgent():
         if othertype is not None:
             self._el.set('TYPE', 'OTHER')
             self._el.set('OTHERTYPE', othertype)
+            self._changed()
 
     @property
     def role(self):
@@ -97,6 +106,7 @@ class OcrdAgent():
         """
         if role is not None:
             self._el.set('ROLE', role)
+            self._changed()
 
     @property
     def otherrole(self):
@@ -113,6 +123,7 @@ class OcrdAgent():
         if otherrole is not None:
             self._el.set('ROLE', 'OTHER')
             self._el.set('OTHERROLE', otherrole)
+            self._changed()
 
     @property
     def name(self):
@@ -133,6 +144,7 @@ class OcrdAgent():
             if el_name is None:
                 el_name = ET.SubElement(self._el, TAG_METS_NAME)
             el_name.text = name
+            self._changed()
 
     @property
     def notes(self):
@@ -160,6 +172,7 @@ class OcrdAgent():
                 el_note.text = text
                 for name, value in attrib.items():
                     el_note.set('{%s}' % NS["ocrd"] + name, value)
+            self._changed()
 
 
 class ClientSideOcrdAgent():
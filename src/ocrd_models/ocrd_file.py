@@ -110,6 +110,8 @@ class OcrdFile():
             raise Exception("OcrdFile %s has no member 'mets' pointing to parent OcrdMets" % self)
         old_id = self.ID
         self._el.set('ID', ID)
+        # also update the file caches
+        self.mets._update_file_cache(self._el, 'ID', old_id, ID) # pylint: disable=protected-access
         # also update the references in the physical structmap
         for pageId in self.mets.remove_physical_page_fptr(fileId=old_id):
             self.pageId = pageId
@@ -155,7 +157,10 @@ class OcrdFile():
         """
         if mimetype is None:
             return
+        old_mimetype = self._el.get('MIMETYPE')
         self._el.set('MIMETYPE', mimetype)
+        if self.mets is not None:
+            self.mets._update_file_cache(self._el, 'mimetype', old_mimetype, mimetype) # pylint: disable=protected-access
 
     @property
     def fileGrp(self) -> str:
@@ -182,15 +187,19 @@ class OcrdFile():
         """
         Set the remote/original URL ``@xlink:href`` of this ``mets:file`` to :py:attr:`url`.
         """
+        old_url = self.url
         el_FLocat = self._el.find('mets:FLocat[@LOCTYPE="URL"]', NS)
         if url is None:
             if el_FLocat is not None:
                 self._el.remove(el_FLocat)
-            return
-        if el_FLocat is None:
-            el_FLocat = ET.SubElement(self._el, TAG_METS_FLOCAT)
-        el_FLocat.set("{%s}href" % NS["xlink"], url)
-        el_FLocat.set("LOCTYPE", "URL")
+        else:
+            if el_FLocat is None:
+                el_FLocat = ET.SubElement(self._el, TAG_METS_FLOCAT)
+            el_FLocat.set("{%s}href" % NS["xlink"], url)
+            el_FLocat.set("LOCTYPE", "URL")
+        if self.mets is not None:
+            # pylint: disable=protected-access
+            self.mets._update_file_cache(self._el, 'url', old_url or None, self.url or None)
 
     @property
     def local_filename(self) -> Optional[str]:
@@ -207,18 +216,121 @@ class OcrdFile():
         """
         Set the local/cached ``@xlink:href`` of this ``mets:file`` to :py:attr:`local_filename`.
         """
+        old_fname = self.local_filename
         el_FLocat = self._el.find('mets:FLocat[@LOCTYPE="OTHER"][@OTHERLOCTYPE="FILE"]', NS)
         if not fname:
             if el_FLocat is not None:
                 self._el.remove(el_FLocat)
-            return
         else:
-            fname = str(fname)
-        if el_FLocat is None:
-            el_FLocat = ET.SubElement(self._el, TAG_METS_FLOCAT)
-        el_FLocat.set("{%s}href" % NS["xlink"], fname)
-        el_FLocat.set("LOCTYPE", "OTHER")
-        el_FLocat.set("OTHERLOCTYPE", "FILE")
+            if el_FLocat is None:
+                el_FLocat = ET.SubElement(self._el, TAG_METS_FLOCAT)
+            el_FLocat.set("{%s}href" % NS["xlink"], str(fname))
+            el_FLocat.set("LOCTYPE", "OTHER")
+            el_FLocat.set("OTHERLOCTYPE", "FILE")
+        if self.mets is not None:
+            # pylint: disable=protected-access
+            self.mets._update_file_cache(self._el, 'local_filename', old_fname, self.local_filename)
+
+
+# Marks attributes of a CachedOcrdFile not yet read from the mets:file
+_UNSET = object()
+
+class CachedOcrdFile(OcrdFile):
+    """
+    Lightweight :py:class:`OcrdFile` as returned by :py:meth:`ocrd_models.ocrd_mets.OcrdMets.find_files`
+    when caching is enabled. ``ID``, ``fileGrp``, ``mimetype`` and ``pageId`` are snapshot
+    from the caches on construction, ``url`` and ``local_filename`` together on first access,
+    and read from slots for as long as the METS is unchanged. Once the METS has been changed (including by
+    writing to this object), reads fall through to the live ``mets:file``.
+    """
+    __slots__ = ('_generation', '_ID', '_fileGrp', '_mimetype', '_pageId', '_url', '_local_filename')
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, el, mets, ID : str, fileGrp : str, mimetype : Optional[str], pageId : Optional[str]):
+        """
+        Args:
+            el (LxmlElement): etree Element of the ``mets:file`` this represents
+            mets (OcrdMets): Containing :py:class:`ocrd_models.ocrd_mets.OcrdMets`, which must be caching
+            ID (string): current ``@ID`` of the ``mets:file``
+            fileGrp (string): current ``@USE`` of the containing ``mets:fileGrp``
+            mimetype (string): current ``@MIMETYPE`` of the ``mets:file``
+            pageId (string): current ``@ID`` of the physical page of the ``mets:file``
+        """
+        self._el = el
+        self.mets = mets
+        self._generation = mets._cache_generation # pylint: disable=protected-access
+        self._ID = ID
+        self._fileGrp = fileGrp
+        self._mimetype = mimetype
+        self._pageId = pageId
+        self._url = self._local_filename = _UNSET
+
+    def _is_current(self) -> bool:
+        """
+        Whether the snapshot still reflects the METS (writes discard it)
+        """
+        return self._generation == self.mets._cache_generation # pylint: disable=protected-access
+
+    @property
+    def ID(self) -> str:
+        return self._ID if self._is_current() else OcrdFile.ID.fget(self)
+
+    @ID.setter
+    def ID(self, ID : Optional[str]) -> None:
+        self._generation = None
+        OcrdFile.ID.fset(self, ID)
+
+    @property
+    def fileGrp(self) -> str:
+        return self._fileGrp if self._is_current() else OcrdFile.fileGrp.fget(self)
+
+    @property
+    def mimetype(self) -> str:
+        return self._mimetype if self._is_current() else OcrdFile.mimetype.fget(self)
+
+    @mimetype.setter
+    def mimetype(self, mimetype : Optional[str]) -> None:
+        self._generation = None
+        OcrdFile.mimetype.fset(self, mimetype)
+
+    @property
+    def pageId(self) -> str:
+        return self._pageId if self._is_current() else OcrdFile.pageId.fget(self)
+
+    @pageId.setter
+    def pageId(self, pageId : Optional[str]) -> None:
+        self._generation = None
+        OcrdFile.pageId.fset(self, pageId)
+
+    def _snapshot_locations(self) -> None:
+        url, self._local_filename = self.mets._file_locations(self._el) # pylint: disable=protected-access
+        self._url = url or ''
+
+    @property
+    def url(self) -> str:
+        if not self._is_current():
+            return OcrdFile.url.fget(self)
+        if self._url is _UNSET:
+            self._snapshot_locations()
+        return self._url
+
+    @url.setter
+    def url(self, url : Optional[str]) -> None:
+        self._generation = None
+        OcrdFile.url.fset(self, url)
+
+    @property
+    def local_filename(self) -> Optional[str]:
+        if not self._is_current():
+            return OcrdFile.local_filename.fget(self)
+        if self._local_filename is _UNSET:
+            self._snapshot_locations()
+        return self._local_filename
+
+    @local_filename.setter
+    def local_filename(self, local_filename : Optional[Union[Path, str]]) -> None:
+        self._generation = None
+        OcrdFile.local_filename.fset(self, local_filename)
 
 
 class ClientSideOcrdFile:
@@ -1,12 +1,22 @@
 """
 API to METS
 """
+from bisect import bisect_left, bisect_right
+from copy import deepcopy
 from datetime import datetime
+from hashlib import sha256
+from io import BytesIO
+from itertools import islice
+import json
+from os import makedirs, stat
+from os.path import abspath, dirname, join
 import re
 from lxml import etree as ET
-from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
 
 from ocrd_utils import (
+    atomic_write,
     getLogger,
     generate_range,
     VERSION,
@@ -23,8 +33,10 @@ from .constants import (
     TAG_METS_FILE,
     TAG_METS_FILEGRP,
     TAG_METS_FILESEC,
+    TAG_METS_FLOCAT,
     TAG_METS_FPTR,
     TAG_METS_METSHDR,
+    TAG_METS_STRUCTLINK,
     TAG_METS_STRUCTMAP,
     IDENTIFIER_PRIORITY,
     TAG_MODS_IDENTIFIER,
@@ -33,10 +45,253 @@ from .constants import (
 )
 
 from .ocrd_xml_base import OcrdXmlDocument, ET      # type: ignore
-from .ocrd_file import OcrdFile
+from .ocrd_file import CachedOcrdFile, ClientSideOcrdFile, OcrdFile
 from .ocrd_agent import OcrdAgent
 
 REGEX_PREFIX_LEN = len(REGEX_PREFIX)
+# Version of the format written by OcrdMets.write_sidecar_index
+SIDECAR_INDEX_VERSION = 1
+# Non-numeric prefix and numeric suffix of a page attribute value
+REGEX_NUMBER_SUFFIX = re.compile(r'(.*?)(\d+)')
+# Columns of OcrdMets.to_table
+TABLE_COLUMNS = ('ID', 'fileGrp', 'pageId', 'mimetype', 'url', 'local_filename')
+
+class _PageRange(NamedTuple):
+    """
+    A ``start..end`` range of page attribute values, as expanded by :py:func:`ocrd_utils.generate_range`.
+    """
+    start : str
+    # values have the form prefix + zero-padded number between first and last
+    prefix : Optional[str]
+    width : int
+    first : int
+    last : int
+    # otherwise, the expanded range
+    values : Optional[List[str]]
+
+    @staticmethod
+    def parse(start : str, end : str) -> '_PageRange':
+        start_nums = REGEX_NUMBER_SUFFIX.fullmatch(start)
+        end_nums = REGEX_NUMBER_SUFFIX.fullmatch(end)
+        if start_nums and end_nums and start_nums.group(1) == end_nums.group(1) \
+                and start.count(start_nums.group(2)) == 1 and start_nums.group(2) != end_nums.group(2):
+            return _PageRange(start, start_nums.group(1), len(start_nums.group(2)),
+                              int(start_nums.group(2)), int(end_nums.group(2)), None)
+        # leave validation and all other cases to generate_range
+        return _PageRange(start, None, 0, 0, 0, generate_range(start, end))
+
+    def match(self, values : Dict[str, Any], number_index : Callable[[], Dict[str, Tuple[List[int], List[str]]]]) -> List[str]:
+        """
+        The values of this range that are keys in ``values``, in order.
+        ``number_index`` provides the same keys ordered by number (cf. :py:func:`_number_index`).
+        """
+        if self.values is not None:
+            return [v for v in self.values if v in values]
+        numbers, ordered_values = number_index().get(self.prefix, ([], []))
+        lo, hi = bisect_left(numbers, self.first), bisect_right(numbers, self.last)
+        return [v for n, v in zip(numbers[lo:hi], ordered_values[lo:hi])
+                if v == self.prefix + str(n).zfill(self.width)]
+
+def _number_index(values : Iterable[str]) -> Dict[str, Tuple[List[int], List[str]]]:
+    """
+    Group all ``values`` with a numeric suffix by their prefix, and sort each group by number.
+    """
+    groups : Dict[str, List[Tuple[int, str]]] = {}
+    for value in values:
+        m = REGEX_NUMBER_SUFFIX.fullmatch(value)
+        if m:
+            groups.setdefault(m.group(1), []).append((int(m.group(2)), value))
+    index = {}
+    for prefix, group in groups.items():
+        group.sort()
+        index[prefix] = ([n for n, _ in group], [v for _, v in group])
+    return index
+
+def _page_index(pages : Iterable[Any], attr : METS_PAGE_DIV_ATTRIBUTE) -> Dict[str, Any]:
+    """
+    Map each value of ``attr`` to the first of the ``pages`` which has it.
+    """
+    index : Dict[str, Any] = {}
+    for page in pages:
+        value = page.get(attr.name)
+        if value is not None:
+            index.setdefault(value, page)
+    return index
+
+def _resolve_pageIds(
+    for_pageIds : str,
+    page_index : Callable[[METS_PAGE_DIV_ATTRIBUTE], Dict[str, Any]],
+    number_index : Callable[[METS_PAGE_DIV_ATTRIBUTE], Dict[str, Tuple[List[int], List[str]]]],
+    pages : Optional[List[Any]] = None
+) -> List[Any]:
+    """
+    Find the pages selected by :py:attr:`for_pageIds` (comma-separated literals, ranges and/or regexes
+    for page ``@ID``, ``@ORDER``, ``@ORDERLABEL`` etc., cf. :py:meth:`OcrdMets.get_physical_pages`).
+    Pages can be anything with a ``get(attribute)`` method. ``page_index`` and ``number_index``
+    provide the pages by the value of an attribute and those values ordered by number (cf. :py:func:`_number_index`).
+    If all ``pages`` are given, regexes match all of them (not just the first per value),
+    and the result is in their order.
+    """
+    page_attr_patterns_raw = re.split(r',', for_pageIds)
+    page_attr_patterns = []
+    for pageId_token in page_attr_patterns_raw:
+        if pageId_token.startswith(REGEX_PREFIX):
+            page_attr_patterns.append(re.compile(pageId_token[REGEX_PREFIX_LEN:]))
+        elif '..' in pageId_token:
+            page_attr_patterns.append(_PageRange.parse(*pageId_token.split('..', 1)))
+        else:
+            page_attr_patterns.append(pageId_token)
+    ret = []
+    unmatched = []
+    ranges_without_start_match = []
+    for pageId_token, pat in zip(page_attr_patterns_raw, page_attr_patterns):
+        # match against the first attribute with any matching value
+        for attr in METS_PAGE_DIV_ATTRIBUTE:
+            if pages is not None and isinstance(pat, re.Pattern):
+                matched_pages = [page for page in pages if pat.fullmatch(page.get(attr.name) or '')]
+                if matched_pages:
+                    ret += matched_pages
+                    break
+                continue
+            attr_index = page_index(attr)
+            if isinstance(pat, str):
+                matches = [pat] if pat in attr_index else []
+            elif isinstance(pat, _PageRange):
+                matches = pat.match(attr_index, lambda: number_index(attr))
+            else:
+                matches = [v for v in attr_index if pat.fullmatch(v)]
+            if matches:
+                if isinstance(pat, _PageRange) and matches[0] != pat.start:
+                    ranges_without_start_match.append(pageId_token)
+                ret += [attr_index[v] for v in matches]
+                break
+        else:
+            unmatched.append(pageId_token)
+    if unmatched:
+        raise ValueError(f"Patterns {unmatched} match none of the pages")
+    if ranges_without_start_match:
+        raise ValueError(f"Start of range patterns {ranges_without_start_match} not matched - invalid range")
+    if pages is not None:
+        # in document order
+        page_order = {id(page): order for order, page in enumerate(pages)}
+        ret.sort(key=lambda page: page_order[id(page)])
+    return ret
+
+def _validate_file(ID : Optional[str], fileGrp : Optional[str]) -> None:
+    """
+    Check the ``@ID`` and ``mets:fileGrp/@USE`` of a ``mets:file`` to be added
+    """
+    if not ID:
+        raise ValueError("Must set ID of the mets:file")
+    if not fileGrp:
+        raise ValueError("Must set fileGrp of the mets:file")
+    if not REGEX_FILE_ID.fullmatch(ID):
+        raise ValueError("Invalid syntax for mets:file/@ID %s (not an xs:ID)" % ID)
+    if not REGEX_FILE_ID.fullmatch(fileGrp):
+        raise ValueError("Invalid syntax for mets:fileGrp/@USE %s (not an xs:ID)" % fileGrp)
+
+def _table(rows : Iterable[Tuple[Optional[str], ...]]) -> Dict[str, np.ndarray]:
+    """
+    Transpose ``rows`` of values of :py:data:`TABLE_COLUMNS` into NumPy string arrays (``''`` for ``None``)
+    """
+    columns = list(zip(*rows)) or [()] * len(TABLE_COLUMNS)
+    return {column: np.array([value or '' for value in values], dtype=str)
+            for column, values in zip(TABLE_COLUMNS, columns)}
+
+def _files_table(files : Iterable[Any]) -> Dict[str, np.ndarray]:
+    """
+    Columns of :py:data:`TABLE_COLUMNS` for ``files`` (anything with the attributes of
+    :py:class:`ocrd_models.ocrd_file.OcrdFile`)
+    """
+    return _table((f.ID, f.fileGrp, f.pageId, f.mimetype, f.url, f.local_filename) for f in files)
+
+def _merge_records(other_mets, fileGrp_mapping : Optional[Dict[str, str]], fileId_mapping : Optional[Dict[str, str]],
+                   pageId_mapping : Optional[Dict[str, str]], **kwargs) -> Tuple[List[Dict[str, Any]], List[Optional[ET._Element]]]:
+    """
+    The records (for :py:meth:`OcrdMets.add_files`) of the files of ``other_mets`` matching ``kwargs``
+    with their mapped fileGrp, ``@ID`` and page, and the page ``mets:div`` of each in ``other_mets``
+    (cf. :py:meth:`OcrdMets.merge`)
+    """
+    if not fileGrp_mapping:
+        fileGrp_mapping = {}
+    if not fileId_mapping:
+        fileId_mapping = {}
+    if not pageId_mapping:
+        pageId_mapping = {}
+    # map all files, pages and IDs up front
+    files_src = list(other_mets.find_files(**kwargs))
+    pages_src = other_mets.get_physical_pages(for_fileIds=[f_src.ID for f_src in files_src], return_divs=True)
+    records = []
+    for f_src, page_src in zip(files_src, pages_src):
+        pageId = page_src.get('ID') if page_src is not None else None
+        records.append(dict(
+            fileGrp=fileGrp_mapping.get(f_src.fileGrp, f_src.fileGrp),
+            mimetype=f_src.mimetype,
+            url=f_src.url,
+            local_filename=f_src.local_filename,
+            ID=fileId_mapping.get(f_src.ID, f_src.ID),
+            pageId=pageId_mapping.get(pageId, pageId)))
+    return records, pages_src
+
+def _merge_page_attributes(page_src : ET._Element, page_dest : Mapping[str, str]) -> Dict[str, str]:
+    """
+    The attributes (except ``@ID``) of the page ``mets:div`` ``page_src`` that are unset in ``page_dest``
+    (the element or its attributes)
+    """
+    return {attr.name: page_src.get(attr.name) for attr in METS_PAGE_DIV_ATTRIBUTE
+            if attr.name != 'ID' and page_src.get(attr.name) and not page_dest.get(attr.name)}
+
+def _merge_agents(mets, other_mets) -> None:
+    """
+    Add the agents of ``other_mets`` not in ``mets`` yet
+    """
+    el_agents = {ET.tostring(agent._el) for agent in mets.agents}
+    for agent in other_mets.agents:
+        if ET.tostring(agent._el) not in el_agents:
+            el_agent = mets.add_agent()._el
+            el_agent.attrib.update(agent._el.attrib)
+            el_agent.extend(deepcopy(el) for el in agent._el)
+
+def _merge_structure(el_root : ET._Element, other_mets, merged_pages : Dict[str, str]) -> None:
+    """
+    Add the logical ``mets:structMap`` of ``other_mets`` (if ``el_root`` has none) and the
+    ``mets:smLink`` entries to the pages of ``merged_pages`` (page ``@ID`` by page ``@ID`` in ``other_mets``)
+    """
+    log = getLogger('ocrd.models.ocrd_mets.merge')
+    # (the logical structMap and structLink of a ShardedOcrdMets are in its skeleton)
+    other_root = getattr(other_mets, '_skeleton', other_mets)._tree.getroot()
+    def append_after_structmaps(el):
+        el_structmaps = el_root.findall('mets:structMap', NS)
+        if el_structmaps:
+            el_structmaps[-1].addnext(el)
+        else:
+            el_root.append(el)
+    el_logmap = other_root.find('mets:structMap[@TYPE="LOGICAL"]', NS)
+    if el_logmap is not None:
+        if el_root.find('mets:structMap[@TYPE="LOGICAL"]', NS) is None:
+            append_after_structmaps(deepcopy(el_logmap))
+        else:
+            log.debug("Keeping the logical structMap of this METS")
+    smlinks_src : Dict[str, List[ET._Element]] = {}
+    for el_smlink in other_root.iterfind('mets:structLink/mets:smLink', NS):
+        smlinks_src.setdefault(el_smlink.get('{%s}to' % NS['xlink']), []).append(el_smlink)
+    if smlinks_src and merged_pages:
+        el_structlink = el_root.find('mets:structLink', NS)
+        if el_structlink is None:
+            el_structlink = ET.Element(TAG_METS_STRUCTLINK)
+            append_after_structmaps(el_structlink)
+        smlinks = {(el_smlink.get('{%s}from' % NS['xlink']), el_smlink.get('{%s}to' % NS['xlink']))
+                   for el_smlink in el_structlink.iterfind('mets:smLink', NS)}
+        for pageId, pageId_src in merged_pages.items():
+            for el_smlink_src in smlinks_src.get(pageId_src, []):
+                smlink = (el_smlink_src.get('{%s}from' % NS['xlink']), pageId)
+                if smlink in smlinks:
+                    continue
+                smlinks.add(smlink)
+                el_smlink = deepcopy(el_smlink_src)
+                el_smlink.set('{%s}to' % NS['xlink'], pageId)
+                el_structlink.append(el_smlink)
+    # FIXME: merge amdSec, dmdSec as well
 
 class OcrdMets(OcrdXmlDocument):
     """
@@ -59,6 +314,36 @@ class OcrdMets(OcrdXmlDocument):
     # The inner dictionary's Key: 'fptr.FILEID'
     # The inner dictionary's Value: a 'fptr' object at some memory location
     _fptr_cache : Dict[str, Dict[str, ET._Element]]
+    # Reverse cache for the file pointers (mets:fptr) - two nested dictionaries
+    # The outer dictionary's Key: 'fptr.FILEID'
+    # The outer dictionary's Value: Inner dictionary
+    # The inner dictionary's Key: 'div.ID'
+    # The inner dictionary's Value: a 'div' object at some memory location
+    _file_page_cache : Dict[str, Dict[str, ET._Element]]
+    # Secondary caches for the files (mets:file) - three nested dictionaries
+    # The outer dictionary's Key: one of 'mimetype', 'url' or 'local_filename'
+    # The middle dictionary's Key: '@MIMETYPE' or the '@xlink:href' of the respective 'FLocat'
+    # The inner dictionary's Key: 'file.ID'
+    # The inner dictionary's Value: a 'file' object at some memory location
+    _file_attr_cache : Dict[str, Dict[str, Dict[str, ET._Element]]]
+    # Incremented on every change to the caches, so that snapshots of
+    # mets:file (CachedOcrdFile) can tell whether they are outdated
+    _cache_generation : int = 0
+    # Number of modifications since the METS was loaded, and as of the last mark_saved
+    _changes : int = 0
+    _saved_changes : int = 0
+    # Values of the page cache grouped by prefix and ordered by number, for each attribute,
+    # as of _page_number_index_generation (cf. _page_number_index)
+    _page_number_indexes : Dict[METS_PAGE_DIV_ATTRIBUTE, Dict[str, Tuple[List[int], List[str]]]]
+    _page_number_index_generation : int = -1
+    # The last snapshot, and what add_file/add_files changed since: the number of
+    # changes, the @ID of the added files by fileGrp, and whether pages may have been added
+    _snapshot : Optional['OcrdMetsSnapshot'] = None
+    _snapshot_added_changes : int = 0
+    _snapshot_added_files : Dict[str, List[str]]
+    _snapshot_added_pages : bool = False
+    # Whether OCRD_METS_CACHING overrides the cache_flag passed to the constructor
+    _cache_flag_from_env : bool = True
 
     @staticmethod
     def empty_mets(now : Optional[str] = None, cache_flag : bool = False):
@@ -72,24 +357,57 @@ class OcrdMets(OcrdXmlDocument):
         tpl = tpl.replace('{{ NOW }}', '%s' % now)
         return OcrdMets(content=tpl.encode('utf-8'), cache_flag=cache_flag)
 
-    def __init__(self, **kwargs) -> None:
+    @staticmethod
+    def from_table(table : Mapping[str, Sequence[Optional[str]]], now : Optional[str] = None,
+                   cache_flag : bool = False) -> 'OcrdMets':
+        """
+        Create a METS from bundled template with the files of ``table``, added in bulk with :py:meth:`add_files`.
+        Arguments:
+            table (dict): Columns as returned by :py:meth:`to_table`, or loaded from its serialization
+                (e.g. an ``.npz`` archive or a ``pyarrow.Table``), which must at least comprise ``ID``
+                and ``fileGrp``. Empty values are taken as missing.
+        Keyword Args:
+            now (string): creation date for ``mets:metsHdr``, cf. :py:meth:`empty_mets`
+            cache_flag (boolean): whether to enable caching on the new METS
         """
+        if hasattr(table, 'to_pydict'):
+            # pyarrow.Table
+            table = table.to_pydict()
+        columns = [column for column in TABLE_COLUMNS if column in table]
+        mets = OcrdMets.empty_mets(now=now, cache_flag=cache_flag)
+        mets.add_files({column: str(value) for column, value in zip(columns, row) if value}
+                       for row in zip(*[table[column] for column in columns]))
+        return mets
+
+    def __init__(self, iterparse : bool = False, **kwargs) -> None:
+        """
+        Keyword Args:
+            iterparse (boolean): If caching is enabled, fill the caches while parsing
+                (in a single ``lxml.etree.iterparse`` pass) instead of traversing the parsed tree
         """
-        super(OcrdMets, self).__init__(**kwargs)
-
         # XXX If the environment variable OCRD_METS_CACHING is set to "true",
         # then enable caching, if "false", disable caching, overriding the
         # kwarg to the constructor
-        if config.is_set('OCRD_METS_CACHING'):
+        if self._cache_flag_from_env and config.is_set('OCRD_METS_CACHING'):
             getLogger('ocrd.models.ocrd_mets').debug('METS Caching %s because OCRD_METS_CACHING is %s',
                     'enabled' if config.OCRD_METS_CACHING else 'disabled', config.raw_value('OCRD_METS_CACHING'))
-            self._cache_flag = config.OCRD_METS_CACHING
+            kwargs['cache_flag'] = config.OCRD_METS_CACHING
+        # Likewise for OCRD_METS_ITERPARSE
+        if config.is_set('OCRD_METS_ITERPARSE'):
+            iterparse = config.OCRD_METS_ITERPARSE
+        # An up-to-date sidecar index beats filling the caches while parsing
+        sidecar_index = None
+        if kwargs.get('cache_flag') and kwargs.get('filename') and config.OCRD_METS_SIDECAR_INDEX:
+            sidecar_index = self._read_sidecar_index(kwargs['filename'].replace('file://', ''))
+        self._iterparse = iterparse and sidecar_index is None
 
+        super(OcrdMets, self).__init__(**kwargs)
 
-        # If cache is enabled
-        if self._cache_flag:
-            self._initialize_caches()
-            self._refresh_caches()
+        # If cache is enabled (and has not been filled while parsing)
+        if self._cache_flag and not self._iterparse:
+            if sidecar_index is None or not self._apply_sidecar_index(sidecar_index):
+                self._initialize_caches()
+                self._refresh_caches()
 
     def __str__(self) -> str:
         """
@@ -98,6 +416,134 @@ class OcrdMets(OcrdXmlDocument):
         return 'OcrdMets[cached=%s,fileGrps=%s,files=%s]' % (
         self._cache_flag, self.file_groups, list(self.find_files()))
 
+    @property
+    def revision(self) -> int:
+        """
+        Number of modifications (through this API) since the METS was loaded,
+        i.e. the :py:attr:`OcrdMetsSnapshot.revision` of the next :py:meth:`snapshot`
+        """
+        return self._changes
+
+    @property
+    def changes(self) -> int:
+        """
+        Number of modifications (through this API) since the METS was loaded or :py:meth:`mark_saved` was called
+        """
+        return self._changes - self._saved_changes
+
+    def mark_saved(self) -> None:
+        """
+        Mark the current state of the METS as saved, i.e. reset :py:attr:`changes`
+        """
+        self._saved_changes = self._changes
+
+    def snapshot(self) -> 'OcrdMetsSnapshot':
+        """
+        Get an immutable :py:class:`OcrdMetsSnapshot` of the files and physical pages of this METS.
+
+        A snapshot is unaffected by later changes to the METS, so it can be queried from
+        other threads while the METS is modified. Until the METS changes, the same snapshot is
+        returned again. If the METS was only changed by :py:meth:`add_file` and :py:meth:`add_files`,
+        the new snapshot shares all unaffected ``mets:fileGrp`` with the previous one.
+
+        Note: The snapshot itself must not be taken while the METS is being modified.
+        """
+        prev = self._snapshot
+        if prev is not None and prev.revision == self._changes:
+            return prev
+        if prev is not None and self._snapshot_added_changes == self._changes - prev.revision:
+            # copy-on-write of the fileGrps with added files
+            fileGrps = dict(prev._fileGrps) # pylint: disable=protected-access
+            for fileGrp, files in self._snapshot_files(self._snapshot_added_files).items():
+                fileGrps[fileGrp] = _FileGrpSnapshot(fileGrps.get(fileGrp))
+                for ID, file_pages in files.items():
+                    if file_pages is None:
+                        fileGrps[fileGrp].remove_file(ID)
+                    else:
+                        fileGrps[fileGrp].add_file(*file_pages)
+            pages = self._snapshot_pages() if self._snapshot_added_pages else prev._pages # pylint: disable=protected-access
+        else:
+            fileGrps = {}
+            for fileGrp, files in self._snapshot_files({fileGrp: None for fileGrp in self.file_groups}).items():
+                fileGrps[fileGrp] = _FileGrpSnapshot()
+                for file_pages in files.values():
+                    if file_pages is not None:
+                        fileGrps[fileGrp].add_file(*file_pages)
+            pages = self._snapshot_pages()
+        self._snapshot = OcrdMetsSnapshot(self._changes, fileGrps, pages)
+        self._snapshot_added_changes = 0
+        self._snapshot_added_files = {}
+        self._snapshot_added_pages = False
+        return self._snapshot
+
+    def _snapshot_files(self, file_ids : Dict[str, Optional[List[str]]]) -> Dict[str, Dict[str, Optional[Tuple[ClientSideOcrdFile, List[str]]]]]:
+        """
+        Copy the files with ``@ID`` in ``file_ids[fileGrp]`` (or all files, if ``None``) for each fileGrp,
+        along with the ``@ID`` of all their pages (``None`` for files that no longer exist)
+        """
+        ret : Dict[str, Dict[str, Optional[Tuple[ClientSideOcrdFile, List[str]]]]] = {}
+        el_files : Dict[str, Optional[ET._Element]] = {}
+        fileGrps : Dict[str, str] = {}
+        for fileGrp, IDs in file_ids.items():
+            ret[fileGrp] = {}
+            if self._cache_flag:
+                fileGrp_files = self._file_cache.get(fileGrp, {})
+            else:
+                el_fileGrp = self._tree.getroot().find('mets:fileSec/mets:fileGrp[@USE="%s"]' % fileGrp, NS)
+                fileGrp_files = {} if el_fileGrp is None else {
+                    el_file.get('ID'): el_file for el_file in el_fileGrp.iterfind('mets:file', NS)}
+            for ID in fileGrp_files if IDs is None else IDs:
+                el_files[ID] = fileGrp_files.get(ID)
+                fileGrps[ID] = fileGrp
+        file_pages : Dict[str, List[str]] = {}
+        if self._cache_flag:
+            for ID in el_files:
+                file_pages[ID] = list(self._file_page_cache.get(ID, {}))
+        else:
+            for el_fptr in self._tree.getroot().xpath(
+                    'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]/mets:fptr',
+                    namespaces=NS):
+                if el_fptr.get('FILEID') in el_files:
+                    file_pages.setdefault(el_fptr.get('FILEID'), []).append(el_fptr.getparent().get('ID'))
+        for ID, el_file in el_files.items():
+            if el_file is None:
+                ret[fileGrps[ID]][ID] = None
+                continue
+            pageIds = file_pages.get(ID, [])
+            url, local_filename = self._file_locations(el_file)
+            ret[fileGrps[ID]][ID] = (ClientSideOcrdFile(
+                None, ID=ID, fileGrp=fileGrps[ID], mimetype=el_file.get('MIMETYPE'),
+                pageId=pageIds[0] if pageIds else None,
+                url=url or '', local_filename=local_filename), pageIds)
+        return ret
+
+    def _snapshot_pages(self) -> List[Dict[str, str]]:
+        """
+        Copy the attributes of all physical pages
+        """
+        if self._cache_flag:
+            pages = self._page_cache[METS_PAGE_DIV_ATTRIBUTE.ID].values()
+        else:
+            pages = self._tree.getroot().xpath(
+                'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]',
+                namespaces=NS)
+        return [dict(page.attrib) for page in pages]
+
+    def _snapshot_add_files(self, revision : int, records : Iterable[Dict[str, Any]], force : bool) -> None:
+        """
+        Note that the changes since ``revision`` only added the files in ``records``
+        (with ``fileGrp``, ``ID`` and ``pageId``), for the next :py:meth:`snapshot`
+        """
+        if self._snapshot is None:
+            return
+        self._snapshot_added_changes += self._changes - revision
+        pages = self._snapshot._page_index(METS_PAGE_DIV_ATTRIBUTE.ID) # pylint: disable=protected-access
+        for record in records:
+            self._snapshot_added_files.setdefault(record['fileGrp'], []).append(record['ID'])
+            # replacing a file can remove its page, and re-create it at the end
+            if force or record.get('pageId') is not None and record['pageId'] not in pages:
+                self._snapshot_added_pages = True
+
     def _fill_caches(self) -> None:
         """
         Fills the caches with fileGrps and FileIDs
@@ -119,8 +565,7 @@ class OcrdMets(OcrdXmlDocument):
             self._file_cache[fileGrp_use] = {}
 
             for el_file in el_fileGrp:
-                file_id = el_file.get('ID')
-                self._file_cache[fileGrp_use].update({file_id: el_file})
+                self._cache_file(fileGrp_use, el_file)
                 # log.info("File added to the cache: %s" % file_id)
 
         # Fill with pages
@@ -130,29 +575,205 @@ class OcrdMets(OcrdXmlDocument):
         log = getLogger('ocrd.models.ocrd_mets._fill_caches-pages')
 
         for el_div in el_div_list:
-            div_id = el_div.get('ID')
             log.debug("DIV_ID: %s" % el_div.get('ID'))
+            self._cache_page(el_div)
 
-            for attr in METS_PAGE_DIV_ATTRIBUTE:
-                self._page_cache[attr][str(el_div.get(attr.name))] = el_div
+        # log.info("Len of page_cache: %s" % len(self._page_cache[METS_PAGE_DIV_ATTRIBUTE.ID]))
+        # log.info("Len of fptr_cache: %s" % len(self._fptr_cache))
 
-            # Assign an empty dictionary that will hold the fptr of the added page (div)
-            self._fptr_cache[div_id] = {}
+    def _cache_file(self, fileGrp_use : str, el_file : ET._Element) -> None:
+        """
+        Add ``el_file`` of ``mets:fileGrp[@USE=fileGrp_use]`` to the file caches
+        """
+        self._file_cache[fileGrp_use][el_file.get('ID')] = el_file
+        self._cache_file_attributes(el_file)
 
-            # log.info("Page_id added to the cache: %s" % div_id)
+    def _cache_page(self, el_div : ET._Element) -> None:
+        """
+        Add the page ``el_div`` and its ``mets:fptr`` to the page and fptr caches
+        """
+        div_id = el_div.get('ID')
+        for attr, page_cache in self._page_cache.items():
+            page_cache[str(el_div.get(attr.name))] = el_div
 
-            for el_fptr in el_div:
-                self._fptr_cache[div_id].update({el_fptr.get('FILEID'): el_fptr})
-                # log.info("Fptr added to the cache: %s" % el_fptr.get('FILEID'))
+        # Assign an empty dictionary that will hold the fptr of the added page (div)
+        fptrs = self._fptr_cache[div_id] = {}
 
-        # log.info("Len of page_cache: %s" % len(self._page_cache[METS_PAGE_DIV_ATTRIBUTE.ID]))
-        # log.info("Len of fptr_cache: %s" % len(self._fptr_cache))
+        for el_fptr in el_div:
+            file_id = el_fptr.get('FILEID')
+            fptrs[file_id] = el_fptr
+            self._file_page_cache.setdefault(file_id, {})[div_id] = el_div
+
+    @staticmethod
+    def sidecar_index_path(filename : str) -> str:
+        """
+        Path of the sidecar index for the METS at ``filename``, in the cache directory
+        (rather than the workspace, so it does not end up in bags, backups or copies)
+        """
+        # (one per METS path, outdated ones are detected by size and modification time)
+        key = sha256(abspath(filename).encode('utf-8')).hexdigest()
+        return join(config.XDG_CACHE_HOME, 'ocrd', 'mets-index', '%s.json' % key)
+
+    def write_sidecar_index(self, filename : str) -> None:
+        """
+        Write an index of the ``mets:fileGrp``, ``mets:file`` and page ``mets:div``
+        of the METS just saved to ``filename`` (to :py:meth:`sidecar_index_path`), from which the caches can be restored
+        without reading each element when the METS is opened again (with ``OCRD_METS_SIDECAR_INDEX``).
+        The index is only valid for the current size and modification time of ``filename``.
+        """
+        # one list per column rather than per element, which is much cheaper to load
+        index : Dict[str, Any] = {key: [] for key in [
+            'fileGrp_use', 'fileGrp_len',
+            'file_id', 'file_mimetype', 'file_url', 'file_local_filename',
+            'page_len', 'page_fptr_fileid']}
+        index.update({'page_%s' % attr.name: [] for attr in METS_PAGE_DIV_ATTRIBUTE})
+        tree_root = self._tree.getroot()
+        el_fileSec = tree_root.find('mets:fileSec', NS)
+        # cf. _fill_caches
+        if el_fileSec is not None:
+            for el_fileGrp in el_fileSec.findall('mets:fileGrp', NS):
+                el_files = list(el_fileGrp)
+                index['fileGrp_use'].append(el_fileGrp.get('USE'))
+                index['fileGrp_len'].append(len(el_files))
+                for el_file in el_files:
+                    url, local_filename = self._file_locations(el_file)
+                    index['file_id'].append(el_file.get('ID'))
+                    index['file_mimetype'].append(el_file.get('MIMETYPE'))
+                    index['file_url'].append(url)
+                    index['file_local_filename'].append(local_filename)
+            for el_div in tree_root.iter(TAG_METS_DIV):
+                if el_div.get('TYPE') == 'page':
+                    for attr in METS_PAGE_DIV_ATTRIBUTE:
+                        index['page_%s' % attr.name].append(str(el_div.get(attr.name)))
+                    el_fptrs = list(el_div)
+                    index['page_len'].append(len(el_fptrs))
+                    index['page_fptr_fileid'] += [el_fptr.get('FILEID') for el_fptr in el_fptrs]
+        mets_stat = stat(filename)
+        index.update(version=SIDECAR_INDEX_VERSION, size=mets_stat.st_size, mtime_ns=mets_stat.st_mtime_ns)
+        makedirs(dirname(self.sidecar_index_path(filename)), exist_ok=True)
+        with atomic_write(self.sidecar_index_path(filename)) as f:
+            json.dump(index, f, separators=(',', ':'))
+
+    def _read_sidecar_index(self, filename : str) -> Optional[Dict[str, Any]]:
+        """
+        Read the sidecar index of the METS at ``filename``, unless it is missing or outdated
+        """
+        log = getLogger('ocrd.models.ocrd_mets._read_sidecar_index')
+        try:
+            mets_stat = stat(filename)
+            with open(self.sidecar_index_path(filename), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            log.debug("No usable sidecar index for %s: %s", filename, e)
+            return None
+        if index.get('version') != SIDECAR_INDEX_VERSION \
+                or index.get('size') != mets_stat.st_size \
+                or index.get('mtime_ns') != mets_stat.st_mtime_ns:
+            log.debug("Sidecar index for %s is outdated", filename)
+            return None
+        return index
+
+    def _apply_sidecar_index(self, index : Dict[str, Any]) -> bool:
+        """
+        Fill the caches by matching the elements of the tree to the entries of the
+        sidecar ``index`` in document order. Returns whether the index matched the tree.
+        """
+        self._initialize_caches()
+        tree_root = self._tree.getroot()
+        el_fileSec = tree_root.find('mets:fileSec', NS)
+        el_fileGrps = el_fileSec.findall('mets:fileGrp', NS) if el_fileSec is not None else []
+        if len(el_fileGrps) != len(index['fileGrp_use']):
+            return False
+        mimetype_cache = self._file_attr_cache['mimetype']
+        url_cache = self._file_attr_cache['url']
+        local_filename_cache = self._file_attr_cache['local_filename']
+        files = zip(index['file_id'], index['file_mimetype'], index['file_url'], index['file_local_filename'])
+        for el_fileGrp, fileGrp_use, n_files in zip(el_fileGrps, index['fileGrp_use'], index['fileGrp_len']):
+            el_files = list(el_fileGrp)
+            if len(el_files) != n_files or el_fileGrp.get('USE') != fileGrp_use:
+                return False
+            id_to_file = self._file_cache[fileGrp_use] = {}
+            for el_file, (file_id, mimetype, url, local_filename) in zip(el_files, islice(files, n_files)):
+                id_to_file[file_id] = el_file
+                if mimetype is not None:
+                    mimetype_cache.setdefault(mimetype, {})[file_id] = el_file
+                if url is not None:
+                    url_cache.setdefault(url, {})[file_id] = el_file
+                if local_filename is not None:
+                    local_filename_cache.setdefault(local_filename, {})[file_id] = el_file
+            if el_files and el_files[-1].get('ID') != file_id:
+                return False
+        if el_fileSec is None:
+            return True
+        el_divs = [el_div for el_div in tree_root.iter(TAG_METS_DIV) if el_div.get('TYPE') == 'page']
+        if len(el_divs) != len(index['page_len']):
+            return False
+        for attr, page_cache in self._page_cache.items():
+            page_cache.update(zip(index['page_%s' % attr.name], el_divs))
+        fptr_fileids = iter(index['page_fptr_fileid'])
+        for el_div, page_id, n_fptrs in zip(el_divs, index['page_ID'], index['page_len']):
+            div_id = el_div.get('ID')
+            el_fptrs = list(el_div)
+            if len(el_fptrs) != n_fptrs or str(div_id) != page_id:
+                return False
+            fptrs = self._fptr_cache[div_id] = dict(zip(islice(fptr_fileids, n_fptrs), el_fptrs))
+            for file_id in fptrs:
+                self._file_page_cache.setdefault(file_id, {})[div_id] = el_div
+        return True
+
+    def _parse(self, filename=None, content=None):
+        """
+        Parse the METS. If caching and :py:attr:`iterparse` are enabled, fill the
+        caches with the ``mets:fileGrp``, ``mets:file`` and page ``mets:div`` elements
+        as soon as they have been parsed completely.
+        """
+        if not (self._cache_flag and self._iterparse):
+            return super()._parse(filename=filename, content=content)
+        self._initialize_caches()
+        tags = (TAG_METS_FILEGRP, TAG_METS_FILE, TAG_METS_DIV)
+        if content:
+            # cf. OcrdXmlDocument._parse
+            context = ET.iterparse(BytesIO(content.encode('utf-8') if isinstance(content, str) else content),
+                                   tag=tags, encoding='utf-8')
+        else:
+            context = ET.iterparse(filename, tag=tags)
+        for _, el in context:
+            tag = el.tag
+            if tag == TAG_METS_FILE:
+                # files are only cached for mets:fileSec/mets:fileGrp, cf. _fill_caches
+                el_fileGrp = el.getparent()
+                if el_fileGrp.tag == TAG_METS_FILEGRP and el_fileGrp.getparent().tag == TAG_METS_FILESEC:
+                    fileGrp_use = el_fileGrp.get('USE')
+                    self._file_cache.setdefault(fileGrp_use, {})
+                    self._cache_file(fileGrp_use, el)
+            elif tag == TAG_METS_FILEGRP:
+                # empty mets:fileGrp
+                if el.getparent().tag == TAG_METS_FILESEC:
+                    self._file_cache.setdefault(el.get('USE'), {})
+            elif el.get('TYPE') == 'page':
+                self._cache_page(el)
+        return ET.ElementTree(context.root)
 
     def _initialize_caches(self) -> None:
+        self._cache_generation += 1
         self._file_cache = {}
         # NOTE we can only guarantee uniqueness for @ID and @ORDER
         self._page_cache = {k : {} for k in METS_PAGE_DIV_ATTRIBUTE}
         self._fptr_cache = {}
+        self._file_page_cache = {}
+        self._file_attr_cache = {'mimetype': {}, 'url': {}, 'local_filename': {}}
+
+    def _page_number_index(self, attr : METS_PAGE_DIV_ATTRIBUTE) -> Dict[str, Tuple[List[int], List[str]]]:
+        """
+        The values of ``attr`` in the page cache, grouped by prefix and ordered by number
+        (for looking up ranges), kept until the caches change
+        """
+        if self._page_number_index_generation != self._cache_generation:
+            self._page_number_indexes = {}
+            self._page_number_index_generation = self._cache_generation
+        if attr not in self._page_number_indexes:
+            self._page_number_indexes[attr] = _number_index(self._page_cache[attr])
+        return self._page_number_indexes[attr]
 
     def _refresh_caches(self) -> None:
         if self._cache_flag:
@@ -162,6 +783,89 @@ class OcrdMets(OcrdXmlDocument):
             # Then the cache is empty even after this operation
             self._fill_caches()
 
+    def _cache_file_attributes(self, el_file : ET._Element) -> None:
+        """
+        Add ``el_file`` to the secondary caches for ``@MIMETYPE``, URL and local filename
+        """
+        file_id = el_file.get('ID')
+        mimetype = el_file.get('MIMETYPE')
+        if mimetype is not None:
+            self._file_attr_cache['mimetype'].setdefault(mimetype, {})[file_id] = el_file
+        url, local_filename = self._file_locations(el_file)
+        if url is not None:
+            self._file_attr_cache['url'].setdefault(url, {})[file_id] = el_file
+        if local_filename is not None:
+            self._file_attr_cache['local_filename'].setdefault(local_filename, {})[file_id] = el_file
+
+    @staticmethod
+    def _file_locations(el_file : ET._Element) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Get the URL and the local filename of ``el_file`` in a single pass over its ``mets:FLocat``
+        """
+        url = local_filename = None
+        for el_flocat in el_file.iterchildren(TAG_METS_FLOCAT):
+            loctype = el_flocat.get('LOCTYPE')
+            if url is None and loctype == 'URL':
+                url = el_flocat.get('{%s}href' % NS['xlink'])
+            elif local_filename is None and loctype == 'OTHER' and el_flocat.get('OTHERLOCTYPE') == 'FILE':
+                local_filename = el_flocat.get('{%s}href' % NS['xlink'])
+        return url, local_filename
+
+    def _cached_file(self, el_file : ET._Element) -> CachedOcrdFile:
+        """
+        Snapshot ``el_file`` from the caches as a :py:class:`ocrd_models.ocrd_file.CachedOcrdFile`
+        """
+        file_id = el_file.get('ID')
+        pages = self._file_page_cache.get(file_id)
+        return CachedOcrdFile(el_file, self, file_id, el_file.getparent().get('USE'), el_file.get('MIMETYPE'),
+                              next(iter(pages)) if pages else None)
+
+    def _uncache_file_attributes(self, el_file : ET._Element) -> None:
+        """
+        Remove ``el_file`` from the secondary caches for ``@MIMETYPE``, URL and local filename
+        """
+        ocrd_file = OcrdFile(el_file)
+        for attr in self._file_attr_cache:
+            self._update_file_cache(el_file, attr, getattr(ocrd_file, attr), None)
+
+    def _update_file_cache(self, el_file : ET._Element, attr : str, old : Optional[str], new : Optional[str]) -> None:
+        """
+        Keep the file caches consistent after the ``ID``, ``mimetype``, ``url`` or
+        ``local_filename`` of ``el_file`` changed from ``old`` to ``new``.
+        (Called by the setters of :py:class:`ocrd_models.ocrd_file.OcrdFile`.)
+        """
+        if old == new:
+            return
+        self._changes += 1
+        if not self._cache_flag:
+            return
+        self._cache_generation += 1
+        if attr == 'ID':
+            el_fileGrp = el_file.getparent()
+            if old is None or el_fileGrp is None:
+                return
+            files = self._file_cache.get(el_fileGrp.get('USE'), {})
+            if files.get(old) is el_file:
+                del files[old]
+                files[new] = el_file
+            ocrd_file = OcrdFile(el_file)
+            for attr, attr_cache in self._file_attr_cache.items():
+                files = attr_cache.get(getattr(ocrd_file, attr), {})
+                if files.get(old) is el_file:
+                    del files[old]
+                    files[new] = el_file
+            return
+        attr_cache = self._file_attr_cache[attr]
+        file_id = el_file.get('ID')
+        if old is not None:
+            files = attr_cache.get(old, {})
+            if files.get(file_id) is el_file:
+                del files[file_id]
+                if not files:
+                    del attr_cache[old]
+        if new is not None:
+            attr_cache.setdefault(new, {})[file_id] = el_file
+
     @property
     def unique_identifier(self) -> Optional[str]:
         """
@@ -190,13 +894,14 @@ class OcrdMets(OcrdXmlDocument):
             id_el = ET.SubElement(mods, TAG_MODS_IDENTIFIER)
             id_el.set('type', 'purl')
         id_el.text = purl
+        self._changes += 1
 
     @property
     def agents(self) -> List[OcrdAgent]:
         """
         List all :py:class:`ocrd_models.ocrd_agent.OcrdAgent`s
         """
-        return [OcrdAgent(el_agent) for el_agent in self._tree.getroot().findall('mets:metsHdr/mets:agent', NS)]
+        return [OcrdAgent(el_agent, mets=self) for el_agent in self._tree.getroot().findall('mets:metsHdr/mets:agent', NS)]
 
     def add_agent(self, *args, **kwargs) -> OcrdAgent:
         """
@@ -213,7 +918,8 @@ class OcrdMets(OcrdXmlDocument):
             el_agent_last.addnext(el_agent)
         except StopIteration:
             el_metsHdr.insert(0, el_agent)
-        return OcrdAgent(el_agent, *args, **kwargs)
+        self._changes += 1
+        return OcrdAgent(el_agent, *args, mets=self, **kwargs)
 
     @property
     def file_groups(self) -> List[str]:
@@ -259,6 +965,9 @@ class OcrdMets(OcrdXmlDocument):
         The :py:attr:`pageId` parameter supports the numeric range operator ``..``. For
         example, to find all files in pages ``PHYS_0001`` to ``PHYS_0003``,
         ``PHYS_0001..PHYS_0003`` will be expanded to ``PHYS_0001,PHYS_0002,PHYS_0003``.
+        With caching enabled, a :py:attr:`pageId` query that selects fewer files than
+        the other criteria is answered by following the ``mets:fptr`` of the matching
+        pages. Results are yielded in document order either way.
         Keyword Args:
             ID (string) : ``@ID`` of the ``mets:file``
             fileGrp (string) : ``@USE`` of the ``mets:fileGrp`` to list files of
@@ -272,15 +981,18 @@ class OcrdMets(OcrdXmlDocument):
         Yields:
             :py:class:`ocrd_models:ocrd_file:OcrdFile` instantiations
         """
-        pageId_list = []
+        # FILEIDs of the requested pages, as an insertion-ordered dict for O(1) membership tests
+        pageId_fileIds = None
+        if pageId is not None:
+            pageId_fileIds = {}
         if pageId:
             # returns divs instead of strings of ids
             physical_pages = self.get_physical_pages(for_pageIds=pageId, return_divs=True)
             for div in physical_pages:
                 if self._cache_flag:
-                    pageId_list += self._fptr_cache[div.get('ID')]
+                    pageId_fileIds.update(dict.fromkeys(self._fptr_cache.get(div.get('ID'), {})))
                 else:
-                    pageId_list += [fptr.get('FILEID') for fptr in div.findall('mets:fptr', NS)]
+                    pageId_fileIds.update(dict.fromkeys(fptr.get('FILEID') for fptr in div.findall('mets:fptr', NS)))
 
         if ID and ID.startswith(REGEX_PREFIX):
             ID = re.compile(ID[REGEX_PREFIX_LEN:])
@@ -293,14 +1005,56 @@ class OcrdMets(OcrdXmlDocument):
 
         candidates = []
         if self._cache_flag:
-            if fileGrp:
-                if isinstance(fileGrp, str):
-                    candidates += self._file_cache.get(fileGrp, {}).values()
-                else:
-                    candidates = [x for fileGrp_needle, el_file_list in self._file_cache.items() if
-                                  fileGrp.match(fileGrp_needle) for x in el_file_list.values()]
+            # Query planner: choose the most selective access path among the
+            # literal ID, the page -> fptr -> file path and the literal fileGrp,
+            # mimetype, url and local_filename indexes, then intersect the
+            # candidates with the remaining indexes
+            id_to_files = list(self._file_cache.values())
+            literal_caches = []
+            if fileGrp and isinstance(fileGrp, str):
+                id_to_files = [self._file_cache.get(fileGrp, {})]
+                literal_caches.append(id_to_files[0])
+                fileGrp = None
+            for attr, val in [('mimetype', mimetype), ('url', url), ('local_filename', local_filename)]:
+                if val and isinstance(val, str):
+                    literal_caches.append(self._file_attr_cache[attr].get(val, {}))
+            if mimetype and isinstance(mimetype, str):
+                mimetype = None
+            if url and isinstance(url, str):
+                url = None
+            if local_filename and isinstance(local_filename, str):
+                local_filename = None
+            literal_caches.sort(key=len)
+            # estimated number of dictionary lookups for the page -> fptr -> file path
+            page_path_cost = len(pageId_fileIds) * len(id_to_files) if pageId_fileIds is not None else None
+            # whether the candidates come from iterating the fileGrp caches (in document order)
+            planned_scan = False
+            if ID and isinstance(ID, str):
+                candidates = [id_to_file[ID] for id_to_file in id_to_files if ID in id_to_file]
+            elif page_path_cost is not None and (not literal_caches or page_path_cost <= len(literal_caches[0])):
+                candidates = [id_to_file[file_id] for file_id in pageId_fileIds
+                              for id_to_file in id_to_files if file_id in id_to_file]
+                pageId_fileIds = None
+            elif literal_caches:
+                candidates = list(literal_caches.pop(0).values())
+            elif fileGrp:
+                candidates = [x for fileGrp_needle, el_file_list in self._file_cache.items() if
+                              fileGrp.match(fileGrp_needle) for x in el_file_list.values()]
+                fileGrp = None
+                planned_scan = True
             else:
-                candidates = [el_file for id_to_file in self._file_cache.values() for el_file in id_to_file.values()]
+                candidates = [el_file for id_to_file in id_to_files for el_file in id_to_file.values()]
+                planned_scan = True
+            if literal_caches:
+                candidates = [cand for cand in candidates
+                              if all(id_to_file.get(cand.get('ID')) is cand for id_to_file in literal_caches)]
+            if not planned_scan:
+                # (indexes and pages are not in document order)
+                candidates = self._in_document_order(candidates)
+        elif fileGrp and isinstance(fileGrp, str):
+            candidates = self._tree.getroot().xpath(
+                '//mets:fileGrp[@USE=$use]/mets:file', namespaces=NS, use=fileGrp)
+            fileGrp = None
         else:
             candidates = self._tree.getroot().xpath('//mets:file', namespaces=NS)
 
@@ -311,10 +1065,10 @@ class OcrdMets(OcrdXmlDocument):
                 else:
                     if not ID.fullmatch(cand.get('ID')): continue
 
-            if pageId is not None and cand.get('ID') not in pageId_list:
+            if pageId_fileIds is not None and cand.get('ID') not in pageId_fileIds:
                 continue
 
-            if not self._cache_flag and fileGrp:
+            if fileGrp:
                 if isinstance(fileGrp, str):
                     if cand.getparent().get('USE') != fileGrp: continue
                 else:
@@ -352,7 +1106,10 @@ class OcrdMets(OcrdXmlDocument):
                 if is_local is None:
                     continue
 
-            ret = OcrdFile(cand, mets=self)
+            if self._cache_flag:
+                ret = self._cached_file(cand)
+            else:
+                ret = OcrdFile(cand, mets=self)
 
             # XXX include_fileGrp is redundant to fileGrp but for completeness
             if exclude_fileGrp and ret.fileGrp in exclude_fileGrp:
@@ -362,6 +1119,68 @@ class OcrdMets(OcrdXmlDocument):
 
             yield ret
 
+    @staticmethod
+    def _in_document_order(candidates : List[ET._Element]) -> List[ET._Element]:
+        """
+        Sort ``mets:file`` elements by their position in the document (fileGrp, then position in it)
+        """
+        if len(candidates) <= 1:
+            return candidates
+        by_fileGrp : Dict[ET._Element, List[ET._Element]] = {}
+        for cand in candidates:
+            by_fileGrp.setdefault(cand.getparent(), []).append(cand)
+        ret = []
+        for el_fileGrp in sorted(by_fileGrp, key=lambda el: el.getparent().index(el)):
+            cands = by_fileGrp[el_fileGrp]
+            if len(cands) <= 8:
+                # few: look up each (walking the siblings in C)
+                cands.sort(key=el_fileGrp.index)
+            else:
+                # many: number all files of the fileGrp once
+                position = {el: n for n, el in enumerate(el_fileGrp)}
+                cands.sort(key=position.__getitem__)
+            ret.extend(cands)
+        return ret
+
+    def to_table(self, **kwargs) -> Dict[str, np.ndarray]:
+        """
+        List the files matching :py:meth:`find_files` as columns ``ID``, ``fileGrp``, ``pageId``,
+        ``mimetype``, ``url`` and ``local_filename`` (cf. :py:data:`TABLE_COLUMNS`) of equal length,
+        for export in columnar formats (e.g. ``numpy.savez`` or ``pyarrow.table``).
+
+        The values are read directly from the ``mets:file`` elements, and the pages
+        of all files are looked up in a single pass over the physical ``mets:structMap``
+        (or from the caches), instead of per file.
+        Keyword Args:
+            **kwargs: See :py:meth:`find_files`
+        Returns:
+            dict of NumPy string arrays by column name, with ``''`` for missing values
+        """
+        # (an empty pageId selects no pages, empty values of the other filters are ignored)
+        filtered = kwargs.get('pageId') is not None or any(value for key, value in kwargs.items() if key != 'pageId')
+        if filtered:
+            el_files = [ocrd_file._el for ocrd_file in self.find_files(**kwargs)] # pylint: disable=protected-access
+        elif self._cache_flag:
+            el_files = [el_file for id_to_file in self._file_cache.values() for el_file in id_to_file.values()]
+        else:
+            el_files = self._tree.getroot().xpath('//mets:file', namespaces=NS)
+        file_page : Callable[[str], Optional[str]]
+        if self._cache_flag:
+            file_page = lambda ID: next(iter(self._file_page_cache.get(ID) or ()), None)
+        else:
+            file_pages : Dict[str, str] = {}
+            file_page = file_pages.get
+            for el_fptr in self._tree.getroot().xpath(
+                    'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]/mets:fptr',
+                    namespaces=NS):
+                file_pages.setdefault(el_fptr.get('FILEID'), el_fptr.getparent().get('ID'))
+        def rows():
+            for el_file in el_files:
+                ID = el_file.get('ID')
+                yield (ID, el_file.getparent().get('USE'), file_page(ID), el_file.get('MIMETYPE'),
+                       *self._file_locations(el_file))
+        return _table(rows())
+
     def add_file_group(self, fileGrp: str) -> ET._Element:
         """
         Add a new ``mets:fileGrp``.
@@ -377,6 +1196,7 @@ class OcrdMets(OcrdXmlDocument):
         if el_fileGrp is None:
             el_fileGrp = ET.SubElement(el_fileSec, TAG_METS_FILEGRP)
             el_fileGrp.set('USE', fileGrp)
+            self._changes += 1
 
             if self._cache_flag:
                 # Assign an empty dictionary that will hold the files of the added fileGrp
@@ -392,8 +1212,10 @@ class OcrdMets(OcrdXmlDocument):
         if el_fileGrp is None:
             raise FileNotFoundError("No such fileGrp '%s'" % old)
         el_fileGrp.set('USE', new)
+        self._changes += 1
 
         if self._cache_flag:
+            self._cache_generation += 1
             self._file_cache[new] = self._file_cache.pop(old)
 
     def remove_file_group(self, USE: str, recursive : bool = False, force : bool = False) -> None:
@@ -435,17 +1257,17 @@ class OcrdMets(OcrdXmlDocument):
         if files:
             if not recursive:
                 raise Exception("fileGrp %s is not empty and recursive wasn't set" % USE)
-            for f in list(files):
-                self.remove_one_file(ID=f.get('ID'), fileGrp=f.getparent().get('USE'))
+            self.remove_files([OcrdFile(el_file, mets=self) for el_file in list(files)])
 
         if self._cache_flag:
             # Note: Since the files inside the group are removed
-            # with the 'remove_one_file' method above, 
+            # with the 'remove_files' method above,
             # we should not take care of that again.
             # We just remove the fileGrp.
             del self._file_cache[el_fileGrp.get('USE')]
 
         el_fileGrp.getparent().remove(el_fileGrp)
+        self._changes += 1
 
     def add_file(self, fileGrp : str, mimetype : Optional[str] = None, url : Optional[str] = None, 
                  ID : Optional[str] = None, pageId : Optional[str] = None, force : bool = False, 
@@ -463,15 +1285,9 @@ class OcrdMets(OcrdXmlDocument):
             ignore (boolean): Do not look for existing files at all. Shift responsibility for preventing errors from duplicate ID to the user.
             local_filename (string):
         """
-        if not ID:
-            raise ValueError("Must set ID of the mets:file")
-        if not fileGrp:
-            raise ValueError("Must set fileGrp of the mets:file")
-        if not REGEX_FILE_ID.fullmatch(ID):
-            raise ValueError("Invalid syntax for mets:file/@ID %s (not an xs:ID)" % ID)
-        if not REGEX_FILE_ID.fullmatch(fileGrp):
-            raise ValueError("Invalid syntax for mets:fileGrp/@USE %s (not an xs:ID)" % fileGrp)
+        _validate_file(ID, fileGrp)
 
+        revision = self._changes
         el_fileGrp = self.add_file_group(fileGrp)
         if not ignore:
             mets_file = next(self.find_files(ID=ID, fileGrp=fileGrp), None)
@@ -498,17 +1314,174 @@ class OcrdMets(OcrdXmlDocument):
         if self._cache_flag:
             # Add the file to the file cache
             self._file_cache[fileGrp].update({ID: el_mets_file})
+        self._snapshot_add_files(revision, [dict(fileGrp=fileGrp, ID=ID, pageId=pageId)], force)
 
         return mets_file
 
+    def add_files(self, records : Iterable[Dict[str, Any]], force : bool = False, ignore : bool = False) -> List[OcrdFile]:
+        """
+        Add many new :py:class:`ocrd_models.ocrd_file.OcrdFile`, with the same result as calling
+        :py:meth:`add_file` for each, but looking up existing files, ``mets:fileGrp`` and
+        physical pages only once for all of them, and creating the elements directly.
+        Arguments:
+            records (list(dict)): For each file, the keyword arguments to :py:meth:`add_file`, i.e.
+                ``fileGrp``, ``ID``, and optionally ``mimetype``, ``url``, ``local_filename``, ``pageId``
+        Keyword Args:
+            force (boolean): Whether to add files even if a ``mets:file`` with the same ``@ID`` already exists.
+            ignore (boolean): Do not look for existing files at all.
+        Returns:
+            list of the new :py:class:`ocrd_models.ocrd_file.OcrdFile`, in the order of :py:attr:`records`
+        """
+        records = list(records)
+        # validate all records before changing anything
+        for record in records:
+            _validate_file(record.get('ID'), record.get('fileGrp'))
+        if not ignore:
+            self._check_add_files_conflicts(records, force)
+        revision = self._changes
+
+        # mets:fileGrp and their existing mets:file by @ID
+        el_fileGrps : Dict[str, ET._Element] = {}
+        fileGrp_files : Dict[str, Dict[str, ET._Element]] = {}
+        for record in records:
+            fileGrp = record['fileGrp']
+            if fileGrp not in el_fileGrps:
+                el_fileGrps[fileGrp] = self.add_file_group(fileGrp)
+                if ignore:
+                    fileGrp_files[fileGrp] = {}
+                elif self._cache_flag:
+                    fileGrp_files[fileGrp] = dict(self._file_cache[fileGrp])
+                else:
+                    fileGrp_files[fileGrp] = {el_file.get('ID'): el_file for el_file in
+                                              el_fileGrps[fileGrp].findall('mets:file', NS)}
+
+        # physical pages by @ID and existing mets:fptr by @FILEID
+        el_seqdiv = None
+        el_pagedivs : Dict[str, ET._Element] = {}
+        el_fptrs : Dict[str, List[ET._Element]] = {}
+        if any(record.get('pageId') is not None for record in records):
+            el_structmap = self._tree.getroot().find('mets:structMap[@TYPE="PHYSICAL"]', NS)
+            if el_structmap is None:
+                el_structmap = ET.SubElement(self._tree.getroot(), TAG_METS_STRUCTMAP)
+                el_structmap.set('TYPE', 'PHYSICAL')
+            el_seqdiv = el_structmap.find('mets:div[@TYPE="physSequence"]', NS)
+            if el_seqdiv is None:
+                el_seqdiv = ET.SubElement(el_structmap, TAG_METS_DIV)
+                el_seqdiv.set('TYPE', 'physSequence')
+            if self._cache_flag:
+                el_pagedivs = self._page_cache[METS_PAGE_DIV_ATTRIBUTE.ID]
+            else:
+                for el_pagediv in el_seqdiv.findall('mets:div', NS):
+                    el_pagedivs.setdefault(el_pagediv.get('ID'), el_pagediv)
+                for el_fptr in el_seqdiv.xpath('mets:div[@TYPE="page"]/mets:fptr', namespaces=NS):
+                    el_fptrs.setdefault(el_fptr.get('FILEID'), []).append(el_fptr)
+
+        ret = []
+        for record in records:
+            fileGrp = record['fileGrp']
+            ID = record['ID']
+            mimetype = record.get('mimetype')
+            pageId = record.get('pageId')
+            url = record.get('url')
+            local_filename = record.get('local_filename')
+
+            if not ignore and ID in fileGrp_files[fileGrp]:
+                # (replacing it with force, cf. _check_add_files_conflicts)
+                self.remove_one_file(OcrdFile(fileGrp_files[fileGrp][ID], mets=self))
+                el_fptrs.pop(ID, None)
+                # the page is deleted along with its last file
+                if pageId in el_pagedivs and el_pagedivs[pageId].getparent() is None:
+                    del el_pagedivs[pageId]
+
+            el_file = ET.SubElement(el_fileGrps[fileGrp], TAG_METS_FILE)
+            el_file.set('ID', ID)
+            if mimetype is not None:
+                el_file.set('MIMETYPE', mimetype)
+            # same order of mets:FLocat as with add_file
+            if local_filename:
+                el_FLocat = ET.SubElement(el_file, TAG_METS_FLOCAT)
+                el_FLocat.set("{%s}href" % NS["xlink"], str(local_filename))
+                el_FLocat.set("LOCTYPE", "OTHER")
+                el_FLocat.set("OTHERLOCTYPE", "FILE")
+            if url:
+                el_FLocat = ET.SubElement(el_file, TAG_METS_FLOCAT)
+                el_FLocat.set("{%s}href" % NS["xlink"], url)
+                el_FLocat.set("LOCTYPE", "URL")
+            fileGrp_files[fileGrp][ID] = el_file
+            if self._cache_flag:
+                self._file_cache[fileGrp][ID] = el_file
+                self._cache_file_attributes(el_file)
+
+            if pageId is not None:
+                # delete any existing page mapping for this file.ID, cf. set_physical_page_for_file
+                if self._cache_flag:
+                    self.remove_physical_page_fptr(ID)
+                else:
+                    for el_fptr in el_fptrs.pop(ID, []):
+                        el_fptr.getparent().remove(el_fptr)
+                el_pagediv = el_pagedivs.get(pageId)
+                if el_pagediv is None:
+                    el_pagediv = ET.SubElement(el_seqdiv, TAG_METS_DIV)
+                    el_pagediv.set('TYPE', 'page')
+                    el_pagediv.set('ID', pageId)
+                    # with caching, this is the page cache itself
+                    el_pagedivs[pageId] = el_pagediv
+                    if self._cache_flag:
+                        self._fptr_cache.setdefault(pageId, {})
+                el_fptr = ET.SubElement(el_pagediv, TAG_METS_FPTR)
+                el_fptr.set('FILEID', ID)
+                if self._cache_flag:
+                    self._fptr_cache[pageId][ID] = el_fptr
+                    self._file_page_cache.setdefault(ID, {})[pageId] = el_pagediv
+
+            ret.append(OcrdFile(el_file, mets=self))
+        self._changes += len(records)
+        if self._cache_flag:
+            self._cache_generation += 1
+        self._snapshot_add_files(revision, records, force)
+        return ret
+
+    def _check_add_files_conflicts(self, records : List[Dict[str, Any]], force : bool) -> None:
+        """
+        Raise the ``FileExistsError`` that :py:meth:`add_files` would run into for ``records``
+        (because of existing files, or files earlier in ``records``), before anything is added
+        """
+        IDs : Dict[str, set] = {}
+        for record in records:
+            IDs.setdefault(record['fileGrp'], set()).add(record['ID'])
+        # pageId and mimetype of the existing and added files by fileGrp and @ID
+        known : Dict[str, Dict[str, Tuple[Optional[str], Optional[str]]]] = {}
+        for fileGrp in IDs:
+            if self._cache_flag:
+                el_files = self._file_cache.get(fileGrp, {}).values()
+            else:
+                el_files = self._tree.getroot().xpath(
+                    '//mets:fileGrp[@USE=$use]/mets:file', namespaces=NS, use=fileGrp)
+            known[fileGrp] = {}
+            for el_file in el_files:
+                # (only look up page and mimetype of files that are to be added again)
+                if el_file.get('ID') in IDs[fileGrp]:
+                    mets_file = OcrdFile(el_file, mets=self)
+                    known[fileGrp][mets_file.ID] = (mets_file.pageId, mets_file.mimetype)
+        for record in records:
+            fileGrp, ID = record['fileGrp'], record['ID']
+            pageId, mimetype = record.get('pageId'), record.get('mimetype')
+            if ID in known[fileGrp]:
+                if known[fileGrp][ID] != (pageId, mimetype):
+                    raise FileExistsError(
+                        f"A file with ID=={ID} already exists in fileGrp {fileGrp} but unrelated - cannot mitigate")
+                if not force:
+                    raise FileExistsError(
+                        f"A file with ID=={ID} already exists in fileGrp {fileGrp} and neither force nor ignore are set")
+            known[fileGrp][ID] = (pageId, mimetype)
+
     def remove_file(self, *args, **kwargs) -> Union[List[OcrdFile],OcrdFile]:
         """
         Delete each ``ocrd:file`` matching the query. Same arguments as :py:meth:`find_files`
         """
         files = list(self.find_files(*args, **kwargs))
         if files:
-            for f in files:
-                self.remove_one_file(f)
+            self.remove_files(files)
             if len(files) > 1:
                 return files
             else:
@@ -542,9 +1515,9 @@ class OcrdMets(OcrdXmlDocument):
         # Delete the physical page ref
         fptrs = []
         if self._cache_flag:
-            for page in self._fptr_cache.keys():
-                if ID in self._fptr_cache[page]:
-                    fptrs.append(self._fptr_cache[page][ID])
+            self._cache_generation += 1
+            for page in self._file_page_cache.pop(ID, {}):
+                fptrs.append(self._fptr_cache[page][ID])
         else:
             fptrs = self._tree.getroot().findall('.//mets:fptr[@FILEID="%s"]' % ID, namespaces=NS)
 
@@ -565,18 +1538,104 @@ class OcrdMets(OcrdXmlDocument):
                     for attr in METS_PAGE_DIV_ATTRIBUTE:
                         if attr.name in page_div.attrib:
                             del self._page_cache[attr][page_div.attrib[attr.name]]
+                    del self._fptr_cache[page_div.get('ID')]
 
         # Delete the file reference from the cache
         if self._cache_flag:
             parent_use = ocrd_file._el.getparent().get('USE')
             del self._file_cache[parent_use][ocrd_file.ID]
+            self._uncache_file_attributes(ocrd_file._el)
 
         # Delete the file reference
         # pylint: disable=protected-access
         ocrd_file._el.getparent().remove(ocrd_file._el)
+        self._changes += 1
 
         return ocrd_file
 
+    def remove_files(self, files : Iterable[Union[str, OcrdFile]], force : bool = False) -> List[OcrdFile]:
+        """
+        Delete many existing :py:class:`ocrd_models.ocrd_file.OcrdFile` at once.
+
+        Unlike calling :py:meth:`remove_one_file` for each file, this looks up the
+        ``mets:fptr`` entries of all files in a single pass over the physical
+        ``mets:structMap`` and updates the caches only once.
+        Arguments:
+            files (list): ``@ID`` or :py:class:`ocrd_models.ocrd_file.OcrdFile` of each ``mets:file`` to delete
+        Keyword Args:
+            force (boolean): Skip files that do not exist instead of raising an exception
+        Returns:
+            The old :py:class:`ocrd_models.ocrd_file.OcrdFile` references.
+        """
+        log = getLogger('ocrd.models.ocrd_mets.remove_files')
+        ocrd_files : Dict[str, OcrdFile] = {}
+        file_ids = []
+        for f in files:
+            if isinstance(f, OcrdFile):
+                ocrd_files[f.ID] = f
+            else:
+                file_ids.append(f)
+        if file_ids:
+            if self._cache_flag:
+                for ID in file_ids:
+                    for grp_files in self._file_cache.values():
+                        if ID in grp_files:
+                            ocrd_files[ID] = self._cached_file(grp_files[ID])
+                            break
+            else:
+                wanted = set(file_ids)
+                for el_file in self._tree.getroot().xpath('//mets:file', namespaces=NS):
+                    if el_file.get('ID') in wanted:
+                        ocrd_files[el_file.get('ID')] = OcrdFile(el_file, mets=self)
+            missing = [ID for ID in file_ids if ID not in ocrd_files]
+            if missing:
+                if not force:
+                    raise FileNotFoundError("Files not found: %s" % missing)
+                log.warning("Files not found: %s", missing)
+        if not ocrd_files:
+            return []
+        log.debug("remove_files(%d files)", len(ocrd_files))
+
+        # Collect the physical page refs
+        fptrs = []
+        if self._cache_flag:
+            self._cache_generation += 1
+            for ID in ocrd_files:
+                for page in self._file_page_cache.pop(ID, {}):
+                    fptrs.append(self._fptr_cache[page].pop(ID))
+        else:
+            fptrs = [fptr for fptr in self._tree.getroot().iterfind('.//mets:fptr', NS)
+                     if fptr.get('FILEID') in ocrd_files]
+
+        # Delete the physical page refs and pages emptied by that
+        page_divs = {}
+        for fptr in fptrs:
+            page_div = fptr.getparent()
+            page_div.remove(fptr)
+            page_divs[id(page_div)] = page_div
+        for page_div in page_divs.values():
+            if len(page_div):
+                continue
+            log.debug("Delete empty page %s", page_div)
+            page_div.getparent().remove(page_div)
+            if self._cache_flag:
+                for attr in METS_PAGE_DIV_ATTRIBUTE:
+                    if attr.name in page_div.attrib:
+                        self._page_cache[attr].pop(page_div.attrib[attr.name], None)
+                self._fptr_cache.pop(page_div.get('ID'), None)
+
+        # Delete the file references
+        for ID, ocrd_file in ocrd_files.items():
+            # pylint: disable=protected-access
+            el_file = ocrd_file._el
+            if self._cache_flag:
+                del self._file_cache[el_file.getparent().get('USE')][ID]
+                self._uncache_file_attributes(el_file)
+            el_file.getparent().remove(el_file)
+        self._changes += len(ocrd_files)
+
+        return list(ocrd_files.values())
+
     @property
     def physical_pages(self) -> List[str]:
         """
@@ -601,124 +1660,50 @@ class OcrdMets(OcrdXmlDocument):
             return self.physical_pages
         # log = getLogger('ocrd.models.ocrd_mets.get_physical_pages')
         if for_pageIds is not None:
-            ret = []
-            page_attr_patterns = []
-            page_attr_patterns_raw = re.split(r',', for_pageIds)
-            for pageId_token in page_attr_patterns_raw:
-                if pageId_token.startswith(REGEX_PREFIX):
-                    page_attr_patterns.append((None, re.compile(pageId_token[REGEX_PREFIX_LEN:])))
-                elif '..' in pageId_token:
-                    val_range = generate_range(*pageId_token.split('..', 1))
-                    page_attr_patterns.append(val_range)
-                else:
-                    page_attr_patterns.append(pageId_token)
-            if not page_attr_patterns:
-                return []
-            range_patterns_first_last = [(x[0], x[-1]) if isinstance(x, list) else None for x in page_attr_patterns]
-            page_attr_patterns_copy = list(page_attr_patterns)
+            # the pages by the value of each attribute, and their numerically ordered values
             if self._cache_flag:
-                for pat in page_attr_patterns:
-                    try:
-                        attr : METS_PAGE_DIV_ATTRIBUTE
-                        if isinstance(pat, str):
-                            attr = next(a for a in list(METS_PAGE_DIV_ATTRIBUTE) if pat in self._page_cache[a])
-                            cache_keys = [pat]
-                        elif isinstance(pat, list):
-                            attr = next(a for a in list(METS_PAGE_DIV_ATTRIBUTE) if any(x in self._page_cache[a] for x in pat))
-                            cache_keys = [v for v in pat if v in self._page_cache[attr]]
-                            for k in cache_keys:
-                                pat.remove(k)
-                        elif isinstance(pat, tuple):
-                            _, re_pat = pat
-                            attr = next(a for a in list(METS_PAGE_DIV_ATTRIBUTE) for v in self._page_cache[a] if re_pat.fullmatch(v))
-                            cache_keys = [v for v in self._page_cache[attr] if re_pat.fullmatch(v)]
-                        else:
-                            raise ValueError
-                        if return_divs:
-                            ret += [self._page_cache[attr][v] for v in cache_keys]
-                        else:
-                            ret += [self._page_cache[attr][v].get('ID') for v in cache_keys]
-                    except StopIteration:
-                        raise ValueError(f"{pat} matches none of the keys of any of the _page_caches.")
+                ret = _resolve_pageIds(for_pageIds, self._page_cache.__getitem__, self._page_number_index)
             else:
-                page_attr_patterns_matched = []
-                for page in self._tree.getroot().xpath(
-                        'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]',
-                        namespaces=NS):
-                    patterns_exhausted = []
-                    for pat_idx, pat in enumerate(page_attr_patterns):
-                        try:
-                            if isinstance(pat, str):
-                                attr = next(a for a in list(METS_PAGE_DIV_ATTRIBUTE) if pat == page.get(a.name))
-                                ret.append(page if return_divs else page.get('ID'))
-                                patterns_exhausted.append(pat)
-                            elif isinstance(pat, list):
-                                if not isinstance(pat[0], METS_PAGE_DIV_ATTRIBUTE):
-                                    pat.insert(0, next(a for a in list(METS_PAGE_DIV_ATTRIBUTE) if any(x == page.get(a.name) for x in pat)))
-                                attr_val = page.get(pat[0].name)
-                                if attr_val in pat:
-                                    pat.remove(attr_val)
-                                    ret.append(page if return_divs else page.get('ID'))
-                                if len(pat) == 1:
-                                    patterns_exhausted.append(pat)
-                            elif isinstance(pat, tuple):
-                                attr, re_pat = pat
-                                if not attr:
-                                    attr = next(a for a in list(METS_PAGE_DIV_ATTRIBUTE) if re_pat.fullmatch(page.get(a.name) or ''))
-                                    page_attr_patterns[pat_idx] = (attr, re_pat)
-                                if re_pat.fullmatch(page.get(attr.name) or ''):
-                                    ret.append(page if return_divs else page.get('ID'))
-                            else:
-                                raise ValueError
-                            page_attr_patterns_matched.append(pat)
-                        except StopIteration:
-                            continue
-                    for p in patterns_exhausted:
-                        page_attr_patterns.remove(p)
-                unmatched = [x for x in page_attr_patterns_copy if x not in page_attr_patterns_matched]
-                if unmatched:
-                    raise ValueError(f"Patterns {unmatched} match none of the pages")
-
-            ranges_without_start_match = []
-            ranges_without_last_match = []
-            for idx, pat in enumerate(page_attr_patterns_copy):
-                if isinstance(pat, list):
-                    start, last = range_patterns_first_last[idx]
-                    if start in pat:
-                        print(pat, start, last)
-                        ranges_without_start_match.append(page_attr_patterns_raw[idx])
-                    # if last in pat:
-                    #     ranges_without_last_match.append(page_attr_patterns_raw[idx])
-            if ranges_without_start_match:
-                raise ValueError(f"Start of range patterns {ranges_without_start_match} not matched - invalid range")
-            # if ranges_without_last_match:
-            #     raise ValueError(f"End of range patterns {ranges_without_last_match} not matched - invalid range")
-            return ret
+                pages = self._tree.getroot().xpath(
+                    'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]',
+                    namespaces=NS)
+                # built on demand, for the attributes actually needed
+                page_indexes : Dict[METS_PAGE_DIV_ATTRIBUTE, Dict[str, ET._Element]] = {}
+                number_indexes : Dict[METS_PAGE_DIV_ATTRIBUTE, Dict[str, Tuple[List[int], List[str]]]] = {}
+                def page_index(attr):
+                    if attr not in page_indexes:
+                        page_indexes[attr] = _page_index(pages, attr)
+                    return page_indexes[attr]
+                def number_index(attr):
+                    if attr not in number_indexes:
+                        number_indexes[attr] = _number_index(page_index(attr))
+                    return number_indexes[attr]
+                ret = _resolve_pageIds(for_pageIds, page_index, number_index, pages=pages)
+            if return_divs:
+                return ret
+            return [page.get('ID') for page in ret]
 
         if for_fileIds == []:
             return []
         assert for_fileIds # at this point we know for_fileIds is set, assert to convince pyright
         ret = [None] * len(for_fileIds)
         if self._cache_flag:
-            for pageId in self._fptr_cache.keys():
-                for fptr in self._fptr_cache[pageId].keys():
-                    if fptr in for_fileIds:
-                        index = for_fileIds.index(fptr)
-                        if return_divs:
-                            ret[index] = self._page_cache[METS_PAGE_DIV_ATTRIBUTE.ID][pageId]
-                        else:
-                            ret[index] = pageId
+            for index, fileId in enumerate(for_fileIds):
+                pages = self._file_page_cache.get(fileId)
+                if pages:
+                    pageId, el_div = next(iter(pages.items()))
+                    ret[index] = el_div if return_divs else pageId
         else:
+            indexes : Dict[str, List[int]] = {}
+            for index, fileId in enumerate(for_fileIds):
+                indexes.setdefault(fileId, []).append(index)
             for page in self._tree.getroot().xpath(
                     'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]',
                     namespaces=NS):
                 for fptr in page.findall('mets:fptr', NS):
-                    if fptr.get('FILEID') in for_fileIds:
-                        index = for_fileIds.index(fptr.get('FILEID'))
-                        if return_divs:
-                            ret[index] = page
-                        else:
-                            ret[index] = page.get('ID')
+                    for index in indexes.get(fptr.get('FILEID'), []):
+                        if ret[index] is None:
+                            ret[index] = page if return_divs else page.get('ID')
         return ret
 
     def set_physical_page_for_file(self, pageId : str, ocrd_file : OcrdFile, 
@@ -737,10 +1722,9 @@ class OcrdMets(OcrdXmlDocument):
         # delete any existing page mapping for this file.ID
         fptrs = []
         if self._cache_flag:
-            for page_id in self._fptr_cache.keys():
-                if ocrd_file.ID in self._fptr_cache[page_id].keys():
-                    if self._fptr_cache[page_id][ocrd_file.ID] is not None:
-                        fptrs.append(self._fptr_cache[page_id][ocrd_file.ID])
+            self._cache_generation += 1
+            for page_id in self._file_page_cache.pop(ocrd_file.ID, {}):
+                fptrs.append(self._fptr_cache[page_id][ocrd_file.ID])
         else:
             fptrs = self._tree.getroot().findall(
                 'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]/mets:fptr[@FILEID="%s"]' %
@@ -785,10 +1769,12 @@ class OcrdMets(OcrdXmlDocument):
 
         el_fptr = ET.SubElement(el_pagediv, TAG_METS_FPTR)
         el_fptr.set('FILEID', ocrd_file.ID)
+        self._changes += 1
 
         if self._cache_flag:
             # Assign the ocrd fileID to the pageId in the cache
             self._fptr_cache[pageId].update({ocrd_file.ID: el_fptr})
+            self._file_page_cache.setdefault(ocrd_file.ID, {})[pageId] = el_pagediv
 
     def update_physical_page_attributes(self, page_id : str, **kwargs) -> None:
         invalid_keys = list(k for k in kwargs.keys() if k not in METS_PAGE_DIV_ATTRIBUTE.names())
@@ -798,13 +1784,32 @@ class OcrdMets(OcrdXmlDocument):
         page_div = self.get_physical_pages(for_pageIds=page_id, return_divs=True)
         if not page_div:
             raise ValueError(f"Could not find mets:div[@ID=={page_id}]")
-        page_div = page_div[0]
+        self._set_page_attributes(page_div[0], **kwargs)
 
+    def _set_page_attributes(self, page_div : ET._Element, **kwargs) -> None:
+        """
+        Set (or with an empty value, remove) the attributes of the physical page ``page_div``
+        """
+        if self._cache_flag:
+            self._cache_generation += 1
         for k, v in kwargs.items():
+            old = page_div.get(k)
             if not v:
                 page_div.attrib.pop(k)
             else:
                 page_div.attrib[k] = v
+            if self._cache_flag:
+                # keep the page cache in sync (with the same keys as _cache_page)
+                page_cache = self._page_cache[METS_PAGE_DIV_ATTRIBUTE[k]]
+                if page_cache.get(str(old)) is page_div:
+                    del page_cache[str(old)]
+                page_cache[str(page_div.get(k))] = page_div
+                if k == 'ID' and old in self._fptr_cache:
+                    fptrs = self._fptr_cache[page_div.get(k)] = self._fptr_cache.pop(old)
+                    for file_id in fptrs:
+                        pages = self._file_page_cache[file_id]
+                        pages[page_div.get(k)] = pages.pop(old)
+        self._changes += 1
 
     def get_physical_page_for_file(self, ocrd_file : OcrdFile) -> Optional[str]:
         """
@@ -812,9 +1817,7 @@ class OcrdMets(OcrdXmlDocument):
         corresponding to the ``mets:file`` :py:attr:`ocrd_file`.
         """
         if self._cache_flag:
-            for pageId in self._fptr_cache.keys():
-                if ocrd_file.ID in self._fptr_cache[pageId].keys():
-                    return pageId
+            return next(iter(self._file_page_cache.get(ocrd_file.ID, {})), None)
         else:
             ret = self._tree.getroot().find(
                 'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]/mets:fptr[@FILEID="%s"]' %
@@ -837,11 +1840,17 @@ class OcrdMets(OcrdXmlDocument):
         if mets_div:
             mets_div_attrib = {** mets_div[0].attrib}
             mets_div[0].getparent().remove(mets_div[0])
+            self._changes += 1
             if self._cache_flag:
+                self._cache_generation += 1
                 for attr in METS_PAGE_DIV_ATTRIBUTE:
                     if attr.name in mets_div_attrib:
                         del self._page_cache[attr][mets_div_attrib[attr.name]]
-                del self._fptr_cache[ID]
+                for file_id in self._fptr_cache.pop(ID, {}):
+                    pages = self._file_page_cache.get(file_id, {})
+                    pages.pop(ID, None)
+                    if not pages:
+                        self._file_page_cache.pop(file_id, None)
 
     def remove_physical_page_fptr(self, fileId : str) -> List[str]:
         """
@@ -857,9 +1866,9 @@ class OcrdMets(OcrdXmlDocument):
         # If that's the case then we do not need to iterate 2 loops, just one.
         mets_fptrs = []
         if self._cache_flag:
-            for page_id in self._fptr_cache.keys():
-                if fileId in self._fptr_cache[page_id].keys():
-                    mets_fptrs.append(self._fptr_cache[page_id][fileId])
+            self._cache_generation += 1
+            for page_id in self._file_page_cache.pop(fileId, {}):
+                mets_fptrs.append(self._fptr_cache[page_id][fileId])
         else:
             mets_fptrs = self._tree.getroot().xpath(
                 'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]/mets:fptr[@FILEID="%s"]' % fileId,
@@ -871,6 +1880,7 @@ class OcrdMets(OcrdXmlDocument):
             if self._cache_flag:
                 del self._fptr_cache[mets_div.get('ID')][mets_fptr.get('FILEID')]
             mets_div.remove(mets_fptr)
+            self._changes += 1
         return ret
 
     @property
@@ -900,23 +1910,214 @@ class OcrdMets(OcrdXmlDocument):
             pageId_mapping (dict): Map :py:attr:`other_mets` page ID to page ID in this METS
             after_add_cb (function): Callback received after file is added to the METS
         """
-        if not fileGrp_mapping:
-            fileGrp_mapping = {}
-        if not fileId_mapping:
-            fileId_mapping = {}
-        if not pageId_mapping:
-            pageId_mapping = {}
-        for f_src in other_mets.find_files(**kwargs):
-            f_dest = self.add_file(
-                fileGrp_mapping.get(f_src.fileGrp, f_src.fileGrp),
-                mimetype=f_src.mimetype,
-                url=f_src.url,
-                local_filename=f_src.local_filename,
-                ID=fileId_mapping.get(f_src.ID, f_src.ID),
-                pageId=pageId_mapping.get(f_src.pageId, f_src.pageId),
-                force=force)
-            # FIXME: merge metsHdr, amdSec, dmdSec as well
-            # FIXME: merge structMap logical and structLink as well
-            if after_add_cb:
+        records, pages_src = _merge_records(other_mets, fileGrp_mapping, fileId_mapping, pageId_mapping, **kwargs)
+        # (add_files checks for conflicts within each fileGrp before adding anything)
+        files_dest = self.add_files(records, force=force)
+
+        # physical pages: take over @ORDER, @ORDERLABEL, @LABEL etc. where still unset
+        pages_dest = self.get_physical_pages(for_fileIds=[f_dest.ID for f_dest in files_dest], return_divs=True)
+        merged_pages = {}
+        for page_src, page_dest in zip(pages_src, pages_dest):
+            if page_src is None or page_dest is None or page_dest.get('ID') in merged_pages:
+                continue
+            merged_pages[page_dest.get('ID')] = page_src.get('ID')
+            attributes = _merge_page_attributes(page_src, page_dest)
+            if attributes:
+                self._set_page_attributes(page_dest, **attributes)
+
+        _merge_agents(self, other_mets)
+        _merge_structure(self._tree.getroot(), other_mets, merged_pages)
+
+        if after_add_cb:
+            for f_dest in files_dest:
                 after_add_cb(f_dest)
 
+
+class _FileGrpSnapshot(Dict[str, ClientSideOcrdFile]):
+    """
+    The files of one ``mets:fileGrp`` in an :py:class:`OcrdMetsSnapshot` by ``@ID``, in document order
+    (shared between snapshots, so never modified once published)
+    """
+    _by_pageId : Optional[Dict[str, List[ClientSideOcrdFile]]] = None
+    _positions : Optional[Dict[str, int]] = None
+
+    def __init__(self, other : Optional['_FileGrpSnapshot'] = None) -> None:
+        """
+        Args:
+            other (_FileGrpSnapshot): snapshot to copy (before modifying the copy)
+        """
+        super().__init__(other or {})
+        # @ID of all pages of each file (with a mets:fptr to it)
+        self.pageIds : Dict[str, List[str]] = dict(other.pageIds) if other else {}
+
+    def add_file(self, ocrd_file : ClientSideOcrdFile, pageIds : List[str]) -> None:
+        """
+        Add (or replace) ``ocrd_file`` on pages ``pageIds``, after all others (like its ``mets:file``)
+        """
+        self.remove_file(ocrd_file.ID)
+        self[ocrd_file.ID] = ocrd_file
+        self.pageIds[ocrd_file.ID] = pageIds
+
+    def remove_file(self, ID : str) -> None:
+        """
+        Remove the file with ``@ID`` ``ID``, if any
+        """
+        self.pop(ID, None)
+        self.pageIds.pop(ID, None)
+
+    def by_pageId(self) -> Dict[str, List[ClientSideOcrdFile]]:
+        """
+        The files on each page ``@ID``, indexed on first use
+        """
+        if self._by_pageId is None:
+            by_pageId : Dict[str, List[ClientSideOcrdFile]] = {}
+            for ID, ocrd_file in self.items():
+                for pageId in self.pageIds[ID]:
+                    by_pageId.setdefault(pageId, []).append(ocrd_file)
+            self._by_pageId = by_pageId
+        return self._by_pageId
+
+    def positions(self) -> Dict[str, int]:
+        """
+        The position of each file in document order by ``@ID``, indexed on first use
+        """
+        if self._positions is None:
+            self._positions = {ID: position for position, ID in enumerate(self)}
+        return self._positions
+
+class OcrdMetsSnapshot():
+    """
+    Immutable copy of the files (as :py:class:`ocrd_models.ocrd_file.ClientSideOcrdFile`)
+    and physical pages of an :py:class:`OcrdMets` at one revision, as returned by
+    :py:meth:`OcrdMets.snapshot`. Provides the read-only queries of :py:class:`OcrdMets`
+    for files and pages, and can be used from many threads at once.
+    """
+
+    def __init__(self, revision : int, fileGrps : Dict[str, _FileGrpSnapshot], pages : List[Dict[str, str]]) -> None:
+        """
+        Args:
+            revision (int): number of changes to the METS as of this snapshot
+            fileGrps (dict): files of each ``mets:fileGrp`` by ``@ID``
+            pages (list): attributes of each physical page, in document order
+        """
+        self.revision = revision
+        self._fileGrps = fileGrps
+        self._pages = pages
+        # built on demand
+        self._page_indexes : Dict[METS_PAGE_DIV_ATTRIBUTE, Dict[str, Dict[str, str]]] = {}
+        self._number_indexes : Dict[METS_PAGE_DIV_ATTRIBUTE, Dict[str, Tuple[List[int], List[str]]]] = {}
+
+    def __str__(self) -> str:
+        return 'OcrdMetsSnapshot[revision=%s,fileGrps=%s,files=%s]' % (
+            self.revision, self.file_groups, sum(len(files) for files in self._fileGrps.values()))
+
+    def _page_index(self, attr : METS_PAGE_DIV_ATTRIBUTE) -> Dict[str, Dict[str, str]]:
+        if attr not in self._page_indexes:
+            self._page_indexes[attr] = _page_index(self._pages, attr)
+        return self._page_indexes[attr]
+
+    def _number_index(self, attr : METS_PAGE_DIV_ATTRIBUTE) -> Dict[str, Tuple[List[int], List[str]]]:
+        if attr not in self._number_indexes:
+            self._number_indexes[attr] = _number_index(self._page_index(attr))
+        return self._number_indexes[attr]
+
+    @property
+    def file_groups(self) -> List[str]:
+        """
+        List the ``@USE`` of all ``mets:fileGrp`` entries.
+        """
+        return list(self._fileGrps)
+
+    @property
+    def physical_pages(self) -> List[str]:
+        """
+        List all page IDs (the ``@ID`` of each physical ``mets:structMap`` ``mets:div``)
+        """
+        return [page['ID'] for page in self._pages]
+
+    def get_physical_pages(self, for_pageIds : Optional[str] = None) -> List[str]:
+        """
+        List all page IDs, or those selected by :py:attr:`for_pageIds`,
+        cf. :py:meth:`OcrdMets.get_physical_pages`
+        """
+        if for_pageIds is None:
+            return self.physical_pages
+        return [page['ID'] for page in _resolve_pageIds(
+            for_pageIds, self._page_index, self._number_index, pages=self._pages)]
+
+    def find_all_files(self, *args, **kwargs) -> List[ClientSideOcrdFile]:
+        """
+        Like :py:meth:`find_files` but return a list of all results.
+        """
+        return list(self.find_files(*args, **kwargs))
+
+    def find_files(
+        self,
+        ID : Optional[str] = None,
+        fileGrp : Optional[str] = None,
+        pageId : Optional[str] = None,
+        mimetype : Optional[str] = None,
+        url : Optional[str] = None,
+        local_filename : Optional[str] = None,
+        local_only : bool = False,
+        include_fileGrp : Optional[List[str]] = None,
+        exclude_fileGrp : Optional[List[str]] = None,
+    ) -> Iterator[ClientSideOcrdFile]:
+        """
+        Search files like :py:meth:`OcrdMets.find_files`. Results are
+        yielded in document order.
+        """
+        patterns : Dict[str, Union[str, re.Pattern]] = {}
+        for attr, val in [('ID', ID), ('fileGrp', fileGrp), ('mimetype', mimetype), ('url', url)]:
+            if val:
+                patterns[attr] = re.compile(val[REGEX_PREFIX_LEN:]) if val.startswith(REGEX_PREFIX) else val
+        if local_filename:
+            patterns['local_filename'] = local_filename
+        pageIds = None
+        if pageId is not None:
+            pageIds = self.get_physical_pages(for_pageIds=pageId) if pageId else []
+            pageIds = dict.fromkeys(pageIds)
+        ID = patterns.pop('ID', None)
+        fileGrp = patterns.pop('fileGrp', None)
+        def matches(ocrd_file):
+            for attr, val in patterns.items():
+                value = getattr(ocrd_file, attr)
+                if isinstance(val, str):
+                    if value != val:
+                        return False
+                # as in OcrdMets.find_files, a missing @MIMETYPE is matched as empty, a missing mets:FLocat never
+                elif not value and attr != 'mimetype' or not val.fullmatch(value or ''):
+                    return False
+            return True
+        if isinstance(fileGrp, str):
+            fileGrps = [fileGrp] if fileGrp in self._fileGrps else []
+        else:
+            fileGrps = [use for use in self._fileGrps if not fileGrp or fileGrp.fullmatch(use)]
+        for use in fileGrps:
+            if exclude_fileGrp and use in exclude_fileGrp:
+                continue
+            if include_fileGrp and use not in include_fileGrp:
+                continue
+            files = self._fileGrps[use]
+            if isinstance(ID, str):
+                candidates = [files[ID]] if ID in files else []
+            elif pageIds is not None:
+                by_pageId = files.by_pageId()
+                candidates = list({ocrd_file.ID: ocrd_file for page in pageIds
+                                   for ocrd_file in by_pageId.get(page, [])}.values())
+                # (pages are not in document order)
+                positions = files.positions()
+                candidates.sort(key=lambda ocrd_file: positions[ocrd_file.ID])
+            else:
+                candidates = files.values()
+            for ocrd_file in candidates:
+                if ID and not isinstance(ID, str) and not ID.fullmatch(ocrd_file.ID):
+                    continue
+                if pageIds is not None and isinstance(ID, str) and \
+                        not any(page in pageIds for page in files.pageIds[ID]):
+                    continue
+                if not matches(ocrd_file):
+                    continue
+                if local_only and not ocrd_file.local_filename:
+                    continue
+                yield ocrd_file
@@ -0,0 +1,1115 @@
+"""
+API to METS, with the files and physical pages kept in shards of consecutive pages
+"""
+from collections import OrderedDict
+from contextlib import ExitStack
+from io import BytesIO
+from os.path import exists, join
+import re
+from shutil import copyfileobj, rmtree
+from tempfile import TemporaryFile, mkdtemp
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from uuid import uuid4
+from weakref import finalize
+
+import numpy as np
+
+from ocrd_utils import getLogger, REGEX_PREFIX
+
+from .constants import (
+    NAMESPACES as NS,
+    TAG_METS_DIV,
+    TAG_METS_FILE,
+    TAG_METS_FILEGRP,
+    TAG_METS_FILESEC,
+    TAG_METS_STRUCTMAP,
+    METS_PAGE_DIV_ATTRIBUTE
+)
+from .ocrd_xml_base import ET      # type: ignore
+from .ocrd_agent import OcrdAgent
+from .ocrd_file import ClientSideOcrdFile, OcrdFile
+from .ocrd_mets import (
+    OcrdMets,
+    OcrdMetsSnapshot,
+    TABLE_COLUMNS,
+    _FileGrpSnapshot,
+    _number_index,
+    _files_table,
+    _merge_agents,
+    _merge_page_attributes,
+    _merge_records,
+    _merge_structure,
+    _page_index,
+    _resolve_pageIds,
+    _table,
+    _validate_file
+)
+from .utils import xmllint_format
+
+TAG_METS_METS = '{%s}mets' % NS['mets']
+XPATH_PAGES = 'mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]/mets:div[@TYPE="page"]'
+# Start of each mets:file in the output of _serialize_children for a mets:fileGrp
+REGEX_FILE_START = re.compile(rb'\n {6}<(?!/)')
+
+def _is_page(el : ET._Element) -> bool:
+    """
+    Whether ``el`` is a page ``mets:div`` of the physical ``mets:structMap``
+    """
+    if el.tag != TAG_METS_DIV or el.get('TYPE') != 'page':
+        return False
+    el_seqdiv = el.getparent()
+    if el_seqdiv is None or el_seqdiv.get('TYPE') != 'physSequence':
+        return False
+    el_structmap = el_seqdiv.getparent()
+    return el_structmap is not None and el_structmap.tag == TAG_METS_STRUCTMAP and el_structmap.get('TYPE') == 'PHYSICAL'
+
+def _serialize_children(el : ET._Element, level : int) -> bytes:
+    """
+    Serialize the children of ``el`` (at indentation ``level``) like
+    :py:meth:`ocrd_models.ocrd_xml_base.OcrdXmlDocument.write_xml`,
+    each starting on a new line
+    """
+    if not len(el):
+        return b''
+    ET.indent(el, space='  ', level=level)
+    data = ET.tostring(el, encoding='UTF-8', with_tail=False)
+    # strip the start and end tag of el
+    return data[data.index(b'>') + 1:data.rindex(b'</')].rstrip()
+
+def _copy_ranges(src, dst, entries : Iterable[Tuple[int, int, int]], bufsize : int = 1 << 20) -> None:
+    """
+    Copy the ranges of ``entries`` (anything, offset and length) from file object ``src``
+    to ``dst`` in that order (in one go where they are contiguous)
+    """
+    ranges : List[List[int]] = []
+    for _, offset, length in entries:
+        if ranges and ranges[-1][1] == offset:
+            ranges[-1][1] += length
+        else:
+            ranges.append([offset, offset + length])
+    for start, end in ranges:
+        src.seek(start)
+        while start < end:
+            buf = src.read(min(bufsize, end - start))
+            dst.write(buf)
+            start += len(buf)
+
+class _ShardMets(OcrdMets):
+    """
+    :py:class:`ocrd_models.ocrd_mets.OcrdMets` for the skeleton and the shards of a :py:class:`ShardedOcrdMets`,
+    which are always cached (regardless of ``OCRD_METS_CACHING``)
+    """
+    _cache_flag_from_env = False
+
+class ShardedOcrdFile(OcrdFile):
+    """
+    A :py:class:`ocrd_models.ocrd_file.OcrdFile` of a :py:class:`ShardedOcrdMets`. Instead of
+    the ``mets:file`` element, it keeps the ``@USE`` of its ``mets:fileGrp`` and its ``@ID``, and looks up
+    the element in its shard (loading it again if necessary) on each access, so it does not keep unloaded
+    shards in memory. (After renaming its ``mets:fileGrp``, it must be looked up again.)
+    """
+
+    __slots__ = ('_sharded', '_fileGrp', '_file_id')
+
+    def __init__(self, sharded : 'ShardedOcrdMets', fileGrp : str, ID : str):
+        # pylint: disable=super-init-not-called
+        self._sharded = sharded
+        self._fileGrp = fileGrp
+        self._file_id = ID
+
+    @property # type: ignore[override]
+    def _el(self) -> ET._Element:
+        """
+        The ``mets:file`` in its (loaded) shard
+        """
+        # pylint: disable=protected-access
+        key = (self._fileGrp, self._file_id)
+        if key not in self._sharded._files:
+            raise FileNotFoundError("File not found: %s (fileGrp=%s)" % (self._file_id, self._fileGrp))
+        return self._sharded._mets(self._sharded._files[key])._file_cache[self._fileGrp][self._file_id]
+
+    @property # type: ignore[override]
+    def mets(self) -> 'ShardedOcrdMets':
+        return self._sharded
+
+    @property
+    def ID(self) -> str:
+        """
+        Get the ``@ID`` of the ``mets:file``.
+        """
+        return self._file_id
+
+    @ID.setter
+    def ID(self, ID : Optional[str]) -> None:
+        """
+        Set the ``@ID`` of the ``mets:file`` to :py:attr:`ID` (also in the pages referencing it).
+        """
+        if ID is None:
+            return
+        self._sharded._rename_file(self._fileGrp, self._file_id, ID) # pylint: disable=protected-access
+        self._file_id = ID
+
+class ShardedOcrdMets():
+    """
+    API to a single METS file like :py:class:`ocrd_models.ocrd_mets.OcrdMets`, for works with very many pages.
+
+    The ``mets:file`` entries and physical pages (``mets:div`` of the physical ``mets:structMap``)
+    are split into shards of :py:attr:`shard_pages` consecutive pages, which are kept in temporary files
+    and only loaded (as caching :py:class:`ocrd_models.ocrd_mets.OcrdMets`) when accessed. Files belong
+    to the shard of their (first) page; references from pages of other shards are kept track of, so such
+    files are found for all of their pages. The position of each file in its ``mets:fileGrp`` is kept track of
+    as well, so serializing keeps the document order of the files. At most :py:attr:`max_shards` shards are
+    kept in memory, the least recently used one is written back to its file when another one is loaded.
+    Everything else (``mets:metsHdr``, metadata sections, logical ``mets:structMap`` and files without page)
+    is always kept in memory.
+
+    Queries with ``pageId`` only load the shards of the selected pages, and serializing
+    (:py:meth:`write_xml`) reassembles a regular METS document one shard at a time.
+
+    Files are returned as :py:class:`ShardedOcrdFile`, which look up their ``mets:file`` on each
+    access, so they stay valid (and can be changed) after their shard has been unloaded.
+    """
+
+    def __init__(self, filename : Optional[str] = None, content : Optional[Union[str, bytes]] = None,
+                 shard_pages : int = 100, max_shards : int = 16) -> None:
+        """
+        Args:
+            filename (string): path of the METS to load
+            content (string): the METS to load
+            shard_pages (int): number of pages per shard
+            max_shards (int): number of shards to keep in memory at most
+        """
+        if filename is None and content is None:
+            raise Exception("Must pass 'filename' or 'content' to " + self.__class__.__name__)
+        if shard_pages < 1 or max_shards < 1:
+            raise ValueError("shard_pages and max_shards must be positive")
+        self.shard_pages = shard_pages
+        self.max_shards = max_shards
+        source : Callable[[], Any]
+        if content:
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            source = lambda: BytesIO(content)
+        else:
+            assert filename
+            filename = filename.replace('file://', '')
+            if not exists(filename):
+                raise Exception('File does not exist: %s' % filename)
+            source = lambda: filename
+        self._shard_dir = mkdtemp(prefix='ocrd-mets-shards-')
+        finalize(self, rmtree, self._shard_dir, True)
+        # loaded shards, least recently used first
+        self._shards : Dict[int, OcrdMets] = OrderedDict()
+        # attributes of the pages of each shard, in document order
+        self._shard_pages : List[List[Dict[str, str]]] = []
+        # shard of each page by @ID
+        self._page_shards : Dict[str, int] = {}
+        # shard (None for the skeleton) of each file by fileGrp @USE and @ID
+        self._files : Dict[Tuple[str, str], Optional[int]] = {}
+        # position of each file in its fileGrp (increasing in document order) by fileGrp @USE and @ID
+        self._file_positions : Dict[Tuple[str, str], int] = {}
+        self._next_file_position = 0
+        # pages in other shards than the file's own referencing it, by fileGrp @USE and file @ID
+        self._foreign_fptrs : Dict[Tuple[str, str], List[str]] = {}
+        # changes of shards that have been unloaded, and total changes as of the last mark_saved
+        self._changes = 0
+        self._saved_changes = 0
+        # attributes of all pages, and indexes of them, built on demand
+        self._pages : Optional[List[Dict[str, str]]] = None
+        self._page_indexes : Dict[METS_PAGE_DIV_ATTRIBUTE, Dict[str, Dict[str, str]]] = {}
+        self._number_indexes : Dict[METS_PAGE_DIV_ATTRIBUTE, Dict[str, Tuple[List[int], List[str]]]] = {}
+        self._snapshot : Optional[OcrdMetsSnapshot] = None
+        self._split(source)
+
+    def __str__(self) -> str:
+        """
+        String representation
+        """
+        return 'ShardedOcrdMets[shards=%s,loaded=%s,fileGrps=%s,files=%s]' % (
+            len(self._shard_pages), len(self._shards), self.file_groups, len(self._files))
+
+    def _split(self, source : Callable[[], Any]) -> None:
+        """
+        Split the METS into the skeleton and the shards in two ``lxml.etree.iterparse`` passes
+        (one for the pages, one for the rest), without building the complete tree
+        """
+        pages = []
+        # @ID of the pages of each file
+        file_pages : Dict[str, List[str]] = {}
+        for _, el in ET.iterparse(source(), tag=(TAG_METS_FILE, TAG_METS_DIV)):
+            is_page = _is_page(el)
+            if is_page:
+                pages.append(dict(el.attrib))
+                for el_fptr in el.iterfind('mets:fptr', NS):
+                    file_pages.setdefault(el_fptr.get('FILEID'), []).append(el.get('ID'))
+            if is_page or el.tag == TAG_METS_FILE:
+                el.clear()
+                while el.getprevious() is not None:
+                    del el.getparent()[0]
+        for start in range(0, len(pages), self.shard_pages):
+            self._shard_pages.append(pages[start:start + self.shard_pages])
+        self._split_shards = set(range(len(self._shard_pages)))
+        for index, shard_pages in enumerate(self._shard_pages):
+            open(self._shard_path(index), 'wb').close()
+            for page in shard_pages:
+                self._page_shards.setdefault(page.get('ID'), index)
+
+        # append the files (each wrapped in its mets:fileGrp) and pages to the shard files (cf. _load_shard)
+        # (files are mostly in page order, so only the shard file currently written to is kept open)
+        with ExitStack() as stack:
+            shard_file : List[Any] = [None, None]
+            def write(index, el):
+                if shard_file[0] != index:
+                    stack.close()
+                    shard_file[:] = [index, stack.enter_context(open(self._shard_path(index), 'ab'))]
+                shard_file[1].write(ET.tostring(el, encoding='UTF-8', with_tail=False))
+            context = ET.iterparse(source(), tag=(TAG_METS_FILE, TAG_METS_DIV))
+            for _, el in context:
+                if el.tag == TAG_METS_FILE:
+                    el_fileGrp = el.getparent()
+                    if el_fileGrp.tag != TAG_METS_FILEGRP or el_fileGrp.getparent().tag != TAG_METS_FILESEC:
+                        continue
+                    key = (el_fileGrp.get('USE'), el.get('ID'))
+                    self._add_file_position(key)
+                    page_ids = file_pages.get(el.get('ID'))
+                    if not page_ids:
+                        continue
+                    index = self._page_shards[page_ids[0]]
+                    foreign_page_ids = [page_id for page_id in page_ids[1:] if self._page_shards[page_id] != index]
+                    if foreign_page_ids:
+                        self._foreign_fptrs[key] = foreign_page_ids
+                    el_fileGrp.remove(el)
+                    el_wrapper = ET.Element(TAG_METS_FILEGRP, USE=el_fileGrp.get('USE'))
+                    el_wrapper.append(el)
+                    write(index, el_wrapper)
+                    self._files[key] = index
+                elif _is_page(el):
+                    el.getparent().remove(el)
+                    write(self._page_shards[el.get('ID')], el)
+        el_root = context.root
+        self._nsmap = el_root.nsmap
+        self._skeleton = _ShardMets(content=ET.tostring(el_root, encoding='UTF-8'), cache_flag=True)
+        for ocrd_file in self._skeleton.find_files():
+            self._files.setdefault((ocrd_file.fileGrp, ocrd_file.ID), None)
+
+    def _add_file_position(self, key : Tuple[str, str]) -> None:
+        """
+        Put file ``key`` (fileGrp ``@USE`` and ``@ID``) after all others in its fileGrp
+        """
+        self._file_positions[key] = self._next_file_position
+        self._next_file_position += 1
+
+    def _file_keys(self, ID : str, fileGrps : Optional[List[str]] = None) -> List[Tuple[str, str]]:
+        """
+        The fileGrp ``@USE`` and ``@ID`` of the files with ``@ID`` :py:attr:`ID` (in any of :py:attr:`fileGrps`,
+        by default all fileGrps)
+        """
+        if fileGrps is None:
+            fileGrps = self.file_groups
+        return [(fileGrp, ID) for fileGrp in fileGrps if (fileGrp, ID) in self._files]
+
+    def _shard_path(self, index : int) -> str:
+        return join(self._shard_dir, '%05d.xml' % index)
+
+    def _mets(self, index : Optional[int]) -> OcrdMets:
+        """
+        The skeleton (for ``None``) or shard ``index``, loading it if necessary
+        """
+        if index is None:
+            return self._skeleton
+        shard = self._shards.get(index)
+        if shard is None:
+            shard = self._shards[index] = self._load_shard(index)
+            while len(self._shards) > self.max_shards:
+                self._unload_shard(next(iter(self._shards)))
+        else:
+            self._shards.move_to_end(index) # type: ignore
+        return shard
+
+    def _load_shard(self, index : int) -> OcrdMets:
+        """
+        Build the METS of shard ``index`` from its ``mets:fileGrp`` and page ``mets:div`` fragments
+        """
+        with open(self._shard_path(index), 'rb') as f:
+            el_fragments = ET.fromstring(b'<shard>' + f.read() + b'</shard>')
+        el_root = ET.Element(TAG_METS_METS, nsmap=self._nsmap)
+        el_fileSec = ET.SubElement(el_root, TAG_METS_FILESEC)
+        el_structmap = ET.SubElement(el_root, TAG_METS_STRUCTMAP, TYPE='PHYSICAL')
+        el_seqdiv = ET.SubElement(el_structmap, TAG_METS_DIV, TYPE='physSequence')
+        el_fileGrps : Dict[str, ET._Element] = {}
+        for el in list(el_fragments):
+            if el.tag == TAG_METS_FILEGRP:
+                use = el.get('USE')
+                if use not in el_fileGrps:
+                    el_fileGrps[use] = ET.SubElement(el_fileSec, TAG_METS_FILEGRP, USE=use)
+                el_fileGrps[use].extend(list(el))
+            else:
+                el_seqdiv.append(el)
+        return _ShardMets(content=ET.tostring(el_root, encoding='UTF-8'), cache_flag=True)
+
+    def _unload_shard(self, index : int) -> None:
+        """
+        Remove shard ``index`` from memory, writing it back (with one ``mets:fileGrp`` fragment
+        per fileGrp and one ``mets:div`` fragment per page) if it was changed
+        """
+        shard = self._shards.pop(index)
+        changes = shard._changes # pylint: disable=protected-access
+        self._changes += changes
+        # also write back shards still split into one fragment per file, which load faster afterwards
+        if not changes and index not in self._split_shards:
+            return
+        self._split_shards.discard(index)
+        el_root = shard._tree.getroot() # pylint: disable=protected-access
+        with open(self._shard_path(index), 'wb') as f:
+            for el_fileGrp in el_root.iterfind('mets:fileSec/mets:fileGrp', NS):
+                if len(el_fileGrp):
+                    f.write(ET.tostring(el_fileGrp, encoding='UTF-8', with_tail=False))
+            for el_page in el_root.xpath(XPATH_PAGES, namespaces=NS):
+                f.write(ET.tostring(el_page, encoding='UTF-8', with_tail=False))
+
+    def _revision(self) -> int:
+        """
+        Number of changes since loading, over the skeleton and all shards
+        """
+        # pylint: disable=protected-access
+        return self._changes + self._skeleton._changes + sum(shard._changes for shard in self._shards.values())
+
+    @property
+    def revision(self) -> int:
+        """
+        Number of modifications since the METS was loaded, cf. :py:attr:`ocrd_models.ocrd_mets.OcrdMets.revision`
+        """
+        return self._revision()
+
+    @property
+    def changes(self) -> int:
+        """
+        Number of modifications since the METS was loaded or :py:meth:`mark_saved`
+        """
+        return self._revision() - self._saved_changes
+
+    def mark_saved(self) -> None:
+        """
+        Mark the current state of the METS as saved, i.e. reset :py:attr:`changes`
+        """
+        self._saved_changes = self._revision()
+
+    def snapshot(self) -> OcrdMetsSnapshot:
+        """
+        Get an immutable :py:class:`ocrd_models.ocrd_mets.OcrdMetsSnapshot` of the files
+        and physical pages of this METS, cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets.snapshot`.
+        (This loads all shards.)
+        """
+        revision = self._revision()
+        if self._snapshot is not None and self._snapshot.revision == revision:
+            return self._snapshot
+        # files (with the @ID of their pages) by fileGrp @USE and @ID
+        files : Dict[Tuple[str, str], Tuple[ClientSideOcrdFile, List[str]]] = {}
+        pages : List[Dict[str, str]] = []
+        for index in [None] + list(range(len(self._shard_pages))):
+            snapshot = self._mets(index).snapshot()
+            # pylint: disable=protected-access
+            for fileGrp, fileGrp_files in snapshot._fileGrps.items():
+                for ID, ocrd_file in fileGrp_files.items():
+                    # (and the pages in other shards)
+                    foreign_page_ids = self._foreign_fptrs.get((fileGrp, ID), [])
+                    files[(fileGrp, ID)] = (ocrd_file, fileGrp_files.pageIds[ID] + foreign_page_ids)
+            pages += snapshot._pages
+        fileGrps = {fileGrp: _FileGrpSnapshot() for fileGrp in self.file_groups}
+        for key in sorted(files, key=self._file_positions.__getitem__):
+            if key[0] in fileGrps:
+                fileGrps[key[0]].add_file(*files[key])
+        self._snapshot = OcrdMetsSnapshot(revision, fileGrps, pages)
+        return self._snapshot
+
+    def _all_pages(self) -> List[Dict[str, str]]:
+        """
+        The attributes of all pages in document order
+        """
+        if self._pages is None:
+            self._pages = [page for shard_pages in self._shard_pages for page in shard_pages]
+            self._page_indexes = {}
+            self._number_indexes = {}
+        return self._pages
+
+    def _page_index(self, attr : METS_PAGE_DIV_ATTRIBUTE) -> Dict[str, Dict[str, str]]:
+        pages = self._all_pages()
+        if attr not in self._page_indexes:
+            self._page_indexes[attr] = _page_index(pages, attr)
+        return self._page_indexes[attr]
+
+    def _number_index(self, attr : METS_PAGE_DIV_ATTRIBUTE) -> Dict[str, Tuple[List[int], List[str]]]:
+        page_index = self._page_index(attr)
+        if attr not in self._number_indexes:
+            self._number_indexes[attr] = _number_index(page_index)
+        return self._number_indexes[attr]
+
+    def _page_shard(self, pageId : Optional[str]) -> Optional[int]:
+        """
+        The shard of page ``pageId`` (``None`` without page). New pages are
+        added to the last shard, or to a new shard if the last one is full.
+        """
+        if pageId is None:
+            return None
+        if pageId not in self._page_shards:
+            if not self._shard_pages or len(self._shard_pages[-1]) >= self.shard_pages:
+                open(self._shard_path(len(self._shard_pages)), 'wb').close()
+                self._shard_pages.append([])
+            # as created by OcrdMets.add_file
+            self._shard_pages[-1].append({'TYPE': 'page', 'ID': pageId})
+            self._page_shards[pageId] = len(self._shard_pages) - 1
+            self._pages = None
+        return self._page_shards[pageId]
+
+    def _sync_pages(self, index : Optional[int]) -> None:
+        """
+        Update the pages of shard ``index`` after changes which may have added or removed pages
+        """
+        if index is None:
+            return
+        for page in self._shard_pages[index]:
+            if self._page_shards.get(page.get('ID')) == index:
+                del self._page_shards[page.get('ID')]
+        el_root = self._mets(index)._tree.getroot() # pylint: disable=protected-access
+        self._shard_pages[index] = [dict(el_page.attrib) for el_page in el_root.xpath(XPATH_PAGES, namespaces=NS)]
+        for page in self._shard_pages[index]:
+            self._page_shards.setdefault(page.get('ID'), index)
+        self._pages = None
+
+    @property
+    def unique_identifier(self) -> Optional[str]:
+        """
+        Get the unique identifier by looking through ``mods:identifier``, cf. :py:attr:`OcrdMets.unique_identifier`
+        """
+        return self._skeleton.unique_identifier
+
+    @unique_identifier.setter
+    def unique_identifier(self, purl : str) -> None:
+        self._skeleton.unique_identifier = purl
+
+    @property
+    def agents(self) -> List[OcrdAgent]:
+        """
+        List all :py:class:`ocrd_models.ocrd_agent.OcrdAgent` entries.
+        """
+        return self._skeleton.agents
+
+    def add_agent(self, *args, **kwargs) -> OcrdAgent:
+        """
+        Add an :py:class:`ocrd_models.ocrd_agent.OcrdAgent` to the list of agents in the ``metsHdr``.
+        """
+        return self._skeleton.add_agent(*args, **kwargs)
+
+    @property
+    def file_groups(self) -> List[str]:
+        """
+        List the ``@USE`` of all ``mets:fileGrp`` entries.
+        """
+        return self._skeleton.file_groups
+
+    def find_all_files(self, *args, **kwargs) -> List[OcrdFile]:
+        """
+        Like :py:meth:`find_files` but return a list of all results.
+        Equivalent to ``list(self.find_files(...))``
+        """
+        return list(self.find_files(*args, **kwargs))
+
+    def _query_shards(self, ID : Optional[str], pageId : Optional[str]) -> Iterator[Tuple[Optional[int], Optional[str]]]:
+        """
+        Yield the shards (``None`` for the skeleton) to search for files with :py:attr:`ID` and
+        :py:attr:`pageId`, along with the ``pageId`` query for each: the shards of the
+        selected pages, the shard of a literal ``ID``, or else the skeleton and all shards
+        """
+        if pageId is not None:
+            if not pageId:
+                return
+            page_ids : Dict[int, List[str]] = {}
+            for page_id in self.get_physical_pages(for_pageIds=pageId):
+                page_ids.setdefault(self._page_shards[page_id], []).append(page_id)
+            for index, shard_page_ids in page_ids.items():
+                yield index, ','.join(shard_page_ids)
+            return
+        if ID and not ID.startswith(REGEX_PREFIX):
+            for index in dict.fromkeys(self._files[key] for key in self._file_keys(ID)):
+                yield index, None
+            return
+        for index in [None] + list(range(len(self._shard_pages))):
+            yield index, None
+
+    def find_files(self, ID : Optional[str] = None, pageId : Optional[str] = None, **kwargs) -> Iterator[OcrdFile]:
+        """
+        Search ``mets:file`` entries like :py:meth:`ocrd_models.ocrd_mets.OcrdMets.find_files`
+        (with the same arguments), in the shards of the pages selected by :py:attr:`pageId`,
+        the shard of a literal :py:attr:`ID`, or else in the skeleton and all shards (in that order).
+        """
+        foreign = self._foreign_files(pageId)
+        found = set()
+        for index, shard_pageId in self._query_shards(ID, pageId):
+            for ocrd_file in self._mets(index).find_files(ID=ID, pageId=shard_pageId, **kwargs):
+                if foreign:
+                    found.add((ocrd_file.fileGrp, ocrd_file.ID))
+                yield ShardedOcrdFile(self, ocrd_file.fileGrp, ocrd_file.ID)
+        for ocrd_file in self._find_foreign_files(foreign, found, ID=ID, **kwargs):
+            yield ShardedOcrdFile(self, ocrd_file.fileGrp, ocrd_file.ID)
+
+    def _foreign_files(self, pageId : Optional[str]) -> Dict[Optional[int], Dict[Tuple[str, str], None]]:
+        """
+        The files (by shard) referenced by the pages selected by :py:attr:`pageId`
+        which belong to the shard of another page
+        """
+        if not self._foreign_fptrs or not pageId:
+            return {}
+        page_ids = set(self.get_physical_pages(for_pageIds=pageId))
+        foreign : Dict[Optional[int], Dict[Tuple[str, str], None]] = {}
+        for key, foreign_page_ids in self._foreign_fptrs.items():
+            if page_ids.intersection(foreign_page_ids):
+                foreign.setdefault(self._files[key], {})[key] = None
+        return foreign
+
+    def _find_foreign_files(self, foreign : Dict[Optional[int], Dict[Tuple[str, str], None]], found : Iterable[Tuple[str, str]],
+                            ID : Optional[str] = None, **kwargs) -> Iterator[OcrdFile]:
+        """
+        Search the files of :py:attr:`foreign` (cf. :py:meth:`_foreign_files`) not already ``found``
+        in their own shards, with the other arguments of :py:meth:`find_files`
+        """
+        found = set(found)
+        for index, keys in foreign.items():
+            for ocrd_file in self._mets(index).find_files(ID=ID, **kwargs):
+                key = (ocrd_file.fileGrp, ocrd_file.ID)
+                if key in keys and key not in found:
+                    yield ocrd_file
+
+    def to_table(self, ID : Optional[str] = None, pageId : Optional[str] = None, **kwargs) -> Dict[str, np.ndarray]:
+        """
+        List the files matching :py:meth:`find_files` as columns like
+        :py:meth:`ocrd_models.ocrd_mets.OcrdMets.to_table`, concatenating the tables of the shards
+        """
+        tables = [self._mets(index).to_table(ID=ID, pageId=shard_pageId, **kwargs)
+                  for index, shard_pageId in self._query_shards(ID, pageId)]
+        foreign = self._foreign_files(pageId)
+        if foreign:
+            found = [key for table in tables for key in zip(table['fileGrp'], table['ID'])]
+            tables.append(_files_table(self._find_foreign_files(foreign, found, ID=ID, **kwargs)))
+        if not tables:
+            return _table([])
+        return {column: np.concatenate([table[column] for table in tables]) for column in TABLE_COLUMNS}
+
+    def _check_file_exists(self, files : Dict[Tuple[str, str], Optional[int]], ID : str, fileGrp : str, index : Optional[int]) -> None:
+        """
+        Raise an exception if a file ``ID`` of ``fileGrp`` exists in another shard than ``index``
+        (where it would be on another page, so cannot be replaced)
+        """
+        if (fileGrp, ID) in files and files[(fileGrp, ID)] != index:
+            raise FileExistsError(f"A file with ID=={ID} already exists on another page - cannot mitigate")
+
+    def add_file(self, fileGrp : str, mimetype : Optional[str] = None, url : Optional[str] = None,
+                 ID : Optional[str] = None, pageId : Optional[str] = None, force : bool = False,
+                 local_filename : Optional[str] = None, ignore : bool = False, **kwargs) -> OcrdFile:
+        """
+        Instantiate and add a new :py:class:`ocrd_models.ocrd_file.OcrdFile` to the shard of its page,
+        cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets.add_file`.
+        """
+        _validate_file(ID, fileGrp)
+        assert ID
+        new_page = pageId is not None and pageId not in self._page_shards
+        index = self._page_shard(pageId)
+        try:
+            if not ignore:
+                self._check_file_exists(self._files, ID, fileGrp, index)
+            ret = self._mets(index).add_file(fileGrp, mimetype=mimetype, url=url, ID=ID, pageId=pageId, force=force,
+                                             local_filename=local_filename, ignore=ignore, **kwargs)
+        finally:
+            if new_page or force:
+                self._sync_pages(index)
+        self._skeleton.add_file_group(fileGrp)
+        self._files[(fileGrp, ID)] = index
+        # (like OcrdMets.add_file, also when replacing the file)
+        self._add_file_position((fileGrp, ID))
+        return ShardedOcrdFile(self, fileGrp, ret.ID)
+
+    def add_files(self, records : Iterable[Dict[str, Any]], force : bool = False, ignore : bool = False) -> List[OcrdFile]:
+        """
+        Add many new :py:class:`ocrd_models.ocrd_file.OcrdFile` to the shards of their pages,
+        cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets.add_files`.
+        """
+        records = list(records)
+        for record in records:
+            _validate_file(record.get('ID'), record.get('fileGrp'))
+        # positions of the records of each shard
+        positions : Dict[Optional[int], List[int]] = {}
+        changed_shards = set()
+        files = dict(self._files) if not ignore else {}
+        try:
+            for pos, record in enumerate(records):
+                pageId = record.get('pageId')
+                if force or (pageId is not None and pageId not in self._page_shards):
+                    changed_shards.add(self._page_shard(pageId))
+                index = self._page_shard(pageId)
+                if not ignore:
+                    self._check_file_exists(files, record['ID'], record['fileGrp'], index)
+                    files[(record['fileGrp'], record['ID'])] = index
+                positions.setdefault(index, []).append(pos)
+            for record in records:
+                self._skeleton.add_file_group(record['fileGrp'])
+            ret : List[OcrdFile] = [None] * len(records) # type: ignore
+            for index, shard_positions in positions.items():
+                shard_files = self._mets(index).add_files([records[pos] for pos in shard_positions], force=force, ignore=ignore)
+                for pos, ocrd_file in zip(shard_positions, shard_files):
+                    ret[pos] = ShardedOcrdFile(self, records[pos]['fileGrp'], ocrd_file.ID)
+                    self._files[(records[pos]['fileGrp'], ocrd_file.ID)] = index
+            for record in records:
+                self._add_file_position((record['fileGrp'], record['ID']))
+        finally:
+            for index in changed_shards:
+                self._sync_pages(index)
+        return ret
+
+    def remove_file(self, *args, **kwargs) -> Union[List[OcrdFile],OcrdFile]:
+        """
+        Delete each ``ocrd:file`` matching the query. Same arguments as :py:meth:`find_files`
+        """
+        files = list(self.find_files(*args, **kwargs))
+        if files:
+            self.remove_files(files)
+            if len(files) > 1:
+                return files
+            else:
+                return files[0]  # for backwards-compatibility
+        if any(1 for kwarg in kwargs
+               if isinstance(kwarg, str) and kwarg.startswith(REGEX_PREFIX)):
+            # allow empty results if filter criteria involve a regex
+            return []
+        raise FileNotFoundError("File not found: %s %s" % (args, kwargs))
+
+    def remove_one_file(self, ID : Union[str, OcrdFile], fileGrp : Optional[str] = None) -> OcrdFile:
+        """
+        Delete an existing :py:class:`ocrd_models.ocrd_file.OcrdFile`,
+        cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets.remove_one_file`.
+        """
+        if isinstance(ID, OcrdFile):
+            fileGrp, ID = ID.fileGrp, ID.ID
+        keys = [(fileGrp, ID)] if fileGrp else self._file_keys(ID)
+        if not keys or keys[0] not in self._files:
+            raise FileNotFoundError("File not found: %s (fileGr=%s)" % (ID, fileGrp))
+        return self._remove_files(keys[:1])[0]
+
+    def remove_files(self, files : Iterable[Union[str, OcrdFile]], force : bool = False) -> List[OcrdFile]:
+        """
+        Delete many existing :py:class:`ocrd_models.ocrd_file.OcrdFile` at once, one shard at a time,
+        cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets.remove_files`.
+        """
+        log = getLogger('ocrd.models.ocrd_mets_sharded.remove_files')
+        fileGrps = self.file_groups
+        keys = []
+        missing = []
+        for ocrd_file in files:
+            if isinstance(ocrd_file, OcrdFile):
+                key = (ocrd_file.fileGrp, ocrd_file.ID)
+                if key in self._files:
+                    keys.append(key)
+                else:
+                    missing.append(ocrd_file.ID)
+            elif self._file_keys(ocrd_file, fileGrps):
+                keys += self._file_keys(ocrd_file, fileGrps)
+            else:
+                missing.append(ocrd_file)
+        if missing:
+            if not force:
+                raise FileNotFoundError("Files not found: %s" % missing)
+            log.warning("Files not found: %s", missing)
+        return self._remove_files(keys)
+
+    def _remove_files(self, keys : Iterable[Tuple[str, str]]) -> List[OcrdFile]:
+        """
+        Delete the existing files ``keys`` (fileGrp ``@USE`` and ``@ID``), one shard at a time
+        """
+        # file @ID by fileGrp by shard
+        shard_file_ids : Dict[Optional[int], Dict[str, Dict[str, None]]] = {}
+        for fileGrp, ID in keys:
+            shard_file_ids.setdefault(self._files[(fileGrp, ID)], {}).setdefault(fileGrp, {})[ID] = None
+        ret = []
+        for index, file_ids in shard_file_ids.items():
+            shard = self._mets(index)
+            # (one fileGrp at a time, because OcrdMets.remove_files tells files apart by @ID only)
+            for fileGrp, fileGrp_file_ids in file_ids.items():
+                # pylint: disable=protected-access
+                ret += shard.remove_files([OcrdFile(shard._file_cache[fileGrp][ID], mets=shard) for ID in fileGrp_file_ids])
+                for ID in fileGrp_file_ids:
+                    del self._files[(fileGrp, ID)]
+                    del self._file_positions[(fileGrp, ID)]
+                    self._remove_foreign_fptrs((fileGrp, ID))
+            self._sync_pages(index)
+        return ret
+
+    def _remove_foreign_fptrs(self, key : Tuple[str, str]) -> List[str]:
+        """
+        Delete the ``mets:fptr`` to file ``key`` (fileGrp ``@USE`` and ``@ID``) in the pages of other shards than the file's own.
+        Returns:
+            List of pageIds that mets:fptrs were deleted from
+        """
+        ret = []
+        for page_id in self._foreign_fptrs.pop(key, []):
+            if page_id in self._page_shards:
+                ret += self._mets(self._page_shards[page_id]).remove_physical_page_fptr(key[1])
+        return ret
+
+    def _rename_file(self, fileGrp : str, old : str, new : str) -> None:
+        """
+        Change the ``@ID`` of file :py:attr:`old` of :py:attr:`fileGrp` to :py:attr:`new`, also in the pages
+        referencing it (cf. :py:attr:`ShardedOcrdFile.ID`)
+        """
+        key = (fileGrp, old)
+        if key not in self._files:
+            raise FileNotFoundError("File not found: %s (fileGrp=%s)" % (old, fileGrp))
+        index = self._files.pop(key)
+        shard = self._mets(index)
+        OcrdFile(shard._file_cache[fileGrp][old], mets=shard).ID = new # pylint: disable=protected-access
+        self._files[(fileGrp, new)] = index
+        self._file_positions[(fileGrp, new)] = self._file_positions.pop(key)
+        foreign_page_ids = self._foreign_fptrs.pop(key, [])
+        for page_id in foreign_page_ids:
+            page_shard = self._mets(self._page_shards[page_id])
+            page_shard.remove_physical_page_fptr(old)
+            page_shard.set_physical_page_for_file(page_id, ShardedOcrdFile(self, fileGrp, new))
+        if foreign_page_ids:
+            self._foreign_fptrs[(fileGrp, new)] = foreign_page_ids
+
+    def _update_file_cache(self, el_file : ET._Element, attr : str, old : Optional[str], new : Optional[str]) -> None:
+        """
+        Keep the file caches of the shard of ``el_file`` consistent after its ``mimetype``, ``url``
+        or ``local_filename`` changed (cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets._update_file_cache`)
+        """
+        index = self._files[(el_file.getparent().get('USE'), el_file.get('ID'))]
+        self._mets(index)._update_file_cache(el_file, attr, old, new) # pylint: disable=protected-access
+
+    def _rekey_files(self, keys : Iterable[Tuple[str, str]], fileGrp : str) -> None:
+        """
+        Move the files ``keys`` to :py:attr:`fileGrp` in the bookkeeping of shards, positions and foreign pages
+        """
+        for key in list(keys):
+            new_key = (fileGrp, key[1])
+            self._files[new_key] = self._files.pop(key)
+            self._file_positions[new_key] = self._file_positions.pop(key)
+            if key in self._foreign_fptrs:
+                self._foreign_fptrs[new_key] = self._foreign_fptrs.pop(key)
+
+    def rename_file_group(self, old : str, new : str) -> None:
+        """
+        Rename a ``mets:fileGrp`` by changing the ``@USE`` from :py:attr:`old` to :py:attr:`new`.
+        """
+        self._skeleton.rename_file_group(old, new)
+        keys = [key for key in self._files if key[0] == old]
+        for index in dict.fromkeys(self._files[key] for key in keys):
+            if index is not None:
+                self._mets(index).rename_file_group(old, new)
+        self._rekey_files(keys, new)
+
+    def remove_file_group(self, USE : str, recursive : bool = False, force : bool = False) -> None:
+        """
+        Remove a ``mets:fileGrp`` (single fixed ``@USE`` or multiple regex ``@USE``),
+        cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets.remove_file_group`.
+        """
+        log = getLogger('ocrd.models.ocrd_mets_sharded.remove_file_group')
+        if USE.startswith(REGEX_PREFIX):
+            use = re.compile(USE[len(REGEX_PREFIX):])
+            for fileGrp in self.file_groups:
+                if use.fullmatch(fileGrp):
+                    self.remove_file_group(fileGrp, recursive=recursive)
+            return
+        if USE not in self.file_groups:
+            msg = "No such fileGrp: %s" % USE
+            if force:
+                log.warning(msg)
+                return
+            raise Exception(msg)
+        keys = [key for key in self._files if key[0] == USE]
+        if keys:
+            if not recursive:
+                raise Exception("fileGrp %s is not empty and recursive wasn't set" % USE)
+            self._remove_files(keys)
+        self._skeleton.remove_file_group(USE)
+
+    @property
+    def physical_pages(self) -> List[str]:
+        """
+        List all page IDs (the ``@ID`` of each physical ``mets:structMap`` ``mets:div``)
+        """
+        return [page['ID'] for page in self._all_pages()]
+
+    def get_physical_pages(self, for_fileIds : Optional[List[str]] = None, for_pageIds : Optional[str] = None,
+                           return_divs : bool = False) -> List[Any]:
+        """
+        List all page IDs, optionally for a subset of ``mets:file`` ``@ID`` :py:attr:`for_fileIds`,
+        or for a subset selector expression :py:attr:`for_pageIds`,
+        cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets.get_physical_pages`.
+        If return_divs is set, returns div memory objects (loading their shards) instead of strings of ids
+        """
+        if for_fileIds is None and for_pageIds is None:
+            return self.physical_pages
+        if for_pageIds is not None:
+            page_ids = [page['ID'] for page in _resolve_pageIds(for_pageIds, self._page_index, self._number_index)]
+            if return_divs:
+                return [self._mets(self._page_shards[page_id]).get_physical_pages(for_pageIds=page_id, return_divs=True)[0]
+                        for page_id in page_ids]
+            return page_ids
+        assert for_fileIds is not None
+        ret : List[Any] = [None] * len(for_fileIds)
+        positions : Dict[int, List[int]] = {}
+        fileGrps = self.file_groups
+        for pos, fileId in enumerate(for_fileIds):
+            keys = self._file_keys(fileId, fileGrps)
+            if keys and self._files[keys[0]] is not None:
+                positions.setdefault(self._files[keys[0]], []).append(pos) # type: ignore
+        for index, shard_positions in positions.items():
+            pages = self._mets(index).get_physical_pages(
+                for_fileIds=[for_fileIds[pos] for pos in shard_positions], return_divs=return_divs)
+            for pos, page in zip(shard_positions, pages):
+                ret[pos] = page
+        return ret
+
+    def set_physical_page_for_file(self, pageId : str, ocrd_file : OcrdFile,
+                                   order : Optional[str] = None, orderlabel : Optional[str] = None) -> None:
+        """
+        Set the physical page ID corresponding to the ``mets:file`` :py:attr:`ocrd_file`,
+        moving the file to the shard of that page if necessary,
+        cf. :py:meth:`ocrd_models.ocrd_mets.OcrdMets.set_physical_page_for_file`.
+        """
+        fileGrp, ID = key = (ocrd_file.fileGrp, ocrd_file.ID)
+        if key not in self._files:
+            raise FileNotFoundError("File not found: %s (fileGrp=%s)" % (ID, fileGrp))
+        index = self._files[key]
+        new_page = pageId not in self._page_shards
+        page_index = self._page_shard(pageId)
+        self._remove_foreign_fptrs(key)
+        try:
+            if page_index == index:
+                self._mets(index).set_physical_page_for_file(pageId, ocrd_file, order=order, orderlabel=orderlabel)
+                return
+            old_file = self._mets(index).remove_one_file(ID, fileGrp)
+            self._mets(page_index).add_file(fileGrp, ID=ID, pageId=pageId, mimetype=old_file.mimetype,
+                                            url=old_file.url or None, local_filename=old_file.local_filename)
+            self._files[key] = page_index
+            if new_page and (order or orderlabel):
+                self._mets(page_index).update_physical_page_attributes(
+                    pageId, **{k: v for k, v in [('ORDER', order), ('ORDERLABEL', orderlabel)] if v})
+        finally:
+            self._sync_pages(index)
+            if page_index != index:
+                self._sync_pages(page_index)
+
+    def get_physical_page_for_file(self, ocrd_file : OcrdFile) -> Optional[str]:
+        """
+        Get the physical page ID corresponding to the ``mets:file`` :py:attr:`ocrd_file`.
+        """
+        key = (ocrd_file.fileGrp, ocrd_file.ID)
+        if key not in self._files:
+            return None
+        return self._mets(self._files[key]).get_physical_page_for_file(ocrd_file)
+
+    def update_physical_page_attributes(self, page_id : str, **kwargs) -> None:
+        """
+        Set (or with an empty value, remove) attributes of the physical page :py:attr:`page_id`.
+        """
+        invalid_keys = list(k for k in kwargs.keys() if k not in METS_PAGE_DIV_ATTRIBUTE.names())
+        if invalid_keys:
+            raise ValueError(f"Invalid attribute {invalid_keys}. Allowed values: {METS_PAGE_DIV_ATTRIBUTE.names()}")
+        page_ids = self.get_physical_pages(for_pageIds=page_id)
+        if not page_ids:
+            raise ValueError(f"Could not find mets:div[@ID=={page_id}]")
+        index = self._page_shards[page_ids[0]]
+        self._mets(index).update_physical_page_attributes(page_ids[0], **kwargs)
+        self._sync_pages(index)
+
+    def remove_physical_page(self, ID : str) -> None:
+        """
+        Delete page (physical ``mets:structMap`` ``mets:div`` entry ``@ID``) :py:attr:`ID`.
+        """
+        if ID not in self._page_shards:
+            return
+        index = self._page_shards[ID]
+        self._mets(index).remove_physical_page(ID)
+        for key, foreign_page_ids in list(self._foreign_fptrs.items()):
+            if ID in foreign_page_ids:
+                foreign_page_ids.remove(ID)
+                if not foreign_page_ids:
+                    del self._foreign_fptrs[key]
+        self._sync_pages(index)
+
+    def remove_physical_page_fptr(self, fileId : str) -> List[str]:
+        """
+        Delete all ``mets:fptr[@FILEID = fileId]`` (in the shard of the ``mets:file`` and in other shards).
+        Returns:
+            List of pageIds that mets:fptrs were deleted from
+        """
+        keys = self._file_keys(fileId)
+        ret = []
+        for index in dict.fromkeys(self._files[key] for key in keys):
+            ret += self._mets(index).remove_physical_page_fptr(fileId)
+        for key in keys:
+            ret += self._remove_foreign_fptrs(key)
+        return ret
+
+    @property
+    def physical_pages_labels(self) -> Dict[str, Tuple[Optional[str], Optional[str], Optional[str]]]:
+        """
+        Map all page IDs to their ``@ORDER``, ``@ORDERLABEL`` and ``@LABEL`` attributes, if any.
+        """
+        return {page['ID']: (page.get('ORDER', None), page.get('ORDERLABEL', None), page.get('LABEL', None))
+                for page in self._all_pages()}
+
+    def merge(self, other_mets, force : bool = False,
+              fileGrp_mapping : Optional[Dict[str, str]] = None,
+              fileId_mapping : Optional[Dict[str, str]] = None,
+              pageId_mapping : Optional[Dict[str, str]] = None,
+              after_add_cb : Optional[Callable[[OcrdFile], Any]] = None, **kwargs) -> None:
+        """
+        Add all files from other_mets (with :py:meth:`add_files`), with the same arguments
+        as :py:meth:`ocrd_models.ocrd_mets.OcrdMets.merge`.
+        """
+        records, pages_src = _merge_records(other_mets, fileGrp_mapping, fileId_mapping, pageId_mapping, **kwargs)
+        files_dest = self.add_files(records, force=force)
+
+        # physical pages: take over @ORDER, @ORDERLABEL, @LABEL etc. where still unset
+        page_index = self._page_index(METS_PAGE_DIV_ATTRIBUTE.ID)
+        merged_pages = {}
+        page_attributes = {}
+        for record, page_src in zip(records, pages_src):
+            pageId = record['pageId']
+            if page_src is None or pageId is None or pageId in merged_pages:
+                continue
+            merged_pages[pageId] = page_src.get('ID')
+            attributes = _merge_page_attributes(page_src, page_index[pageId])
+            if attributes:
+                page_attributes[pageId] = attributes
+        changed_shards = set()
+        for pageId, attributes in page_attributes.items():
+            index = self._page_shards[pageId]
+            self._mets(index).update_physical_page_attributes(pageId, **attributes)
+            changed_shards.add(index)
+        for index in changed_shards:
+            self._sync_pages(index)
+
+        _merge_agents(self._skeleton, other_mets)
+        _merge_structure(self._skeleton._tree.getroot(), other_mets, merged_pages) # pylint: disable=protected-access
+
+        if after_add_cb:
+            for f_dest in files_dest:
+                after_add_cb(f_dest)
+
+    def write_sidecar_index(self, filename : str) -> None:
+        """
+        Does nothing: The caches of a sharded METS are not restored from an index.
+        """
+
+    def to_xml(self, xmllint : bool = False) -> bytes:
+        """
+        Serialize the METS as pretty-printed XML, cf. :py:meth:`write_xml`
+
+        Args:
+            xmllint (boolean): Format with ``xmllint`` in addition to pretty-printing
+        """
+        f = BytesIO()
+        self.write_xml(f)
+        ret = f.getvalue()
+        if xmllint:
+            ret = xmllint_format(ret)
+        return ret
+
+    def _spool_files(self, spool, entries : List[Tuple[int, int, int]], el_fileGrp : ET._Element) -> None:
+        """
+        Serialize the ``mets:file`` entries of ``el_fileGrp`` to ``spool``, adding the position
+        (in their fileGrp), offset and length of each to ``entries``
+        """
+        data = _serialize_children(el_fileGrp, 2)
+        starts = [match.start() for match in REGEX_FILE_START.finditer(data)]
+        offset = spool.tell()
+        spool.write(data)
+        use = el_fileGrp.get('USE')
+        position = -1
+        if len(starts) != len(el_fileGrp):
+            # cannot tell the files apart, so keep them together
+            entries.append((self._file_positions.get((use, el_fileGrp[0].get('ID')), position), offset, len(data)))
+            return
+        for el, start, end in zip(el_fileGrp, starts, starts[1:] + [len(data)]):
+            # (anything but a mets:file stays behind the preceding one)
+            position = self._file_positions.get((use, el.get('ID')), position)
+            entries.append((position, offset + start, end - start))
+
+    def write_xml(self, f, xmllint : bool = False) -> None:
+        """
+        Serialize the METS as pretty-printed XML to the file object ``f`` (opened in binary mode).
+        The skeleton is serialized with placeholders for the files of each ``mets:fileGrp``
+        and for the pages, which are filled from temporary files written in one pass over the shards
+        (copying the files of each fileGrp in their original order).
+
+        Args:
+            xmllint (boolean): Format with ``xmllint`` in addition to pretty-printing
+                (which requires the complete document in memory)
+        """
+        if xmllint:
+            f.write(self.to_xml(xmllint=True))
+            return
+        el_root = self._skeleton._tree.getroot() # pylint: disable=protected-access
+        el_seqdiv = el_root.find('mets:structMap[@TYPE="PHYSICAL"]/mets:div[@TYPE="physSequence"]', NS)
+        if el_seqdiv is None and any(self._shard_pages):
+            # cf. OcrdMets.set_physical_page_for_file
+            el_structmap = el_root.find('mets:structMap[@TYPE="PHYSICAL"]', NS)
+            if el_structmap is None:
+                el_structmap = ET.SubElement(el_root, TAG_METS_STRUCTMAP, TYPE='PHYSICAL')
+            el_seqdiv = ET.SubElement(el_structmap, TAG_METS_DIV, TYPE='physSequence')
+        token = 'ocrd-mets-shard-%s' % uuid4().hex
+        el_markers = []
+        # files of the skeleton (serialized like those of the shards), by their fileGrp
+        el_detached : List[Tuple[ET._Element, List[ET._Element]]] = []
+        with ExitStack() as stack:
+            # temporary files for the files of each fileGrp by @USE, and for the pages (None),
+            # along with the position, offset and length of each file
+            spools = {}
+            entries : Dict[Optional[str], List[Tuple[int, int, int]]] = {}
+            els = list(el_root.iterfind('mets:fileSec/mets:fileGrp', NS))
+            if el_seqdiv is not None:
+                els.append(el_seqdiv)
+            try:
+                for el in els:
+                    key = None if el is el_seqdiv else el.get('USE')
+                    if key in spools:
+                        continue
+                    spools[key] = stack.enter_context(TemporaryFile())
+                    entries[key] = []
+                    if key is not None and len(el):
+                        self._spool_files(spools[key], entries[key], el)
+                        el_detached.append((el, list(el)))
+                        for el_file in el_detached[-1][1]:
+                            el.remove(el_file)
+                    el_marker = ET.Comment('%s-%s' % (token, len(el_markers)))
+                    el.append(el_marker)
+                    el_markers.append((key, el_marker))
+                for index in range(len(self._shard_pages)):
+                    el_shard = self._mets(index)._tree.getroot() # pylint: disable=protected-access
+                    for el_fileGrp in el_shard.iterfind('mets:fileSec/mets:fileGrp', NS):
+                        if el_fileGrp.get('USE') in spools and len(el_fileGrp):
+                            self._spool_files(spools[el_fileGrp.get('USE')], entries[el_fileGrp.get('USE')], el_fileGrp)
+                    if None in spools:
+                        for el_shard_seqdiv in el_shard.iterfind('mets:structMap[@TYPE="PHYSICAL"]/mets:div', NS):
+                            spools[None].write(_serialize_children(el_shard_seqdiv, 2))
+                ET.indent(el_root, space='  ')
+                data = ET.tostring(el_root, pretty_print=True, encoding='UTF-8')
+            finally:
+                for _, el_marker in el_markers:
+                    el_marker.getparent().remove(el_marker)
+                for el, el_files in el_detached:
+                    el.extend(el_files)
+            # same XML declaration as xmllint_format
+            f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+            pos = 0
+            for match in re.finditer(rb'\n *<!--%s-(\d+)-->' % token.encode('ascii'), data):
+                f.write(data[pos:match.start()])
+                key, _ = el_markers[int(match.group(1))]
+                spool = spools[key]
+                if key is None:
+                    spool.seek(0)
+                    copyfileobj(spool, f)
+                else:
+                    _copy_ranges(spool, f, sorted(entries[key]))
+                pos = match.end()
+            f.write(data[pos:])
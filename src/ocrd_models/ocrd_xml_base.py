@@ -24,19 +24,30 @@ class OcrdXmlDocument():
             cache_flag (bool):
         """
         #  print(self, filename, content)
+        # Cache enabled - True/False
+        self._cache_flag = cache_flag
+
         if filename is None and content is None:
             raise Exception("Must pass 'filename' or 'content' to " + self.__class__.__name__)
         elif content:
-            self._tree = ET.ElementTree(ET.XML(content, parser=ET.XMLParser(encoding='utf-8')))
+            self._tree = self._parse(content=content)
         else:
             assert filename
             filename = filename.replace('file://', '')
             if not exists(filename):
                 raise Exception('File does not exist: %s' % filename)
-            self._tree = ET.parse(filename)
+            self._tree = self._parse(filename=filename)
 
-        # Cache enabled - True/False
-        self._cache_flag = cache_flag
+    def _parse(self, filename=None, content=None):
+        """
+        Parse the document from either :py:attr:`filename` or :py:attr:`content`
+
+        Returns:
+            the ``lxml.etree.ElementTree`` of the document
+        """
+        if content:
+            return ET.ElementTree(ET.XML(content, parser=ET.XMLParser(encoding='utf-8')))
+        return ET.parse(filename)
 
     def to_xml(self, xmllint=False):
         """
@@ -50,3 +61,22 @@ class OcrdXmlDocument():
         if xmllint:
             ret = xmllint_format(ret)
         return ret
+
+    def write_xml(self, f, xmllint=False):
+        """
+        Serialize all properties as pretty-printed XML to the file object ``f``
+        (opened in binary mode), with the same result as writing :py:meth:`to_xml`
+
+        Args:
+            xmllint (boolean): Format with ``xmllint`` in addition to pretty-printing.
+                Otherwise, re-indent the tree in place like ``xmllint`` and serialize
+                it directly to ``f``, without intermediate copies of the document.
+        """
+        if xmllint:
+            f.write(self.to_xml(xmllint=True))
+            return
+        root = self._tree.getroot()
+        ET.indent(root, space='  ')
+        # same XML declaration as xmllint_format
+        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+        ET.ElementTree(root).write(f, pretty_print=True, encoding='UTF-8', xml_declaration=False)
@@ -105,6 +105,84 @@ config.add('OCRD_METS_CACHING',
     validator=lambda val: val in ('true', 'false', '0', '1'),
     parser=lambda val: val in ('true', '1'))
 
+config.add('OCRD_METS_ITERPARSE',
+    description='If set to `true` and caching is enabled, the METS caches are built while parsing the METS (in a single `lxml.etree.iterparse` pass) instead of traversing the parsed tree again.',
+    validator=lambda val: val in ('true', 'false', '0', '1'),
+    parser=lambda val: val in ('true', '1'))
+
+config.add('OCRD_METS_SIDECAR_INDEX',
+    description='If set to `true`, saving a workspace also writes an index of the METS to `$XDG_CACHE_HOME/ocrd/mets-index`, from which the METS caches are restored (instead of rebuilt) when the unchanged METS is opened again with caching enabled.',
+    default=(True, False),
+    validator=lambda val: isinstance(val, bool) or val in ('true', 'false', '0', '1'),
+    parser=lambda val: val in ('true', '1'))
+
+config.add('OCRD_METS_XMLLINT',
+    description='Whether saving a workspace re-formats the METS with `xmllint` (slower). If set to `false`, the METS is re-indented in place and written to disk in one pass instead.',
+    default=(True, True),
+    validator=lambda val: isinstance(val, bool) or val in ('true', 'false', '0', '1'),
+    parser=lambda val: val in (True, 'true', '1'))
+
+config.add('OCRD_METS_WRITE_BEHIND_SECONDS',
+    description='If greater than 0, saving a changed workspace is deferred until this many seconds have passed since the METS was last written (within `Workspace.write_behind`, e.g. between the tasks of `ocrd process`).',
+    parser=int,
+    default=(True, 0))
+
+config.add('OCRD_METS_WRITE_BEHIND_CHANGES',
+    description='If greater than 0, saving a changed workspace is deferred until the METS has been modified this many times since it was last written (within `Workspace.write_behind`, e.g. between the tasks of `ocrd process`).',
+    parser=int,
+    default=(True, 0))
+
+config.add('OCRD_METS_SHARD_PAGES',
+    description='If greater than 0, workspaces load the METS as `ShardedOcrdMets`, which keeps the files and physical pages in shards of this many consecutive pages, only loaded when accessed (for works with very many pages).',
+    parser=int,
+    default=(True, 0))
+
+config.add('OCRD_METS_SHARD_CACHE',
+    description='Number of METS shards kept in memory at most (with `OCRD_METS_SHARD_PAGES`).',
+    parser=int,
+    default=(True, 16))
+
+config.add('OCRD_METS_SERVER_BATCH_SIZE',
+    description='When running a processor against a METS server, queue up to this many `add_file` requests and send them in a single batch request (along with the next query). Errors of queued requests are only reported when the batch is sent. 0 disables batching.',
+    parser=int,
+    default=(True, 0))
+
+config.add('OCRD_METS_SERVER_FLUSH_INTERVAL',
+    description='Minimum number of seconds between two saves of the METS by a METS server. Save requests of clients in the meantime are coalesced into the next save, and return once it is done.',
+    parser=float,
+    default=(True, 0))
+
+config.add('OCRD_METS_SERVER_CACHE',
+    description='If set to `true`, clients of a METS server cache the results of `find_files`, `file_groups`, `agents` and `unique_identifier` by query, and revalidate them with conditional requests, which the server answers without data as long as the METS is unchanged.',
+    default=(True, False),
+    validator=lambda val: isinstance(val, bool) or val in ('true', 'false', '0', '1'),
+    parser=lambda val: val in ('true', '1'))
+
+config.add('OCRD_METS_SERVER_CACHE_TTL',
+    description='With `OCRD_METS_SERVER_CACHE`, number of seconds for which cached results are reused without revalidation (i.e. without any request), unless the client changed the METS itself. Changes by other clients in the meantime are not seen, so they show up with up to this delay. 0 revalidates every lookup with a conditional request.',
+    parser=float,
+    default=(True, 1))
+
+config.add('OCRD_MAX_PARALLEL_PAGES',
+    description='Maximum number of pages to process at once by processors using the per-page API (`process_page_file` or `process_page_pcgts`). 1 processes pages one after another.',
+    parser=int,
+    default=(True, 1))
+
+config.add('OCRD_PARALLEL_PAGES_POOL',
+    description='With `OCRD_MAX_PARALLEL_PAGES`, whether to process pages in a pool of threads (`thread`) or of forked processes (`process`).',
+    validator=lambda val: val in ('thread', 'process'),
+    default=(True, 'thread'))
+
+config.add('OCRD_PREFETCH_PAGES',
+    description='When processing pages one after another with the per-page API (`process_page_pcgts`), parse (or for images create) the input PAGE of up to this many next pages, and decode the images the processor declares it needs (`image_from_page_args`), in background threads meanwhile (after downloading their input files in the main thread). 0 disables prefetching.',
+    parser=int,
+    default=(True, 0))
+
+config.add('OCRD_WRITER_THREADS',
+    description='Number of background threads to encode and write the output files of a processor (images and PAGE), while the next pages are processed. The files are still added to the METS in order, and all are written before the METS is saved. 0 writes synchronously.',
+    parser=int,
+    default=(True, 0))
+
 config.add('OCRD_MAX_PROCESSOR_CACHE',
     description="Maximum number of processor instances (for each set of parameters) to be kept in memory (including loaded models) for processing workers or processor servers.",
     parser=int,
@@ -187,6 +265,11 @@ config.add("XDG_CONFIG_HOME",
     parser=lambda val: Path(val),
     default=(True, lambda: Path(config.HOME, '.config')))
 
+config.add("XDG_CACHE_HOME",
+    description="Directory to store `./ocrd/mets-index/*` (i.e. the METS indexes written with `OCRD_METS_SIDECAR_INDEX`)",
+    parser=lambda val: Path(val),
+    default=(True, lambda: Path(config.HOME, '.cache')))
+
 config.add("OCRD_LOGGING_DEBUG",
     description="Print information about the logging setup to STDERR",
     default=(True, False),
@@ -3,11 +3,12 @@ from pathlib import Path
 from filecmp import dircmp
 from shutil import copytree
 from tempfile import TemporaryDirectory
-from io import StringIO
+from io import BytesIO, StringIO
 from contextlib import contextmanager
 import sys
 
 from click.testing import CliRunner
+import numpy as np
 import pytest
 
 # pylint: disable=import-error, no-name-in-module
@@ -278,6 +279,26 @@ class TestCli(TestCase):
                 self.assertEqual(result.output, 'OCR-D-IMG-BIN\tFILE_0001_IMAGE_BIN\tPHYS_0001\n'
                                                 'OCR-D-IMG-BIN\tFILE_0002_IMAGE_BIN\tPHYS_0002\n')
 
+    def test_find_all_files_format_npz(self):
+        with pushd_popd(tempdir=True) as wsdir:
+            ws = self.resolver.workspace_from_nothing(directory=wsdir)
+            ws.add_file('IMG', file_id='IMG_1', page_id='PHYS_0001', mimetype='image/tiff', local_filename='IMG/IMG_1.tif')
+            ws.add_file('SEG', file_id='SEG_1', page_id='PHYS_0001', mimetype='application/vnd.prima.page+xml', url='https://host/SEG_1.xml')
+            ws.save_mets()
+            result = self.runner.invoke(workspace_cli, ['find', '--format', 'npz'])
+            self.assertEqual(result.exit_code, 0)
+            table = np.load(BytesIO(result.stdout_bytes))
+            self.assertEqual(sorted(table.files), ['ID', 'fileGrp', 'local_filename', 'mimetype', 'pageId', 'url'])
+            self.assertEqual(list(table['ID']), ['IMG_1', 'SEG_1'])
+            self.assertEqual(list(table['url']), ['', 'https://host/SEG_1.xml'])
+            result = self.runner.invoke(workspace_cli, ['find', '--format', 'npz', '-G', 'SEG', '-k', 'page_id', '-k', 'url'])
+            self.assertEqual(result.exit_code, 0)
+            table = np.load(BytesIO(result.stdout_bytes))
+            self.assertEqual(table.files, ['pageId', 'url'])
+            self.assertEqual(list(table['pageId']), ['PHYS_0001'])
+            result = self.runner.invoke(workspace_cli, ['find', '--format', 'npz', '-k', 'basename'])
+            self.assertEqual(result.exit_code, 2)
+
     def test_prune_files(self):
         with TemporaryDirectory() as tempdir:
             copytree(assets.path_to('SBB0000F29300010000/data'), join(tempdir, 'ws'))
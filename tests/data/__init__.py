@@ -1,6 +1,7 @@
 import json
 import os
-from ocrd import Processor
+from ocrd import Processor, OcrdPageResult, OcrdPageResultImage
+from ocrd_models.ocrd_page import AlternativeImageType
 from ocrd_utils import make_file_id
 
 DUMMY_TOOL = {
@@ -59,6 +60,27 @@ class DummyProcessorWithOutput(Processor):
                 local_filename=os.path.join(self.output_file_grp, file_id),
                 content='CONTENT')
 
+class DummyPageProcessor(Processor):
+    """
+    Derives a grayscale image for each page, with the per-page API
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs['ocrd_tool'] = DUMMY_TOOL
+        kwargs['version'] = '0.0.1'
+        super().__init__(*args, **kwargs)
+
+    def process_page_pcgts(self, *input_pcgts, page_id=None):
+        pcgts = input_pcgts[0]
+        page = pcgts.get_Page()
+        page_image, page_coords, _ = self.workspace.image_from_page(page, page_id)
+        alternative_image = AlternativeImageType(comments=page_coords['features'] + ',grayscale_normalized')
+        page.add_AlternativeImage(alternative_image)
+        return OcrdPageResult(pcgts, images=[OcrdPageResultImage(page_image.convert('L'), 'GRAY', alternative_image)])
+
+    def image_from_page_args(self, *input_pcgts, page_id=None):
+        return [(input_pcgts[0].get_Page(), {})]
+
 class IncompleteProcessor(Processor):
     pass
 
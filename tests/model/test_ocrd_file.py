@@ -12,6 +12,7 @@ from ocrd_models import (
     OcrdMets,
     OcrdFile,
 )
+from ocrd_models.ocrd_file import CachedOcrdFile
 
 
 def test_ocrd_file_without_id():
@@ -125,5 +126,28 @@ def test_fptr_changed_for_change_id():
     assert mets.get_physical_pages(for_fileIds=['BAZ_1']) == ['p0001']
 
 
+def test_cached_ocrd_file_snapshot():
+    mets = OcrdMets.empty_mets(cache_flag=True)
+    mets.add_file('FOO', ID='FOO_1', mimetype='image/tiff', pageId='p0001', url='http://foo', local_filename='FOO/FOO_1.tif')
+    f1 = next(mets.find_files(ID='FOO_1'))
+    f2 = next(mets.find_files(ID='FOO_1'))
+    assert isinstance(f1, CachedOcrdFile)
+    assert (f1.ID, f1.fileGrp, f1.mimetype, f1.pageId, f1.url, f1.local_filename) == \
+        ('FOO_1', 'FOO', 'image/tiff', 'p0001', 'http://foo', 'FOO/FOO_1.tif')
+    # writes go to the mets:file and invalidate the snapshots of all results
+    f1.local_filename = 'FOO/renamed.tif'
+    f1.pageId = 'p0002'
+    assert f1.local_filename == f2.local_filename == 'FOO/renamed.tif'
+    assert f1.pageId == f2.pageId == 'p0002'
+    mets.rename_file_group('FOO', 'BAR')
+    assert f2.fileGrp == 'BAR'
+    f2.ID = 'BAR_1'
+    assert f1.ID == 'BAR_1'
+    assert [f.local_filename for f in mets.find_files(pageId='p0002', fileGrp='BAR')] == ['FOO/renamed.tif']
+    # other attributes can still be attached to files
+    f1.workflow_step = 'binarized'
+    assert f1.workflow_step == 'binarized'
+
+
 if __name__ == '__main__':
     main(__file__)
@@ -3,10 +3,12 @@ from datetime import datetime
 
 from os.path import join
 from os import environ
+from io import BytesIO
 from contextlib import contextmanager
 import re
 import shutil
 from lxml import etree as ET
+import numpy as np
 
 from tests.base import (
     main,
@@ -21,6 +23,7 @@ from ocrd_utils import (
 from ocrd_models import (
     OcrdMets
 )
+from ocrd_models.constants import NAMESPACES as NS
 
 import pytest
 
@@ -136,6 +139,94 @@ def test_physical_pages_for_empty_fileids(sbb_directory_ocrd_mets):
     assert sbb_directory_ocrd_mets.get_physical_pages(
         for_fileIds=[]) == []
 
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_physical_page_for_file_index(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    f1 = mets.add_file('IMG', ID='IMG_1', mimetype='image/tiff', pageId='PHYS_1')
+    f2 = mets.add_file('IMG', ID='IMG_2', mimetype='image/tiff', pageId='PHYS_2')
+    assert f1.pageId == 'PHYS_1'
+    assert mets.get_physical_pages(for_fileIds=['IMG_2', 'NOTEXIST', 'IMG_1']) == ['PHYS_2', None, 'PHYS_1']
+    f1.pageId = 'PHYS_2'
+    assert f1.pageId == 'PHYS_2'
+    f1.ID = 'IMG_1_RENAMED'
+    assert f1.pageId == 'PHYS_2'
+    assert mets.remove_physical_page_fptr('IMG_1_RENAMED') == ['PHYS_2']
+    assert f1.pageId is None
+    mets.remove_physical_page('PHYS_2')
+    assert f2.pageId is None
+    assert mets.physical_pages == ['PHYS_1']
+
+
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_find_files_attribute_index(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    for n in range(1, 4):
+        mets.add_file('IMG', ID=f'IMG_{n}', mimetype='image/tiff', pageId=f'PHYS_{n}',
+                      url=f'http://example.org/IMG_{n}.tif', local_filename=f'IMG/IMG_{n}.tif')
+        mets.add_file('SEG', ID=f'SEG_{n}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{n}', local_filename=f'SEG/SEG_{n}.xml')
+    assert [f.ID for f in mets.find_files(local_filename='IMG/IMG_2.tif')] == ['IMG_2']
+    assert [f.ID for f in mets.find_files(url='http://example.org/IMG_3.tif', mimetype='image/tiff')] == ['IMG_3']
+    assert [f.ID for f in mets.find_files(fileGrp='SEG', mimetype='image/tiff')] == []
+    assert len(mets.find_all_files(fileGrp='//SEG|IMG', mimetype=MIMETYPE_PAGE)) == 3
+    f = mets.find_all_files(local_filename='IMG/IMG_2.tif')[0]
+    f.local_filename = 'IMG/renamed.tif'
+    f.mimetype = 'image/png'
+    f.url = None
+    f.ID = 'IMG_2_RENAMED'
+    assert mets.find_all_files(local_filename='IMG/IMG_2.tif') == []
+    assert [f.ID for f in mets.find_files(local_filename='IMG/renamed.tif', mimetype='image/png')] == ['IMG_2_RENAMED']
+    assert mets.find_all_files(url='http://example.org/IMG_2.tif') == []
+    assert [f.ID for f in mets.find_files(ID='IMG_2_RENAMED', fileGrp='IMG')] == ['IMG_2_RENAMED']
+    mets.remove_one_file('IMG_2_RENAMED')
+    assert mets.find_all_files(mimetype='image/png') == []
+
+
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_find_files_pageId_fileGrp(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    for n in range(1, 6):
+        for grp in ['IMG', 'BIN', 'SEG']:
+            mets.add_file(grp, ID=f'{grp}_{n}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{n}')
+    mets.remove_one_file('SEG_5')
+    assert [f.ID for f in mets.find_files(fileGrp='BIN', pageId='PHYS_3')] == ['BIN_3']
+    assert [f.ID for f in mets.find_files(fileGrp='BIN', pageId='PHYS_2..PHYS_4')] == ['BIN_2', 'BIN_3', 'BIN_4']
+    assert sorted(f.ID for f in mets.find_files(fileGrp='//IMG|SEG', pageId='PHYS_5')) == ['IMG_5']
+    assert [f.ID for f in mets.find_files(ID='BIN_3', pageId='PHYS_3')] == ['BIN_3']
+    assert mets.find_all_files(ID='BIN_3', pageId='PHYS_4') == []
+    assert mets.find_all_files(fileGrp='NOTEXIST', pageId='PHYS_1') == []
+    assert mets.find_all_files(fileGrp='BIN', pageId='') == []
+    # document order regardless of the access path
+    mets.add_file('BIN', ID='BIN_0', mimetype=MIMETYPE_PAGE, pageId='PHYS_1')
+    assert [f.ID for f in mets.find_files(pageId='PHYS_2,PHYS_1')] == ['IMG_1', 'IMG_2', 'BIN_1', 'BIN_2', 'BIN_0', 'SEG_1', 'SEG_2']
+    assert [f.ID for f in mets.find_files(fileGrp='BIN', pageId='PHYS_1..PHYS_2')] == ['BIN_1', 'BIN_2', 'BIN_0']
+    assert [f.ID for f in mets.find_files(mimetype=MIMETYPE_PAGE, pageId='PHYS_1..PHYS_5')] == [
+        f.ID for f in mets.find_files(mimetype=MIMETYPE_PAGE) if f.pageId in [f'PHYS_{n}' for n in range(1, 6)]]
+
+
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_physical_pages_for_pageids(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    for n in range(1, 41):
+        mets.add_file('IMG', ID=f'IMG_{n}', mimetype='image/tiff', pageId=f'PHYS_{n:04d}')
+        mets.update_physical_page_attributes(f'PHYS_{n:04d}', ORDER=str(n), ORDERLABEL=f'page {n}')
+    assert mets.get_physical_pages(for_pageIds='PHYS_0003..PHYS_0005') == ['PHYS_0003', 'PHYS_0004', 'PHYS_0005']
+    assert sorted(mets.get_physical_pages(for_pageIds='38..40,PHYS_0001')) == ['PHYS_0001', 'PHYS_0038', 'PHYS_0039', 'PHYS_0040']
+    assert mets.get_physical_pages(for_pageIds='page 9..page 11') == ['PHYS_0009', 'PHYS_0010', 'PHYS_0011']
+    assert mets.get_physical_pages(for_pageIds='//PHYS_001[2-4]') == ['PHYS_0012', 'PHYS_0013', 'PHYS_0014']
+    assert [div.get('ORDER') for div in mets.get_physical_pages(for_pageIds='2..3', return_divs=True)] == ['2', '3']
+    with pytest.raises(ValueError, match='match none'):
+        mets.get_physical_pages(for_pageIds='PHYS_0041..PHYS_0050')
+    with pytest.raises(ValueError, match='match none'):
+        mets.get_physical_pages(for_pageIds='PHYS_0005..PHYS_0003')
+    with pytest.raises(ValueError, match='Start of range pattern'):
+        mets.get_physical_pages(for_pageIds='PHYS_0000..PHYS_0002')
+    # index follows attribute updates
+    mets.update_physical_page_attributes('PHYS_0002', ID='PHYS_0002_NEW', ORDER='100')
+    assert sorted(mets.get_physical_pages(for_pageIds='1..3')) == ['PHYS_0001', 'PHYS_0003']
+    assert mets.get_physical_pages(for_pageIds='100') == ['PHYS_0002_NEW']
+    assert mets.get_physical_pages(for_fileIds=['IMG_2']) == ['PHYS_0002_NEW']
+    assert [f.ID for f in mets.find_files(pageId='PHYS_0002_NEW')] == ['IMG_2']
+
 
 def test_add_group():
     mets = OcrdMets.empty_mets()
@@ -168,6 +259,110 @@ def test_add_file0():
     assert len(mets.file_groups) == 1, '1 file group'
 
 
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_add_files(cache_flag):
+    mets1 = OcrdMets.empty_mets(cache_flag=cache_flag)
+    mets1.add_file('IMG', ID='IMG_1', mimetype='image/tiff', pageId='PHYS_1', url='old')
+    mets2 = OcrdMets(content=mets1.to_xml(), cache_flag=cache_flag)
+    records = [dict(fileGrp=grp, ID=f'{grp}_{n}', mimetype='image/tiff' if grp == 'IMG' else MIMETYPE_PAGE,
+                    pageId=f'PHYS_{n}', url=f'http://example.org/{grp}_{n}', local_filename=f'{grp}/{grp}_{n}')
+               for n in range(1, 4) for grp in ['IMG', 'SEG']]
+    for record in records:
+        mets1.add_file(force=True, **record)
+    files = mets2.add_files(records, force=True)
+    assert [f.ID for f in files] == ['IMG_1', 'SEG_1', 'IMG_2', 'SEG_2', 'IMG_3', 'SEG_3']
+    assert mets2.to_xml() == mets1.to_xml()
+    assert [f.ID for f in mets2.find_files(pageId='PHYS_1')] == ['IMG_1', 'SEG_1']
+    assert [f.ID for f in mets2.find_files(local_filename='SEG/SEG_2')] == ['SEG_2']
+    mets2.mark_saved()
+    # conflicts are detected before anything is added
+    with pytest.raises(FileExistsError, match='neither force nor ignore'):
+        mets2.add_files([dict(fileGrp='SEG', ID='SEG_4', pageId='PHYS_4'), records[1]])
+    with pytest.raises(FileExistsError, match='unrelated'):
+        mets2.add_files([dict(fileGrp='SEG', ID='SEG_4', pageId='PHYS_4'), dict(records[1], pageId='PHYS_2')], force=True)
+    with pytest.raises(FileExistsError, match='neither force nor ignore'):
+        mets2.add_files([dict(fileGrp='NEW', ID='NEW_1', pageId='PHYS_4'), dict(fileGrp='NEW', ID='NEW_1', pageId='PHYS_4')])
+    assert mets2.changes == 0
+    assert mets2.find_all_files(ID='//SEG_4|NEW_1') == []
+    assert mets2.to_xml() == mets1.to_xml()
+    # duplicates within the batch replace each other with force
+    mets2.add_files([dict(fileGrp='SEG', ID='SEG_4', pageId='PHYS_4', url='a'),
+                     dict(fileGrp='SEG', ID='SEG_4', pageId='PHYS_4', url='b')], force=True)
+    assert [f.url for f in mets2.find_files(ID='SEG_4')] == ['b']
+    with pytest.raises(ValueError, match='Invalid syntax'):
+        mets2.add_files([dict(fileGrp='SEG', ID='1')])
+
+
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_changes(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    assert mets.changes == 0
+    f = mets.add_file('IMG', ID='IMG_1', mimetype='image/tiff', pageId='PHYS_1')
+    assert mets.changes > 0
+    mets.mark_saved()
+    assert mets.find_all_files(pageId='PHYS_1') == [f]
+    assert mets.physical_pages == ['PHYS_1']
+    assert mets.changes == 0
+    f.mimetype = 'image/tiff'
+    assert mets.changes == 0
+    f.mimetype = 'image/png'
+    assert mets.changes == 1
+    mets.mark_saved()
+    mets.remove_one_file('IMG_1')
+    assert mets.changes > 0
+
+
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_snapshot(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    for i in range(1, 4):
+        mets.add_file('IMG', ID=f'IMG_{i}', mimetype='image/tiff', pageId=f'PHYS_{i}', url=f'IMG/IMG_{i}.tif')
+        mets.add_file('SEG', ID=f'SEG_{i}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{i}', local_filename=f'SEG/SEG_{i}.xml')
+    snap1 = mets.snapshot()
+    assert mets.snapshot() is snap1
+    assert snap1.file_groups == ['IMG', 'SEG']
+    assert snap1.physical_pages == ['PHYS_1', 'PHYS_2', 'PHYS_3']
+    assert snap1.get_physical_pages(for_pageIds='PHYS_2..PHYS_3') == ['PHYS_2', 'PHYS_3']
+    assert [f.ID for f in snap1.find_files(pageId='PHYS_2..PHYS_3', mimetype=MIMETYPE_PAGE)] == ['SEG_2', 'SEG_3']
+    assert [f.ID for f in snap1.find_files(url='//.*_1.tif')] == ['IMG_1']
+    assert [f.ID for f in snap1.find_files(local_only=True)] == ['SEG_1', 'SEG_2', 'SEG_3']
+    # new snapshot shares unchanged fileGrps, old one is unaffected
+    mets.add_file('SEG', ID='SEG_4', mimetype=MIMETYPE_PAGE, pageId='PHYS_4')
+    snap2 = mets.snapshot()
+    assert snap2._fileGrps['IMG'] is snap1._fileGrps['IMG']
+    assert snap2.physical_pages == ['PHYS_1', 'PHYS_2', 'PHYS_3', 'PHYS_4']
+    assert len(snap2.find_all_files(fileGrp='SEG')) == 4
+    assert len(snap1.find_all_files(fileGrp='SEG')) == 3
+    assert snap1.physical_pages == ['PHYS_1', 'PHYS_2', 'PHYS_3']
+    # other changes rebuild the snapshot
+    mets.remove_one_file('IMG_1')
+    snap3 = mets.snapshot()
+    assert [f.ID for f in snap3.find_files(fileGrp='IMG')] == ['IMG_2', 'IMG_3']
+    assert [f.ID for f in snap2.find_files(fileGrp='IMG')] == ['IMG_1', 'IMG_2', 'IMG_3']
+
+
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_snapshot_pages_and_order(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    for i in [2, 1, 3]:
+        mets.add_file('SEG', ID=f'SEG_{i}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{i}')
+    mets.add_file('IMG', ID='IMG_1', mimetype='image/tiff', pageId='PHYS_1')
+    # IMG_1 is also referenced by PHYS_3
+    el_page = mets.get_physical_pages(for_pageIds='PHYS_3', return_divs=True)[0]
+    ET.SubElement(el_page, '{%s}fptr' % NS['mets'], FILEID='IMG_1')
+    mets = OcrdMets(content=mets.to_xml(), cache_flag=cache_flag)
+    snap1 = mets.snapshot()
+    for query in [dict(pageId='PHYS_3'), dict(pageId='PHYS_1..PHYS_3'), dict(pageId='PHYS_3', ID='IMG_1')]:
+        assert [f.ID for f in snap1.find_files(**query)] == [f.ID for f in mets.find_files(**query)]
+    assert [f.ID for f in snap1.find_files(pageId='PHYS_3')] == ['SEG_3', 'IMG_1']
+    assert [f.ID for f in snap1.find_files(pageId='PHYS_1..PHYS_3')] == ['SEG_2', 'SEG_1', 'SEG_3', 'IMG_1']
+    # replaced files move to the end, also in the snapshot
+    mets.add_file('SEG', ID='SEG_2', mimetype=MIMETYPE_PAGE, pageId='PHYS_2', force=True)
+    snap2 = mets.snapshot()
+    assert [f.ID for f in snap2.find_files(pageId='PHYS_1..PHYS_3')] == \
+        [f.ID for f in mets.find_files(pageId='PHYS_1..PHYS_3')] == ['SEG_1', 'SEG_3', 'SEG_2', 'IMG_1']
+
+
 def test_add_file_id_already_exists(sbb_sample_01):
     f = sbb_sample_01.add_file('OUTPUT', ID='best-id-ever', mimetype="beep/boop")
     assert f.ID == 'best-id-ever', "ID kept"
@@ -280,6 +475,15 @@ def test_encoding_entities():
     assert 'Őh śéé Áŕ' in mets.to_xml().decode('utf-8')
 
 
+def test_write_xml(sbb_sample_01):
+    sbb_sample_01.add_file('OUTPUT', ID='OUTPUT_1', mimetype=MIMETYPE_PAGE, pageId='PHYS_NEW', url='out.xml')
+    expected = sbb_sample_01.to_xml(xmllint=True)
+    for xmllint in [True, False]:
+        f = BytesIO()
+        sbb_sample_01.write_xml(f, xmllint=xmllint)
+        assert f.getvalue() == expected
+
+
 def test_remove_page(sbb_directory_ocrd_mets):
     assert sbb_directory_ocrd_mets.physical_pages, ['PHYS_0001', 'PHYS_0002', 'PHYS_0005']
     sbb_directory_ocrd_mets.remove_physical_page('PHYS_0001')
@@ -312,6 +516,28 @@ def test_remove_file_regex(sbb_directory_ocrd_mets):
     assert sbb_directory_ocrd_mets.physical_pages, ['PHYS_0001', 'PHYS_0002']
 
 
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_remove_files(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    for n in range(1, 6):
+        mets.add_file('IMG', ID=f'IMG_{n}', mimetype='image/tiff', pageId=f'PHYS_{n}', local_filename=f'IMG/IMG_{n}.tif')
+        mets.add_file('SEG', ID=f'SEG_{n}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{n}')
+    with pytest.raises(FileNotFoundError, match='NOTEXIST'):
+        mets.remove_files(['IMG_1', 'NOTEXIST'])
+    assert len(mets.find_all_files()) == 10
+    removed = mets.remove_files(['IMG_1', 'NOTEXIST', mets.find_all_files(ID='SEG_1')[0]], force=True)
+    assert sorted(f.ID for f in removed) == ['IMG_1', 'SEG_1']
+    assert mets.physical_pages == ['PHYS_2', 'PHYS_3', 'PHYS_4', 'PHYS_5']
+    assert mets.remove_files(['IMG_2', 'IMG_3']) and mets.physical_pages == ['PHYS_2', 'PHYS_3', 'PHYS_4', 'PHYS_5']
+    assert mets.get_physical_pages(for_fileIds=['SEG_2', 'IMG_2']) == ['PHYS_2', None]
+    assert mets.find_all_files(local_filename='IMG/IMG_2.tif') == []
+    mets.remove_file_group('SEG', recursive=True)
+    assert mets.file_groups == ['IMG']
+    assert mets.physical_pages == ['PHYS_4', 'PHYS_5']
+    assert [f.ID for f in mets.find_files(pageId='PHYS_4')] == ['IMG_4']
+    assert mets.remove_files([]) == []
+
+
 def test_rename_non_existent_filegroup_exception(sbb_directory_ocrd_mets):
     with pytest.raises(FileNotFoundError) as fnf_exc:
         sbb_directory_ocrd_mets.rename_file_group('FOOBAR', 'FOOBAR')
@@ -371,6 +597,73 @@ def test_merge(sbb_sample_01):
     sbb_sample_01.merge(other_mets, fileGrp_mapping={'OCR-D-IMG': 'FOO'})
     assert len(sbb_sample_01.file_groups) == 18
 
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_merge_bulk(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    mets.add_file('IMG', ID='IMG_1', mimetype='image/tiff', pageId='PHYS_1')
+    other = OcrdMets.empty_mets(cache_flag=cache_flag)
+    for n in (1, 2):
+        other.add_file('IMG', ID=f'IMG_{n}', mimetype='image/tiff', pageId=f'PHYS_{n}')
+        other.add_file('SEG', ID=f'SEG_{n}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{n}')
+        other.update_physical_page_attributes(f'PHYS_{n}', ORDER=str(n), ORDERLABEL=f'p{n}')
+    other.add_agent('foo v0.0.1', 'OTHER', 'SOFTWARE', 'OTHER', 'preprocessing')
+    el_root = other._tree.getroot()
+    el_logdiv = ET.SubElement(ET.SubElement(el_root, '{%s}structMap' % NS['mets'], TYPE='LOGICAL'),
+                              '{%s}div' % NS['mets'], ID='LOG_1', TYPE='chapter')
+    el_structlink = ET.SubElement(el_root, '{%s}structLink' % NS['mets'])
+    for n in (1, 2):
+        ET.SubElement(el_structlink, '{%s}smLink' % NS['mets'], {
+            '{%s}from' % NS['xlink']: 'LOG_1', '{%s}to' % NS['xlink']: f'PHYS_{n}'})
+    # conflicts are detected before anything is merged
+    with pytest.raises(FileExistsError, match='IMG_1'):
+        mets.merge(other)
+    assert [f.ID for f in mets.find_files()] == ['IMG_1']
+    # IDs only conflict within the same fileGrp
+    mets.merge(other, ID='IMG_1', fileGrp_mapping={'IMG': 'BIN'})
+    assert [(f.fileGrp, f.ID) for f in mets.find_files(ID='IMG_1')] == [('IMG', 'IMG_1'), ('BIN', 'IMG_1')]
+    mets.remove_file_group('BIN', recursive=True)
+    mets.merge(other, fileGrp='SEG', pageId_mapping={'PHYS_2': 'PHYS_3'})
+    assert [(f.ID, f.pageId) for f in mets.find_files(fileGrp='SEG')] == [('SEG_1', 'PHYS_1'), ('SEG_2', 'PHYS_3')]
+    assert mets.physical_pages_labels == {'PHYS_1': ('1', 'p1', None), 'PHYS_3': ('2', 'p2', None)}
+    assert mets.get_physical_pages(for_pageIds='1..2') == ['PHYS_1', 'PHYS_3']
+    assert [agent.name for agent in mets.agents].count('foo v0.0.1') == 1
+    assert mets._tree.getroot().find('mets:structMap[@TYPE="LOGICAL"]/mets:div', NS).get('ID') == 'LOG_1'
+    assert [el.get('{%s}to' % NS['xlink']) for el in mets._tree.getroot().iterfind('mets:structLink/mets:smLink', NS)] \
+        == ['PHYS_1', 'PHYS_3']
+    # merging again with force replaces the files, but duplicates no agents and links
+    mets.merge(other, fileGrp='SEG', pageId_mapping={'PHYS_2': 'PHYS_3'}, force=True)
+    assert len(mets.find_all_files()) == 3
+    assert [agent.name for agent in mets.agents].count('foo v0.0.1') == 1
+    assert len(mets._tree.getroot().findall('mets:structLink/mets:smLink', NS)) == 2
+
+
+@pytest.mark.parametrize('cache_flag', CACHING_ENABLED)
+def test_to_table_from_table(cache_flag):
+    mets = OcrdMets.empty_mets(cache_flag=cache_flag)
+    for n in range(1, 4):
+        mets.add_file('IMG', ID=f'IMG_{n}', mimetype='image/tiff', pageId=f'PHYS_{n}',
+                      url=f'https://host/IMG_{n}.tif', local_filename=f'IMG/IMG_{n}.tif')
+        mets.add_file('SEG', ID=f'SEG_{n}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{n}')
+    mets.add_file('LOG', ID='LOG_1', mimetype='text/plain')
+    table = mets.to_table()
+    assert list(table) == ['ID', 'fileGrp', 'pageId', 'mimetype', 'url', 'local_filename']
+    assert sorted(table['ID']) == sorted(f.ID for f in mets.find_files())
+    row = list(table['ID']).index('IMG_2')
+    assert [table[column][row] for column in table] == [
+        'IMG_2', 'IMG', 'PHYS_2', 'image/tiff', 'https://host/IMG_2.tif', 'IMG/IMG_2.tif']
+    row = list(table['ID']).index('LOG_1')
+    assert [table[column][row] for column in table] == ['LOG_1', 'LOG', '', 'text/plain', '', '']
+    assert list(mets.to_table(fileGrp='SEG', pageId='PHYS_2..PHYS_3')['ID']) == ['SEG_2', 'SEG_3']
+    assert len(mets.to_table(pageId='')['ID']) == 0
+    # from the table, or its serialization
+    buf = BytesIO()
+    np.savez(buf, **table)
+    buf.seek(0)
+    for copy in [OcrdMets.from_table(table), OcrdMets.from_table(np.load(buf), cache_flag=cache_flag)]:
+        assert copy.physical_pages == mets.physical_pages
+        copy_table = copy.to_table()
+        assert sorted(zip(*copy_table.values())) == sorted(zip(*table.values()))
+
 def test_invalid_filegrp():
     """addresses https://github.com/OCR-D/core/issues/746"""
 
@@ -399,6 +692,27 @@ def test_envvar():
     with temp_env_var('OCRD_METS_CACHING', 'false'):
         assert not OcrdMets(filename=assets.url_of('SBB0000F29300010000/data/mets.xml'), cache_flag=True)._cache_flag
         assert not OcrdMets(filename=assets.url_of('SBB0000F29300010000/data/mets.xml'), cache_flag=False)._cache_flag
+def test_iterparse():
+    mets = OcrdMets.empty_mets(cache_flag=True)
+    mets.add_file_group('EMPTY')
+    for n in range(1, 4):
+        mets.add_file('IMG', ID=f'IMG_{n}', mimetype='image/tiff', pageId=f'PHYS_{n}', url=f'http://example.org/IMG_{n}.tif')
+        mets.add_file('SEG', ID=f'SEG_{n}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{n}', local_filename=f'SEG/SEG_{n}.xml')
+    xml = mets.to_xml()
+    mets = OcrdMets(content=xml, cache_flag=True)
+    mets_iterparsed = OcrdMets(content=xml, cache_flag=True, iterparse=True)
+    assert mets_iterparsed.to_xml() == xml
+    assert mets_iterparsed.file_groups == mets.file_groups == ['EMPTY', 'IMG', 'SEG']
+    assert mets_iterparsed.physical_pages == mets.physical_pages
+    for m in [mets, mets_iterparsed]:
+        assert m._fptr_cache.keys() == {'PHYS_1', 'PHYS_2', 'PHYS_3'}
+        assert [f.ID for f in m.find_files(pageId='PHYS_2', mimetype=MIMETYPE_PAGE)] == ['SEG_2']
+        assert [f.ID for f in m.find_files(url='http://example.org/IMG_3.tif')] == ['IMG_3']
+    # no effect without caching
+    assert not OcrdMets(content=xml, cache_flag=False, iterparse=True)._cache_flag
+    with temp_env_var('OCRD_METS_ITERPARSE', 'true'):
+        assert OcrdMets(content=xml, cache_flag=True)._iterparse
+
 
 def test_update_physical_page_attributes(sbb_directory_ocrd_mets):
     m = sbb_directory_ocrd_mets
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+from gc import collect
+from weakref import ref
+
+import pytest
+
+from tests.base import main
+
+from ocrd_utils import MIMETYPE_PAGE
+from ocrd_models import OcrdMets, ShardedOcrdMets
+from ocrd_models.constants import NAMESPACES as NS, TAG_METS_FPTR
+from ocrd_models.ocrd_xml_base import ET
+
+
+def _mets(n=25):
+    mets = OcrdMets.empty_mets(cache_flag=True)
+    mets.add_file('OTHER', ID='unpaged', mimetype='text/plain', local_filename='OTHER/unpaged.txt')
+    for i in range(1, n + 1):
+        mets.add_file('IMG', ID=f'IMG_{i:04d}', mimetype='image/tiff', pageId=f'PHYS_{i:04d}',
+                      url=f'http://example.org/IMG_{i:04d}.tif', local_filename=f'IMG/IMG_{i:04d}.tif')
+        mets.add_file('SEG', ID=f'SEG_{i:04d}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{i:04d}',
+                      local_filename=f'SEG/SEG_{i:04d}.xml')
+        mets.update_physical_page_attributes(f'PHYS_{i:04d}', ORDER=str(i), ORDERLABEL=f'p{i}')
+    mets.add_agent(name='foo', _type='OTHER', othertype='SOFTWARE', role='CREATOR')
+    return mets
+
+def _records(mets):
+    return sorted((f.fileGrp, f.ID, f.pageId, f.mimetype, f.url or None, f.local_filename) for f in mets.find_files())
+
+def _pages(mets):
+    return [(page_id, mets.physical_pages_labels[page_id]) for page_id in mets.physical_pages]
+
+def _assert_same(sharded, mets):
+    assert sharded.file_groups == mets.file_groups
+    assert sharded.physical_pages == mets.physical_pages
+    assert _records(sharded) == _records(mets)
+    assert _pages(sharded) == _pages(mets)
+    reloaded = OcrdMets(content=sharded.to_xml())
+    assert reloaded.file_groups == mets.file_groups
+    assert _records(reloaded) == _records(mets)
+    assert _pages(reloaded) == _pages(mets)
+    # files in document order
+    assert [(f.fileGrp, f.ID) for f in reloaded.find_files()] == [(f.fileGrp, f.ID) for f in mets.find_files()]
+
+
+@pytest.mark.parametrize('query', [
+    dict(pageId='PHYS_0003..PHYS_0011'),
+    dict(pageId='PHYS_0003..PHYS_0011', fileGrp='SEG'),
+    dict(pageId='//PHYS_001.'),
+    dict(pageId='5..9'),
+    dict(pageId='p20', mimetype=MIMETYPE_PAGE),
+    dict(ID='SEG_0017'),
+    dict(ID='//SEG_001.'),
+    dict(url='//.*_001.\\.tif'),
+    dict(local_only=True),
+    dict(fileGrp='OTHER'),
+])
+def test_find_files(query):
+    mets = _mets()
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=2)
+    assert sorted(f.ID for f in sharded.find_files(**query)) == sorted(f.ID for f in mets.find_files(**query))
+    assert len(sharded._shards) <= 2
+
+
+@pytest.mark.parametrize('query', [
+    dict(),
+    dict(pageId='PHYS_0003..PHYS_0011', fileGrp='SEG'),
+    dict(ID='SEG_0017'),
+])
+def test_to_table(query):
+    mets = _mets()
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=2)
+    table, expected = sharded.to_table(**query), mets.to_table(**query)
+    assert list(table) == list(expected)
+    assert sorted(zip(*table.values())) == sorted(zip(*expected.values()))
+
+
+def test_roundtrip():
+    mets = _mets()
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=2)
+    assert len(sharded._shard_pages) == 7
+    assert not sharded._shards
+    # only the shards of the requested pages are loaded
+    assert sorted(f.ID for f in sharded.find_files(pageId='PHYS_0005..PHYS_0006')) == ['IMG_0005', 'IMG_0006', 'SEG_0005', 'SEG_0006']
+    assert list(sharded._shards) == [1]
+    _assert_same(sharded, mets)
+    assert [agent.name for agent in OcrdMets(content=sharded.to_xml()).agents] == [agent.name for agent in mets.agents]
+
+
+@pytest.mark.parametrize('max_shards', [1, 3])
+def test_changes(max_shards):
+    mets = _mets()
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=max_shards)
+    assert sharded.changes == 0
+    for m in [mets, sharded]:
+        m.add_file('OCR', ID='OCR_0003', pageId='PHYS_0003', mimetype=MIMETYPE_PAGE, local_filename='OCR/OCR_0003.xml')
+        # new pages
+        m.add_file('OCR', ID='OCR_0026', pageId='PHYS_0026', mimetype=MIMETYPE_PAGE)
+        m.add_file('OCR', ID='OCR_0027', pageId='PHYS_0027', mimetype=MIMETYPE_PAGE)
+        m.add_files([dict(fileGrp='BIN', ID=f'BIN_{i:04d}', pageId=f'PHYS_{i:04d}', mimetype='image/png') for i in range(1, 31)])
+        m.add_file('OCR', ID='OCR_0003', pageId='PHYS_0003', mimetype=MIMETYPE_PAGE, local_filename='OCR/OCR_0003b.xml', force=True)
+    assert sharded.changes > 0
+    _assert_same(sharded, mets)
+    for m in [mets, sharded]:
+        m.remove_file(ID='SEG_0005')
+        m.remove_file('//IMG_000[6-9]')
+        m.remove_files(['BIN_0002', 'BIN_0030', 'SEG_0010'])
+        m.remove_file_group('BIN', recursive=True)
+        m.rename_file_group('OCR', 'OCR2')
+        m.update_physical_page_attributes('PHYS_0012', ORDERLABEL='twelve', LABEL='foo')
+        m.remove_physical_page('PHYS_0013')
+        m.set_physical_page_for_file('PHYS_0024', next(m.find_files(ID='SEG_0001')))
+        m.set_physical_page_for_file('PHYS_0002', next(m.find_files(ID='IMG_0003')))
+    _assert_same(sharded, mets)
+    assert sharded.get_physical_pages(for_pageIds='twelve') == ['PHYS_0012']
+    file_ids = ['SEG_0020', 'nope', 'unpaged', 'IMG_0001']
+    assert sharded.get_physical_pages(for_fileIds=file_ids) == mets.get_physical_pages(for_fileIds=file_ids)
+    sharded.mark_saved()
+    assert sharded.changes == 0
+    next(sharded.find_files(ID='IMG_0020')).mimetype = 'image/png'
+    assert sharded.changes == 1
+
+
+def test_add_file_exists_other_page():
+    sharded = ShardedOcrdMets(content=_mets().to_xml(), shard_pages=4, max_shards=2)
+    with pytest.raises(FileExistsError):
+        sharded.add_file('SEG', ID='SEG_0003', pageId='PHYS_0003', mimetype=MIMETYPE_PAGE)
+    with pytest.raises(FileExistsError):
+        sharded.add_file('SEG', ID='SEG_0003', pageId='PHYS_0020', mimetype=MIMETYPE_PAGE)
+    with pytest.raises(FileExistsError):
+        sharded.add_files([dict(fileGrp='OCR', ID='OCR_1', pageId='PHYS_0001'),
+                           dict(fileGrp='OCR', ID='OCR_1', pageId='PHYS_0021')])
+    assert sharded.physical_pages == [f'PHYS_{i:04d}' for i in range(1, 26)]
+    assert not sharded.find_all_files(fileGrp='OCR')
+
+
+def test_files_after_unloading():
+    sharded = ShardedOcrdMets(content=_mets().to_xml(), shard_pages=4, max_shards=1)
+    ocrd_file = next(sharded.find_files(ID='SEG_0002'))
+    shard = ref(sharded._shards[0])
+    assert [f.ID for f in sharded.find_files(pageId='PHYS_0020')] == ['IMG_0020', 'SEG_0020']
+    collect()
+    # files do not keep their shards in memory
+    assert shard() is None
+    # changes after unloading are not lost
+    ocrd_file.local_filename = 'SEG/changed.xml'
+    ocrd_file.ID = 'SEG_0002b'
+    ocrd_file.pageId = 'PHYS_0021'
+    assert ocrd_file.pageId == 'PHYS_0021'
+    reloaded = OcrdMets(content=sharded.to_xml())
+    # (still at the position of SEG_0002)
+    assert [(f.ID, f.local_filename) for f in reloaded.find_files(pageId='PHYS_0021', fileGrp='SEG')] == \
+        [('SEG_0002b', 'SEG/changed.xml'), ('SEG_0021', 'SEG/SEG_0021.xml')]
+    assert not reloaded.find_all_files(pageId='PHYS_0002', fileGrp='SEG')
+    sharded.remove_file(ID='SEG_0002b')
+    with pytest.raises(FileNotFoundError):
+        ocrd_file.local_filename
+
+
+def test_files_of_several_shards():
+    mets = _mets()
+    # IMG_0001 is also referenced by PHYS_0010 (in another shard)
+    el_page = mets.get_physical_pages(for_pageIds='PHYS_0010', return_divs=True)[0]
+    ET.SubElement(el_page, TAG_METS_FPTR, FILEID='IMG_0001')
+    mets = OcrdMets(content=mets.to_xml())
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=2)
+    for query in [dict(pageId='PHYS_0010'), dict(pageId='PHYS_0001..PHYS_0010', fileGrp='IMG'), dict(pageId='PHYS_0010', ID='//SEG.*')]:
+        assert sorted(f.ID for f in sharded.find_files(**query)) == sorted(f.ID for f in mets.find_files(**query))
+        assert sorted(sharded.to_table(**query)['ID']) == sorted(mets.to_table(**query)['ID'])
+    _assert_same(sharded, mets)
+    snapshot = sharded.snapshot()
+    for query in [dict(pageId='PHYS_0010'), dict(pageId='PHYS_0001..PHYS_0010'), dict(pageId='PHYS_0010', ID='IMG_0001')]:
+        assert [f.ID for f in snapshot.find_files(**query)] == [f.ID for f in mets.find_files(**query)]
+    next(sharded.find_files(ID='IMG_0001')).ID = 'IMG_0001b'
+    assert [f.ID for f in sharded.find_files(pageId='PHYS_0010', fileGrp='IMG')] == ['IMG_0010', 'IMG_0001b']
+    sharded.remove_file(ID='IMG_0001b')
+    assert [f.ID for f in sharded.find_files(pageId='PHYS_0010', fileGrp='IMG')] == ['IMG_0010']
+    el_root = ET.fromstring(sharded.to_xml())
+    assert not el_root.xpath('//mets:fptr[starts-with(@FILEID, "IMG_0001")]', namespaces=NS)
+
+
+def test_without_caching(monkeypatch):
+    monkeypatch.setenv('OCRD_METS_CACHING', 'false')
+    mets = _mets()
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=1)
+    ocrd_file = next(sharded.find_files(ID='SEG_0002'))
+    assert next(sharded.find_files(pageId='PHYS_0020', fileGrp='IMG')).url == 'http://example.org/IMG_0020.tif'
+    assert (ocrd_file.ID, ocrd_file.pageId, ocrd_file.local_filename) == ('SEG_0002', 'PHYS_0002', 'SEG/SEG_0002.xml')
+    _assert_same(sharded, mets)
+
+
+def test_same_ID_in_several_fileGrps():
+    mets = _mets()
+    mets.add_file('OCR', ID='SEG_0003', pageId='PHYS_0003', mimetype=MIMETYPE_PAGE, local_filename='OCR/SEG_0003.xml')
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=2)
+    assert sorted((f.fileGrp, f.local_filename) for f in sharded.find_files(ID='SEG_0003')) == \
+        [('OCR', 'OCR/SEG_0003.xml'), ('SEG', 'SEG/SEG_0003.xml')]
+    _assert_same(sharded, mets)
+    for m in [mets, sharded]:
+        m.add_file('OCR', ID='SEG_0004', pageId='PHYS_0004', mimetype=MIMETYPE_PAGE, local_filename='OCR/SEG_0004.xml')
+        m.remove_file(ID='SEG_0003', fileGrp='OCR')
+    assert [f.fileGrp for f in sharded.find_files(ID='SEG_0003')] == ['SEG']
+    assert [f.local_filename for f in sharded.find_files(ID='SEG_0004')] == ['SEG/SEG_0004.xml', 'OCR/SEG_0004.xml']
+    _assert_same(sharded, mets)
+
+
+def test_document_order():
+    mets = OcrdMets.empty_mets(cache_flag=True)
+    for i in reversed(range(1, 13)):
+        mets.add_file('IMG', ID=f'IMG_{i:04d}', mimetype='image/tiff', pageId=f'PHYS_{i:04d}')
+        if i == 6:
+            mets.add_file('IMG', ID='IMG_unpaged', mimetype='image/tiff')
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=2)
+    _assert_same(sharded, mets)
+    assert [f.ID for f in OcrdMets(content=sharded.to_xml()).find_files()][5:8] == ['IMG_0007', 'IMG_0006', 'IMG_unpaged']
+
+
+def test_merge():
+    other = OcrdMets.empty_mets(cache_flag=True)
+    for i in range(20, 31):
+        other.add_file('OCR', ID=f'OCR_{i:04d}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{i:04d}', local_filename=f'OCR/OCR_{i:04d}.xml')
+        other.update_physical_page_attributes(f'PHYS_{i:04d}', ORDER=str(i), ORDERLABEL=f'p{i}')
+    other.add_agent(name='bar', _type='OTHER', othertype='SOFTWARE', role='CREATOR')
+    mets = _mets()
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=2)
+    merged = []
+    for m in [mets, sharded]:
+        m.merge(other, fileGrp_mapping={'OCR': 'SEG'}, fileId_mapping={'OCR_0030': 'last'}, after_add_cb=merged.append)
+    assert [f.ID for f in merged[:11]] == [f.ID for f in merged[11:]]
+    _assert_same(sharded, mets)
+    assert sharded.get_physical_pages(for_pageIds='p28') == ['PHYS_0028']
+    assert [agent.name for agent in sharded.agents][-2:] == ['foo', 'bar']
+    assert [agent.name for agent in sharded.agents] == [agent.name for agent in mets.agents]
+    with pytest.raises(FileExistsError):
+        sharded.merge(other, fileGrp_mapping={'OCR': 'SEG'})
+
+
+def test_snapshot():
+    mets = _mets()
+    sharded = ShardedOcrdMets(content=mets.to_xml(), shard_pages=4, max_shards=2)
+    snapshot = sharded.snapshot()
+    assert sharded.snapshot() is snapshot
+    assert snapshot.file_groups == mets.file_groups
+    assert snapshot.physical_pages == mets.physical_pages
+    assert [f.ID for f in snapshot.find_files(pageId='PHYS_0020..PHYS_0021', fileGrp='SEG')] == ['SEG_0020', 'SEG_0021']
+    sharded.add_file('SEG', ID='SEG_0026', pageId='PHYS_0026', mimetype=MIMETYPE_PAGE)
+    assert sharded.snapshot().physical_pages[-1] == 'PHYS_0026'
+    assert snapshot.physical_pages[-1] == 'PHYS_0025'
+
+
+if __name__ == '__main__':
+    main(__file__)
@@ -1,11 +1,16 @@
+import io
 import json
 
 from tempfile import TemporaryDirectory
+from threading import current_thread
 from os.path import join
+from unittest import mock
+from PIL import Image
 from tests.base import CapturingTestCase as TestCase, assets, main # pylint: disable=import-error, no-name-in-module
-from tests.data import DummyProcessor, DummyProcessorWithRequiredParameters, DummyProcessorWithOutput, IncompleteProcessor
+from tests.data import DummyProcessor, DummyProcessorWithRequiredParameters, DummyProcessorWithOutput, DummyPageProcessor, IncompleteProcessor
 
 from ocrd_utils import MIMETYPE_PAGE, pushd_popd, initLogging, disableLogging
+from ocrd_modelfactory import page_from_file
 from ocrd.resolver import Resolver
 from ocrd.processor.base import Processor, run_processor, run_cli
 
@@ -211,5 +216,69 @@ class TestProcessor(TestCase):
         r = self.capture_out_err()
         assert 'ERROR ocrd.processor.base - found no page phys_0001 in file group GRP1' in r.err
 
+    def test_process_page_pcgts(self):
+        with pushd_popd(tempdir=True) as tempdir:
+            ws = self.resolver.workspace_from_nothing(directory=tempdir)
+            for i in range(1, 6):
+                image_bytes = io.BytesIO()
+                Image.new('RGB', (100, 50), (i, 2 * i, 3 * i)).save(image_bytes, format='PNG')
+                ws.add_file('IMG', mimetype='image/png', file_id=f'IMG_{i}', page_id=f'phys_{i:04d}',
+                            local_filename=f'IMG/IMG_{i}.png', content=image_bytes.getvalue())
+            for max_pages, pool, prefetch, writers in [('1', 'thread', '0', '0'), ('1', 'thread', '2', '2'),
+                                                       ('3', 'thread', '0', '0'), ('3', 'process', '0', '2')]:
+                with self.subTest(max_pages=max_pages, pool=pool, prefetch=prefetch, writers=writers), \
+                        mock.patch.dict('os.environ', {'OCRD_MAX_PARALLEL_PAGES': max_pages, 'OCRD_PARALLEL_PAGES_POOL': pool,
+                                                       'OCRD_PREFETCH_PAGES': prefetch, 'OCRD_WRITER_THREADS': writers}):
+                    output_file_grp = f'OUT-{max_pages}-{pool}-{prefetch}-{writers}'
+                    download_threads = []
+                    download_file = ws.download_file
+                    def download_file_recorded(f, **kwargs):
+                        download_threads.append(current_thread().name)
+                        return download_file(f, **kwargs)
+                    add_files = ws.add_files
+                    downloads_at_add = []
+                    def add_files_recorded(records, **kwargs):
+                        downloads_at_add.append(len(download_threads))
+                        return add_files(records, **kwargs)
+                    preload_page_image = ws.preload_page_image
+                    preload_threads = []
+                    def preload_page_image_recorded(page, page_id, **kwargs):
+                        preload_threads.append(current_thread().name)
+                        return preload_page_image(page, page_id, **kwargs)
+                    unused_images = []
+                    unload_image = ws.unload_image
+                    def unload_image_recorded(image_url):
+                        if image_url in ws._preloaded_images:
+                            unused_images.append(image_url)
+                        unload_image(image_url)
+                    with mock.patch.object(ws, 'download_file', download_file_recorded), \
+                            mock.patch.object(ws, 'add_files', add_files_recorded), \
+                            mock.patch.object(ws, 'preload_page_image', preload_page_image_recorded), \
+                            mock.patch.object(ws, 'unload_image', unload_image_recorded):
+                        run_processor(DummyPageProcessor, workspace=ws, input_file_grp='IMG', output_file_grp=output_file_grp)
+                    # inputs downloaded from the main thread only, at most one page ahead of the workers
+                    assert download_threads == ['MainThread'] * 5
+                    # with prefetching, the declared page images were decoded in the background and used
+                    if prefetch != '0':
+                        assert len(preload_threads) == 5
+                        assert all(name.startswith('ocrd-prefetch') for name in preload_threads)
+                        assert not unused_images
+                    else:
+                        assert not preload_threads
+                    assert not ws._preloaded_images
+                    if max_pages != '1':
+                        assert downloads_at_add[0] == int(max_pages) + 1
+                    # output files all written
+                    assert not ws._pending_writes
+                    # added from the main thread, in page order
+                    files = ws.mets.find_all_files(fileGrp=output_file_grp)
+                    assert [(f.pageId, f.mimetype) for f in files] == [
+                        (f'phys_{i:04d}', mimetype) for i in range(1, 6) for mimetype in ['image/png', MIMETYPE_PAGE]]
+                    image_file, page_file = files[2:4]
+                    assert image_file.ID == page_file.ID + '_GRAY'
+                    pcgts = page_from_file(page_file)
+                    assert pcgts.get_Page().get_AlternativeImage()[0].get_filename() == image_file.local_filename
+                    assert Image.open(join(tempdir, image_file.local_filename)).mode == 'L'
+
 if __name__ == "__main__":
     main(__file__)
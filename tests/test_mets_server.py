@@ -4,6 +4,7 @@ from pytest import fixture, raises
 import pytest
 from tests.base import assets
 
+from concurrent.futures import ThreadPoolExecutor
 from itertools import repeat
 from multiprocessing import Process, Pool, Pipe, set_start_method
 # necessary for macos
@@ -19,6 +20,7 @@ from uuid import uuid4
 from requests.exceptions import ConnectionError
 
 from ocrd import Resolver, OcrdMetsServer, Workspace
+from ocrd.mets_server import ClientSideOcrdMets
 from ocrd_utils import pushd_popd, MIMETYPE_PAGE
 
 WORKSPACE_DIR = '/tmp/ocrd-mets-server'
@@ -113,6 +115,160 @@ def test_mets_server_add_file(start_mets_server):
 
     assert len(workspace_file.mets.find_all_files(fileGrp='FOO')) == NO_FILES
 
+def test_mets_server_add_files(start_mets_server):
+    NO_FILES = 500
+
+    mets_server_url, workspace_server = start_mets_server
+
+    # add NO_FILES files in one request
+    files = workspace_server.add_files([dict(
+        local_filename=f'local_filename{i}',
+        mimetype=MIMETYPE_PAGE,
+        page_id=f'page{i}',
+        file_grp='FOO',
+        file_id=f'FOO_page{i}_foo{i}',
+    ) for i in range(NO_FILES)])
+    assert len(files) == NO_FILES
+    assert files[0].local_filename == 'local_filename0'
+    assert files[0].url is None
+
+    found = workspace_server.mets.find_all_files(fileGrp='FOO')
+    assert len(found) == NO_FILES
+    assert found[-1].pageId == f'page{NO_FILES - 1}'
+
+    # sync
+    workspace_server.mets.save()
+    workspace_file = Workspace(Resolver(), WORKSPACE_DIR)
+    assert len(workspace_file.mets.find_all_files(fileGrp='FOO')) == NO_FILES
+
+def test_mets_server_batch(start_mets_server):
+    NO_FILES = 250
+
+    mets_server_url, workspace_server = start_mets_server
+    mets = workspace_server.mets
+    # one persistent session per thread
+    assert mets.session is Workspace(resolver=Resolver(), directory=WORKSPACE_DIR, mets_server_url=mets_server_url).mets.session
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(lambda: mets.session).result() is not mets.session
+
+    with mets.batch(100):
+        for i in range(NO_FILES):
+            workspace_server.add_file('FOO', local_filename=f'local_filename{i}', mimetype=MIMETYPE_PAGE,
+                                      page_id=f'page{i}', file_id=f'FOO_page{i}_foo{i}')
+        # sent in batches of 100, the rest along with the query
+        assert len(mets._batch) == NO_FILES % 100
+        assert [f.ID for f in mets.find_files(fileGrp='FOO', pageId='page249')] == ['FOO_page249_foo249']
+        assert not mets._batch
+        workspace_server.add_file('FOO', local_filename='local_filename_last', mimetype=MIMETYPE_PAGE,
+                                  page_id='page_last', file_id='FOO_last')
+    assert not mets._batch
+    assert len(mets.find_all_files(fileGrp='FOO')) == NO_FILES + 1
+
+    # errors of queued requests are raised when sending
+    with raises(Exception, match='already exists'):
+        with mets.batch():
+            workspace_server.add_file('FOO', local_filename='local_filename0', mimetype=MIMETYPE_PAGE,
+                                      page_id='page1', file_id='FOO_page0_foo0')
+
+def add_file_save_server(x):
+    add_file_server(x)
+    mets_server_url, i = x
+    Workspace(resolver=Resolver(), directory=WORKSPACE_DIR, mets_server_url=mets_server_url).save_mets()
+    # durable once save returns
+    return f'FOO_page{i}_foo{i}' in Path(WORKSPACE_DIR, 'mets.xml').read_text()
+
+def test_mets_server_group_commit(start_mets_server):
+    NO_FILES = 100
+
+    mets_server_url, workspace_server = start_mets_server
+
+    # concurrent changes and saves
+    with Pool() as pool:
+        results = pool.map(add_file_save_server, zip(repeat(mets_server_url), range(NO_FILES)))
+    assert all(results)
+    workspace_file = Workspace(Resolver(), WORKSPACE_DIR)
+    assert len(workspace_file.mets.find_all_files(fileGrp='FOO')) == NO_FILES
+
+def test_mets_server_changes(start_mets_server):
+    mets_server_url, workspace_server = start_mets_server
+    mets = workspace_server.mets
+
+    version, changes = mets.changes()
+    assert changes == []
+    # long polling until the next change
+    with ThreadPoolExecutor() as executor:
+        waiting = executor.submit(mets.changes, since=version, timeout=10)
+        add_file_server((mets_server_url, 0))
+        version, changes = waiting.result()
+    assert [(op, f.ID, f.pageId) for op, f in changes] == [('add', 'FOO_page0_foo0', 'page0')]
+    # no changes within timeout
+    assert mets.changes(since=version, timeout=0.1) == (version, [])
+
+    mets.remove_file('FOO_page0_foo0')
+    assert not mets.find_all_files(fileGrp='FOO')
+    version, changes = mets.changes(since=version)
+    assert [(op, f.ID) for op, f in changes] == [('remove', 'FOO_page0_foo0')]
+    with raises(FileNotFoundError):
+        mets.remove_file('FOO_page0_foo0')
+
+    # changes before a reload are not available anymore
+    mets.reload()
+    assert mets.changes(since=version)[1] is None
+    assert mets.changes(since=mets.changes()[0])[1] == []
+
+def test_mets_server_cache(start_mets_server):
+    mets_server_url, workspace_server = start_mets_server
+    mets = ClientSideOcrdMets(mets_server_url, cache=True)
+    assert mets.cache_ttl == 1
+    # without TTL, every lookup is revalidated
+    mets.cache_ttl = 0
+    assert mets.file_groups == workspace_server.mets.file_groups
+    assert mets.find_all_files(fileGrp='FOO') == []
+    assert len(mets._cache) == 2
+
+    # unchanged METS: revalidated without data
+    r = mets.session.get(f'{mets.url}/file_groups')
+    assert r.status_code == 200
+    r = mets.session.get(f'{mets.url}/file_groups', headers={'If-None-Match': r.headers['etag']})
+    assert r.status_code == 304 and not r.content
+
+    # changes by other clients are seen after revalidation
+    add_file_server((mets_server_url, 0))
+    assert [f.ID for f in mets.find_files(fileGrp='FOO')] == ['FOO_page0_foo0']
+    assert 'FOO' in mets.file_groups
+
+    # within the TTL, only changes by the client itself are seen
+    mets.cache_ttl = 60
+    assert [f.ID for f in mets.find_files(fileGrp='FOO')] == ['FOO_page0_foo0']
+    add_file_server((mets_server_url, 1))
+    assert [f.ID for f in mets.find_files(fileGrp='FOO')] == ['FOO_page0_foo0']
+    mets.add_file('FOO', file_id='FOO_page2_foo2', page_id='page2', mimetype=MIMETYPE_PAGE, local_filename='local_filename2')
+    assert [f.ID for f in mets.find_files(fileGrp='FOO')] == ['FOO_page0_foo0', 'FOO_page1_foo1', 'FOO_page2_foo2']
+
+def find_files_server(x):
+    mets_server_url, i = x
+    workspace_server = Workspace(resolver=Resolver(), directory=WORKSPACE_DIR, mets_server_url=mets_server_url)
+    return [f.ID for f in workspace_server.mets.find_files(fileGrp='OCR-D-IMG', pageId='PHYS_0001..PHYS_0005')]
+
+def add_or_find_files_server(x):
+    if x[1] % 2:
+        return add_file_server(x)
+    return find_files_server(x)
+
+def test_mets_server_concurrent_find_files(start_mets_server):
+    NO_REQUESTS = 200
+
+    mets_server_url, workspace_server = start_mets_server
+
+    # queries (answered from snapshots) and changes in parallel
+    with Pool() as pool:
+        results = pool.map(add_or_find_files_server, zip(repeat(mets_server_url), range(NO_REQUESTS)))
+
+    for found in results[::2]:
+        assert found == ['FILE_0001_IMAGE', 'FILE_0002_IMAGE', 'FILE_0005_IMAGE']
+    assert len(workspace_server.mets.find_all_files(fileGrp='FOO')) == NO_REQUESTS // 2
+    assert workspace_server.mets.find_all_files(fileGrp='FOO', pageId='page199')[0].ID == 'FOO_page199_foo199'
+
 def test_mets_server_add_agents(start_mets_server):
     NO_AGENTS = 30
 
@@ -227,6 +383,21 @@ def test_find_all_files(start_mets_server : Tuple[str, Workspace]):
     # with pytest.raises(ValueError, match=re.compile(f'match(es)? none')):
     #     mets.find_all_files(pageId='//PHYS000.*')
 
+def test_find_files_encodings(start_mets_server : Tuple[str, Workspace]):
+    _, workspace_server = start_mets_server
+    mets = workspace_server.mets
+    # streamed in the compact encoding
+    found = mets.find_all_files(fileGrp='//OCR-D-I.*')
+    assert len(found) == 13
+    # plain JSON without Accept header
+    r = mets.session.request('GET', f'{mets.url}/file', params={'file_grp': '//OCR-D-I.*'})
+    assert r.headers['content-type'] == 'application/json'
+    assert [(f['file_id'], f['file_grp'], f['page_id'], f['mimetype'], f['local_filename']) for f in r.json()['files']] == \
+        [(f.ID, f.fileGrp, f.pageId, f.mimetype, f.local_filename) for f in found]
+    # the connection is reused even if not all files are consumed
+    assert next(mets.find_files()).ID == found[0].ID
+    assert len(mets.find_all_files()) == 35
+
 def test_reload(start_mets_server : Tuple[str, Workspace]):
     _, workspace_server = start_mets_server
     workspace_server_copy = Workspace(Resolver(), workspace_server.directory)
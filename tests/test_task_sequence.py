@@ -1,7 +1,12 @@
+import io
 import json
+import logging
+from unittest import mock
 from tempfile import TemporaryDirectory
 from pathlib import Path
 
+from PIL import Image
+
 from tests.base import main, assets, copy_of_directory
 from tests.data.wf_testcase import (
     TestCase,
@@ -9,10 +14,13 @@ from tests.data.wf_testcase import (
     SAMPLE_NAME_REQUIRED_PARAM,
     PARAM_JSON,
 )
+from tests.data import DummyPageProcessor
 
 from ocrd_utils import pushd_popd, MIMETYPE_PAGE, get_ocrd_tool_json
 from ocrd.resolver import Resolver
-from ocrd.task_sequence import run_tasks, validate_tasks, ProcessorTask
+from ocrd.processor.builtin.dummy_processor import DummyProcessor
+from ocrd.task_sequence import run_tasks, run_tasks_streamed, validate_tasks, get_python_processor, ProcessorTask
+from ocrd_modelfactory import page_from_file
 
 class TestOcrdWfStep(TestCase):
 
@@ -153,6 +161,78 @@ class TestOcrdWfStep(TestCase):
                 # step 2: 2 images and 2 PAGEXML in GRP1 -> process just the PAGEXML
                 self.assertEqual(len(ws.mets.find_all_files()), files_before + 6)
 
+    def test_get_python_processor(self):
+        get_python_processor.cache_clear()
+        # without instantiating the processor
+        with mock.patch.object(DummyProcessor, '__init__', side_effect=AssertionError):
+            processor_class, ocrd_tool = get_python_processor('ocrd-dummy')
+        self.assertEqual(processor_class, DummyProcessor)
+        self.assertEqual(ocrd_tool['executable'], 'ocrd-dummy')
+        self.assertEqual(get_python_processor('ocrd-sample-processor'), (None, None))
+
+    def test_task_run_in_process(self):
+        resolver = Resolver()
+        with copy_of_directory(assets.path_to('kant_aufklaerung_1784/data')) as wsdir:
+            with pushd_popd(wsdir):
+                ws = resolver.workspace_from_url('mets.xml')
+                files_before = len(ws.mets.find_all_files())
+                with mock.patch('ocrd.task_sequence.run_cli') as run_cli:
+                    run_tasks('mets.xml', 'DEBUG', None, [
+                        "dummy -I OCR-D-IMG -O GRP1 -P copy_files true",
+                        "dummy -I GRP1 -O GRP2 -P copy_files true",
+                    ], in_process=True)
+                    run_cli.assert_not_called()
+                ws.reload_mets()
+                self.assertEqual(len(ws.mets.find_all_files()), files_before + 6)
+
+    def test_task_run_streamed(self):
+        def get_python_processor_(executable):
+            if executable == 'ocrd-dummy-page':
+                return DummyPageProcessor, DummyPageProcessor(workspace=None).ocrd_tool
+            return get_python_processor(executable)
+        with TemporaryDirectory() as tempdir, pushd_popd(tempdir):
+            ws = Resolver().workspace_from_nothing(directory=tempdir)
+            for i in range(1, 4):
+                image_bytes = io.BytesIO()
+                Image.new('RGB', (100, 50), (i, 2 * i, 3 * i)).save(image_bytes, format='PNG')
+                ws.add_file('IMG', mimetype='image/png', file_id=f'IMG_{i}', page_id=f'phys_{i:04d}',
+                            local_filename=f'IMG/IMG_{i}.png', content=image_bytes.getvalue())
+            ws.save_mets()
+            tasks = [
+                "dummy-page -I IMG -O GRP1",
+                "dummy-page -I GRP1 -O GRP2",
+                "dummy-page -I GRP2 -O GRP3",
+            ]
+            overwrite_modes = []
+            ocrd_log_level = logging.getLogger('ocrd').level
+            def run_tasks_streamed_(workspace, *args, **kwargs):
+                overwrite_modes.append(workspace.overwrite_mode)
+                return run_tasks_streamed(workspace, *args, **kwargs)
+            with mock.patch('ocrd.task_sequence.get_python_processor', get_python_processor_), \
+                    mock.patch('ocrd.task_sequence.which', return_value=True), \
+                    mock.patch.object(Resolver, 'workspace_from_url', return_value=ws), \
+                    mock.patch('ocrd.task_sequence.run_tasks_streamed', side_effect=run_tasks_streamed_) as streamed, \
+                    mock.patch('ocrd.task_sequence.run_processor') as run_processor:
+                run_tasks('mets.xml', 'DEBUG', None, tasks, overwrite=True, stream=True)
+                assert [len(call.args[1]) for call in streamed.call_args_list] == [3]
+                run_processor.assert_not_called()
+            # overwrite mode and log level only for the in-process tasks
+            assert overwrite_modes == [True]
+            assert not ws.overwrite_mode
+            assert logging.getLogger('ocrd').level == ocrd_log_level != logging.DEBUG
+            ws.reload_mets()
+            for grp in ['GRP1', 'GRP2', 'GRP3']:
+                files = ws.mets.find_all_files(fileGrp=grp)
+                assert [(f.pageId, f.mimetype) for f in files] == [
+                    (f'phys_{i:04d}', mimetype) for i in range(1, 4) for mimetype in ['image/png', MIMETYPE_PAGE]]
+            # each task got the PAGE of the one before
+            pcgts = page_from_file(next(ws.mets.find_files(fileGrp='GRP3', pageId='phys_0002', mimetype=MIMETYPE_PAGE)))
+            assert [alt.get_filename() for alt in pcgts.get_Page().get_AlternativeImage()] == [
+                f'{grp}/{grp}_2_GRAY.png' for grp in ['GRP1', 'GRP2', 'GRP3']]
+            assert Image.open(Path(tempdir, 'GRP3', 'GRP3_2_GRAY.png')).getpixel((0, 0)) == \
+                Image.new('RGB', (1, 1), (2, 4, 6)).convert('L').getpixel((0, 0))
+            assert not ws._preloaded_images
+
 
 if __name__ == '__main__':
     main(__file__)
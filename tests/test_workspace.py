@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from os import chdir, curdir, walk, stat, chmod, umask
+from os import chdir, curdir, listdir, walk, stat, chmod, umask
 import shutil
 import logging
 from stat import filemode
@@ -22,11 +22,12 @@ from tests.base import (
 
 from ocrd_models import (
     OcrdFile,
-    OcrdMets
+    OcrdMets,
+    ShardedOcrdMets
 )
 from ocrd_models.ocrd_page import parseString
 from ocrd_models.ocrd_page import TextRegionType, CoordsType, AlternativeImageType
-from ocrd_utils import polygon_mask, xywh_from_polygon, bbox_from_polygon, points_from_polygon
+from ocrd_utils import polygon_mask, xywh_from_polygon, bbox_from_polygon, points_from_polygon, MIMETYPE_PAGE
 from ocrd_modelfactory import page_from_file
 from ocrd.resolver import Resolver
 from ocrd.workspace import Workspace
@@ -154,6 +155,100 @@ def test_workspace_backup(plain_workspace):
     assert exists(join(plain_workspace.directory, '.backup'))
 
 
+def test_save_mets_sidecar_index(plain_workspace, monkeypatch, tmp_path_factory):
+    monkeypatch.setenv('OCRD_METS_CACHING', 'true')
+    monkeypatch.setenv('OCRD_METS_SIDECAR_INDEX', 'true')
+    cache_dir = str(tmp_path_factory.mktemp('cache'))
+    monkeypatch.setenv('XDG_CACHE_HOME', cache_dir)
+    for n in range(1, 4):
+        plain_workspace.mets.add_file('IMG', ID=f'IMG_{n}', mimetype='image/tiff', pageId=f'PHYS_{n}', local_filename=f'IMG/IMG_{n}.tif')
+        plain_workspace.mets.add_file('SEG', ID=f'SEG_{n}', mimetype=MIMETYPE_PAGE, pageId=f'PHYS_{n}', local_filename=f'SEG/SEG_{n}.xml')
+    plain_workspace.save_mets()
+    assert exists(OcrdMets.sidecar_index_path(plain_workspace.mets_target))
+    # (outside the workspace)
+    assert OcrdMets.sidecar_index_path(plain_workspace.mets_target).startswith(cache_dir)
+    assert listdir(plain_workspace.directory) == ['mets.xml']
+
+    def _fill_caches_forbidden(self):
+        raise AssertionError("caches rebuilt despite sidecar index")
+    with monkeypatch.context() as m:
+        m.setattr(OcrdMets, '_fill_caches', _fill_caches_forbidden)
+        mets = OcrdMets(filename=plain_workspace.mets_target)
+    assert mets.file_groups == ['IMG', 'SEG']
+    assert mets.physical_pages == ['PHYS_1', 'PHYS_2', 'PHYS_3']
+    assert [f.ID for f in mets.find_files(pageId='PHYS_2', mimetype=MIMETYPE_PAGE)] == ['SEG_2']
+    assert [f.ID for f in mets.find_files(local_filename='IMG/IMG_3.tif')] == ['IMG_3']
+
+    # changing the METS invalidates the index
+    with open(plain_workspace.mets_target, 'a', encoding='utf-8') as f:
+        f.write('\n')
+    mets = OcrdMets(filename=plain_workspace.mets_target)
+    assert mets._read_sidecar_index(plain_workspace.mets_target) is None
+    assert [f.ID for f in mets.find_files(pageId='PHYS_2', mimetype=MIMETYPE_PAGE)] == ['SEG_2']
+
+
+def test_save_mets_unchanged(plain_workspace):
+    plain_workspace.save_mets()
+    mtime = stat(plain_workspace.mets_target).st_mtime_ns
+    plain_workspace.reload_mets()
+    assert plain_workspace.mets.find_all_files() == []
+    plain_workspace.save_mets()
+    assert stat(plain_workspace.mets_target).st_mtime_ns == mtime
+    plain_workspace.mets.add_file_group('IMG')
+    assert plain_workspace.mets.changes == 1
+    plain_workspace.save_mets()
+    assert plain_workspace.mets.changes == 0
+    assert OcrdMets(filename=plain_workspace.mets_target).file_groups == ['IMG']
+
+
+def test_save_mets_write_behind(plain_workspace, monkeypatch):
+    monkeypatch.setenv('OCRD_METS_WRITE_BEHIND_CHANGES', '2')
+    plain_workspace.save_mets()
+    # outside write_behind, saving is never deferred
+    plain_workspace.mets.add_file_group('IMG')
+    plain_workspace.save_mets()
+    assert OcrdMets(filename=plain_workspace.mets_target).file_groups == ['IMG']
+    with plain_workspace.write_behind():
+        plain_workspace.mets.add_file_group('SEG')
+        plain_workspace.save_mets()
+        assert OcrdMets(filename=plain_workspace.mets_target).file_groups == ['IMG']
+        plain_workspace.mets.add_file_group('OCR')
+        plain_workspace.save_mets()
+        assert OcrdMets(filename=plain_workspace.mets_target).file_groups == ['IMG', 'SEG', 'OCR']
+        plain_workspace.mets.add_file_group('TXT')
+        plain_workspace.save_mets(flush=True)
+        assert OcrdMets(filename=plain_workspace.mets_target).file_groups == ['IMG', 'SEG', 'OCR', 'TXT']
+        plain_workspace.mets.add_file_group('ALTO')
+        plain_workspace.save_mets()
+    # written when leaving the context
+    assert OcrdMets(filename=plain_workspace.mets_target).file_groups == ['IMG', 'SEG', 'OCR', 'TXT', 'ALTO']
+    # editing agents is a change, too
+    plain_workspace.mets.add_agent(name='ocrd-dummy', _type='OTHER', othertype='SOFTWARE', role='OTHER', otherrole='preprocessing')
+    plain_workspace.save_mets()
+    assert plain_workspace.mets.changes == 0
+    plain_workspace.mets.agents[0].otherrole = 'preprocessing/optimization'
+    assert plain_workspace.mets.changes == 1
+    plain_workspace.save_mets()
+    assert OcrdMets(filename=plain_workspace.mets_target).agents[0].otherrole == 'preprocessing/optimization'
+
+
+def test_save_mets_sharded(plain_workspace, monkeypatch):
+    for n in range(1, 6):
+        plain_workspace.mets.add_file('IMG', ID=f'IMG_{n}', mimetype='image/tiff', pageId=f'PHYS_{n}', local_filename=f'IMG/IMG_{n}.tif')
+    plain_workspace.save_mets()
+    monkeypatch.setenv('OCRD_METS_SHARD_PAGES', '2')
+    monkeypatch.setenv('OCRD_METS_SHARD_CACHE', '1')
+    plain_workspace.reload_mets()
+    assert isinstance(plain_workspace.mets, ShardedOcrdMets)
+    assert [f.ID for f in plain_workspace.mets.find_files(pageId='PHYS_2..PHYS_4')] == ['IMG_2', 'IMG_3', 'IMG_4']
+    plain_workspace.mets.add_file('SEG', ID='SEG_6', mimetype=MIMETYPE_PAGE, pageId='PHYS_6', local_filename='SEG/SEG_6.xml')
+    plain_workspace.save_mets()
+    assert plain_workspace.mets.changes == 0
+    mets = OcrdMets(filename=plain_workspace.mets_target)
+    assert mets.file_groups == ['IMG', 'SEG']
+    assert mets.physical_pages == ['PHYS_1', 'PHYS_2', 'PHYS_3', 'PHYS_4', 'PHYS_5', 'PHYS_6']
+    assert [f.ID for f in mets.find_files(pageId='PHYS_5..PHYS_6')] == ['IMG_5', 'SEG_6']
+
 def _url_to_file(the_path):
     dummy_mets = OcrdMets.empty_mets()
     dummy_url = abspath(the_path)
@@ -367,6 +462,24 @@ def test_remove_file_group_flat(plain_workspace):
     plain_workspace.remove_file_group('FOO', recursive=True)
 
 
+def test_remove_files(plain_workspace):
+    for n in range(1, 11):
+        plain_workspace.add_file('FOO', file_id=f'foo{n}', mimetype='foo/bar', local_filename=f'FOO/foo{n}.ext', content='foo', page_id=f'page{n}')
+    Path(plain_workspace.directory, 'FOO/foo2.ext').unlink()
+    with pytest.raises(FileNotFoundError):
+        plain_workspace.remove_files(['foo1', 'foo2', 'foo3'])
+    # only the file which could not be deleted remains
+    assert [f.ID for f in plain_workspace.find_files(file_grp='FOO')][:2] == ['foo2', 'foo4']
+    assert not Path(plain_workspace.directory, 'FOO/foo1.ext').exists()
+    removed = plain_workspace.remove_files(['foo2', 'foo4', 'NOTEXIST'], force=True)
+    assert [f.ID for f in removed] == ['foo2', 'foo4']
+    assert plain_workspace.remove_files(['foo5'], keep_files=True)
+    assert Path(plain_workspace.directory, 'FOO/foo5.ext').exists()
+    plain_workspace.remove_file_group('FOO', recursive=True)
+    assert not Path(plain_workspace.directory, 'FOO/foo6.ext').exists()
+    assert plain_workspace.mets.physical_pages == []
+
+
 @pytest.fixture(name='kant_complex_workspace')
 def _fixture_kant_complex(tmp_path):
     copytree(assets.path_to('kant_aufklaerung_1784-complex/data'), str(tmp_path))
@@ -437,6 +550,34 @@ def test_save_image_file(plain_workspace):
     assert plain_workspace.save_image_file(img, 'page1_img', 'IMG', 'page1', 'image/jpeg')
 
 
+def test_async_writes(plain_workspace):
+    ws = plain_workspace
+    with ws.async_writes(threads=2, max_pending=2):
+        for i in range(10):
+            img = Image.new('L', (100, 100), color=i)
+            ws.save_image_file(img, 'IMG_%d' % i, 'IMG', 'phys%d' % i, 'image/png')
+            # changing the image after saving must not change the file written
+            img.paste(255, (0, 0, 100, 100))
+            ws.add_file('TXT', file_id='TXT_%d' % i, mimetype='text/plain', page_id='phys%d' % i,
+                        local_filename='TXT/TXT_%d.txt' % i, content='content %d' % i)
+        # registered in order right away
+        assert [f.ID for f in ws.mets.find_files(fileGrp='IMG')] == ['IMG_%d' % i for i in range(10)]
+        # reading a file waits for its pending write
+        assert ws._resolve_image_as_pil('IMG/IMG_3.png').getpixel((0, 0)) == 3
+        ws.save_mets()
+        assert not ws._pending_writes
+    for i in range(10):
+        assert Image.open(Path(ws.directory, 'IMG', 'IMG_%d.png' % i)).getpixel((0, 0)) == i
+        assert Path(ws.directory, 'TXT', 'TXT_%d.txt' % i).read_text() == 'content %d' % i
+    # errors of background writes are raised at the flush barrier
+    Path(ws.directory, 'TXT', 'TXT_X').mkdir()
+    with pytest.raises(IsADirectoryError):
+        with ws.async_writes():
+            ws.add_file('TXT', file_id='TXT_X', mimetype='text/plain', page_id=None,
+                        local_filename='TXT/TXT_X', content='x')
+    assert ws._writer is None
+
+
 @pytest.fixture(name='workspace_kant_aufklaerung')
 def _fixture_workspace_kant_aufklaerung(tmp_path):
     copytree(assets.path_to('kant_aufklaerung_1784/data/'), str(tmp_path))
@@ -659,6 +800,18 @@ def test_merge_no_copy_files(tmp_path):
     ws1.merge(ws2, copy_files=True, fileId_mapping={'f1': 'f1_copy_files'}, force=True)
     assert next(ws1.mets.find_files(ID='f1_copy_files')).local_filename == 'GRP2/f1'
 
+def test_merge_copy_files(tmp_path):
+    ws1 = Resolver().workspace_from_nothing(directory=tmp_path / 'ws1')
+    ws2 = Resolver().workspace_from_nothing(directory=tmp_path / 'ws2')
+    for n in range(10):
+        ws2.add_file('GRP2', file_id=f'f{n}', page_id=f'p{n}', mimetype='text/plain', local_filename=f'GRP2/f{n}', content=f'ws2 {n}')
+
+    ws1.merge(ws2)
+
+    assert ws1.mets.physical_pages == [f'p{n}' for n in range(10)]
+    for n in range(10):
+        assert Path(tmp_path, 'ws1', 'GRP2', f'f{n}').read_text() == f'ws2 {n}'
+
 def test_merge_overwrite(tmp_path):
     # arrange
     dst_path1 = tmp_path / 'ws1'